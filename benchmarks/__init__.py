@@ -0,0 +1,4 @@
+"""
+Benchmarks for LangManus, run against fake backends.
+LangManus的基准测试，使用假的模型后端运行。
+"""
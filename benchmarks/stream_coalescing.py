@@ -0,0 +1,112 @@
+"""
+Benchmark of SSE message-delta coalescing.
+
+Runs concurrent workflows against the fake chat model, which streams its
+answers in small chunks, and serializes every event the way the API does.
+Reports events per second, CPU time per stream and the time spent encoding
+events, with coalescing off and with a few coalescing settings.
+
+测试SSE消息增量合并效果的基准程序：使用以小片段流式输出的假模型并发运行多个工作流，
+并像API一样序列化每个事件，比较不合并与几种合并设置下每秒事件数和每个事件流的CPU时间。
+
+Usage:
+    python -m benchmarks.stream_coalescing --streams 20 --chunk-size 2
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from langchain_core.messages import AIMessage
+
+from src.agents.fake_llm import scripted_responder, use_fake_llms
+from src.api.sse import encode_event
+from src.service.workflow_service import run_agent_workflow
+
+# (名称, coalesce_ms, coalesce_chars)
+SETTINGS = [
+    ("off", 0, 0),
+    ("50ms", 50, 0),
+    ("256chars", 0, 256),
+    ("50ms+256chars", 50, 256),
+]
+
+
+def make_responder(report_chars: int):
+    """Script a workflow whose reporter writes a long report."""
+    """按脚本运行工作流，其中报告者会写一篇较长的报告。"""
+
+    def responder(agent_name, messages, tools):
+        if agent_name == "reporter":
+            words = "The findings are summarized in this report. "
+            return AIMessage(content=(words * (report_chars // len(words) + 1))[:report_chars])
+        return scripted_responder(agent_name, messages, tools)
+
+    return responder
+
+
+async def run_stream(index: int, coalesce_ms: int, coalesce_chars: int) -> dict:
+    events = 0
+    sent_bytes = 0
+    encode_seconds = 0.0  # 序列化和SSE编码所用的时间
+    async for event in run_agent_workflow(
+        [{"role": "user", "content": f"benchmark request {index}"}],
+        bypass_step_cache=True,
+        coalesce_ms=coalesce_ms,
+        coalesce_chars=coalesce_chars,
+    ):
+        start = time.perf_counter()
+        # 与API相同的序列化和SSE编码方式
+        frame = encode_event(event)
+        encode_seconds += time.perf_counter() - start
+        sent_bytes += len(frame)
+        events += 1
+    return {"events": events, "bytes": sent_bytes, "encode_seconds": encode_seconds}
+
+
+async def run_setting(streams: int, coalesce_ms: int, coalesce_chars: int) -> dict:
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    results = await asyncio.gather(
+        *(run_stream(i, coalesce_ms, coalesce_chars) for i in range(streams))
+    )
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    events = sum(r["events"] for r in results)
+    return {
+        "streams": streams,
+        "events": events,
+        "events_per_stream": events / streams,
+        "events_per_second": round(events / wall, 1),
+        "bytes": sum(r["bytes"] for r in results),
+        "wall_seconds": round(wall, 3),
+        "cpu_ms_per_stream": round(cpu / streams * 1000, 2),
+        "encode_ms_per_stream": round(
+            sum(r["encode_seconds"] for r in results) / streams * 1000, 2
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--streams", type=int, default=20, help="concurrent workflows")
+    parser.add_argument("--chunk-size", type=int, default=2, help="characters per model chunk")
+    parser.add_argument("--report-chars", type=int, default=4000, help="length of each report")
+    args = parser.parse_args()
+
+    # 工作流的INFO日志会干扰CPU时间的测量
+    logging.getLogger("src").setLevel(logging.WARNING)
+    with use_fake_llms(
+        responder=make_responder(args.report_chars), chunk_size=args.chunk_size
+    ):
+        # 预热：编译图并启动各工作进程池
+        asyncio.run(run_setting(1, 0, 0))
+        for name, coalesce_ms, coalesce_chars in SETTINGS:
+            result = asyncio.run(run_setting(args.streams, coalesce_ms, coalesce_chars))
+            print(json.dumps({"setting": name, **result}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Benchmark suite for the orchestration hot paths.
+
+Measures prompt rendering, article conversion and extraction, the event
+translation of run_agent_workflow, the overhead of a graph step, and the
+latency of concurrent end-to-end workflows. Models are fake and tool
+results are replayed from a recorded trace, so the numbers only reflect
+LangManus's own code. Every result is a time where lower is better.
+
+Results are written as JSON. Any benchmark slower than the baseline by
+more than the tolerance is reported as a regression and the run exits with
+status 1. A missing baseline file is an error (status 2) unless the run
+saves one with --save-baseline, so a CI run cannot pass without comparing.
+
+编排热点路径的基准测试：测量提示模板渲染、文章转换和提取、run_agent_workflow的事件转换、
+图中每一步的开销，以及并发端到端工作流的延迟。模型是假的，工具结果从记录的追踪中回放，
+因此结果只反映LangManus自身代码的性能。所有结果都是时间，越小越好。
+结果以JSON格式输出；比基准线慢超过容差的结果会被报告为回归，程序以状态1退出。
+基准线文件不存在时，除非使用--save-baseline保存基准线，否则视为错误（状态2），
+因此CI中的运行不会在没有比较的情况下通过。
+
+Usage:
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --save-baseline
+    python -m benchmarks.suite --only prompt_template,article_to_markdown
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+from typing import Callable, Optional
+
+from langchain_core.messages import HumanMessage
+
+from src.agents.fake_llm import use_fake_llms
+from src.config import TEAM_MEMBERS
+from src.crawler.article import Article
+from src.crawler.readability_extractor import ReadabilityExtractor
+from src.graph import get_graph
+from src.prompts.template import apply_prompt_template
+from src.service import workflow_service
+from src.service.replay import record_workflow, replaying
+from src.service.workflow_service import run_agent_workflow
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# 超过基准线的比例达到该值时视为回归
+DEFAULT_TOLERANCE = 0.25
+
+# 基准测试使用的请求
+REQUEST = [{"role": "user", "content": "benchmark the orchestration"}]
+
+
+def sample_html(paragraphs: int = 200) -> str:
+    """Return an article page with headings, links, images and boilerplate."""
+    """返回包含标题、链接、图片和页面框架内容的文章网页。"""
+    body = "".join(
+        f"<h2>Section {i}</h2>"
+        f"<p>Paragraph {i} explains <a href='/ref/{i}'>a reference</a> with "
+        f"<strong>emphasis</strong> and <em>detail</em>. {'Lorem ipsum dolor sit amet. ' * 8}</p>"
+        + (f"<img src='/images/{i}.png' alt='figure {i}'>" if i % 10 == 0 else "")
+        for i in range(paragraphs)
+    )
+    return (
+        "<html><head><title>Benchmark article</title></head><body>"
+        "<nav><a href='/'>Home</a><a href='/about'>About</a></nav>"
+        f"<article><h1>Benchmark article</h1>{body}</article>"
+        "<footer>Copyright</footer></body></html>"
+    )
+
+
+def time_call(func: Callable[[], object], number: int, repeat: int = 5) -> float:
+    """Return the median time of one call, in seconds, over repeat rounds of number calls."""
+    """返回一次调用的耗时中位数（秒），共repeat轮，每轮调用number次。"""
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - start) / number)
+    return statistics.median(rounds)
+
+
+def result(seconds: float, unit: str = "ms", **extra) -> dict:
+    scale = {"ms": 1e3, "us": 1e6}[unit]
+    return {"value": round(seconds * scale, 3), "unit": unit, **extra}
+
+
+# 各项基准测试
+
+
+def bench_prompt_template(context: dict) -> dict:
+    state = {
+        "TEAM_MEMBERS": TEAM_MEMBERS,
+        "messages": [
+            HumanMessage(content=f"message {i} " * 50, name="researcher") for i in range(20)
+        ],
+    }
+    return result(time_call(lambda: apply_prompt_template("researcher", state), 200), "us")
+
+
+def bench_article_to_markdown(context: dict) -> dict:
+    html = sample_html()
+    # 每次使用新的文章对象，测量HTML转换本身而不是缓存
+    return result(time_call(lambda: Article("Benchmark", html).to_markdown(), 10))
+
+
+def bench_article_to_message(context: dict) -> dict:
+    article = Article("Benchmark", sample_html())
+    article.url = "https://example.com/article"
+    article.to_markdown()
+    return result(time_call(article.to_message, 200), "us")
+
+
+def bench_readability_extract(context: dict) -> dict:
+    extractor = ReadabilityExtractor()
+    html = sample_html()
+    return result(time_call(lambda: extractor.extract_article(html), 3, repeat=3))
+
+
+def _graph_input() -> tuple[dict, dict]:
+    state = {
+        "TEAM_MEMBERS": TEAM_MEMBERS,
+        "messages": REQUEST,
+        "deep_thinking_mode": False,
+        "search_before_planning": False,
+        "bypass_step_cache": True,
+        "workflow_deadline": time.time() + 600,
+    }
+    return state, {"configurable": {"workflow_id": str(uuid.uuid4())}}
+
+
+def bench_graph_step(context: dict) -> dict:
+    async def run() -> int:
+        state, config = _graph_input()
+        steps = 0
+        # 包括智能体子图中的节点
+        async for _ in get_graph().astream(
+            state, config, stream_mode="updates", subgraphs=True
+        ):
+            steps += 1
+        return steps
+
+    trace = context["trace"]
+    runs = []
+    for _ in range(5):
+        with replaying(trace):
+            start = time.perf_counter()
+            steps = asyncio.run(run())
+            runs.append((time.perf_counter() - start) / steps)
+    return result(statistics.median(runs), steps=steps)
+
+
+class _RecordedGraph:
+    """Stands in for the graph and sends the same recorded graph events on every run."""
+    """代替工作流图，每次运行都发送相同的已记录图事件。"""
+
+    def __init__(self, events: list[dict]):
+        self.events = events
+
+    async def astream_events(self, *args, **kwargs):
+        for event in self.events:
+            yield event
+
+
+def bench_event_translation(context: dict) -> dict:
+    async def graph_events() -> list[dict]:
+        state, config = _graph_input()
+        return [e async for e in get_graph().astream_events(state, config, version="v2")]
+
+    async def translate() -> int:
+        return len([e async for e in run_agent_workflow(REQUEST)])
+
+    with replaying(context["trace"]):
+        events = asyncio.run(graph_events())
+    # 只测量run_agent_workflow把图事件转换为事件流的开销
+    get_graph_ = workflow_service.get_graph
+    workflow_service.get_graph = lambda: _RecordedGraph(events)
+    try:
+        seconds = time_call(lambda: asyncio.run(translate()), 5)
+    finally:
+        workflow_service.get_graph = get_graph_
+    return result(seconds / len(events), "us", graph_events=len(events))
+
+
+def bench_workflow_replay(context: dict) -> dict:
+    async def run() -> None:
+        async for _ in run_agent_workflow(REQUEST, bypass_step_cache=True):
+            pass
+
+    runs = []
+    for _ in range(5):
+        # 追踪中的每个调用只能回放一次，每次运行使用新的回放
+        with replaying(context["trace"]):
+            start = time.perf_counter()
+            asyncio.run(run())
+            runs.append(time.perf_counter() - start)
+    return result(statistics.median(runs))
+
+
+def bench_workflow_concurrency(context: dict) -> dict:
+    streams = context["streams"]
+
+    async def run_one(index: int) -> float:
+        start = time.perf_counter()
+        async for _ in run_agent_workflow(
+            [{"role": "user", "content": f"concurrent request {index}"}],
+            bypass_step_cache=True,
+        ):
+            pass
+        return time.perf_counter() - start
+
+    async def run_all() -> list[float]:
+        return await asyncio.gather(*(run_one(i) for i in range(streams)))
+
+    # 每次模型调用固定延迟，模拟等待模型API的时间
+    with use_fake_llms(latency=0.02):
+        start = time.perf_counter()
+        latencies = sorted(asyncio.run(run_all()))
+        wall = time.perf_counter() - start
+    p95 = latencies[min(int(0.95 * streams), streams - 1)]
+    return result(
+        p95,
+        streams=streams,
+        p50_ms=round(statistics.median(latencies) * 1e3, 3),
+        workflows_per_second=round(streams / wall, 2),
+    )
+
+
+BENCHMARKS: dict[str, Callable[[dict], dict]] = {
+    "prompt_template": bench_prompt_template,
+    "article_to_markdown": bench_article_to_markdown,
+    "article_to_message": bench_article_to_message,
+    "readability_extract": bench_readability_extract,
+    "graph_step": bench_graph_step,
+    "event_translation": bench_event_translation,
+    "workflow_replay": bench_workflow_replay,
+    "workflow_concurrency": bench_workflow_concurrency,
+}
+
+# 需要回放追踪的基准测试
+_NEEDS_TRACE = {"graph_step", "event_translation", "workflow_replay"}
+
+
+def run_benchmarks(names: list[str], streams: int = 20) -> dict:
+    """Run the named benchmarks and return their results."""
+    """运行指定的基准测试并返回结果。"""
+    context = {"streams": streams}
+    if _NEEDS_TRACE & set(names):
+        # 用假模型和真实工具录制一次工作流，之后的运行都回放该追踪
+        with use_fake_llms():
+            context["trace"] = asyncio.run(record_workflow(REQUEST))
+    results = {}
+    for name in names:
+        results[name] = BENCHMARKS[name](context)
+        print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[dict]:
+    """Return the benchmarks that are slower than the baseline by more than tolerance."""
+    """返回比基准线慢超过容差的基准测试。"""
+    regressions = []
+    for name, current in results["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None or previous["unit"] != current["unit"] or not previous["value"]:
+            continue
+        ratio = current["value"] / previous["value"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                {
+                    "name": name,
+                    "baseline": previous["value"],
+                    "current": current["value"],
+                    "unit": current["unit"],
+                    "ratio": round(ratio, 2),
+                }
+            )
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--only", help="comma-separated benchmarks to run (default: all)")
+    parser.add_argument("--skip", default="", help="comma-separated benchmarks to leave out")
+    parser.add_argument("--streams", type=int, default=20, help="concurrent workflows")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    skipped = set(filter(None, args.skip.split(",")))
+    unknown = (set(names) | skipped) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    names = [name for name in names if name not in skipped]
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        # 在运行基准测试之前检查，没有基准线时无法判断是否回归
+        print(
+            f"No baseline at {args.baseline}; create it with --save-baseline",
+            file=sys.stderr,
+        )
+        return 2
+
+    # 工作流的INFO日志会干扰计时
+    logging.getLogger("src").setLevel(logging.WARNING)
+    results = run_benchmarks(names, args.streams)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    print(json.dumps({**results, "regressions": regressions}, indent=2))
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['name']}: {regression['current']}{regression['unit']} "
+            f"vs {regression['baseline']}{regression['unit']} ({regression['ratio']}x)",
+            file=sys.stderr,
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,99 @@
 """
 Entry point script for the LangGraph Demo.
 LangManus系统的入口点脚本，用于启动LangGraph演示。
+
+Usage:
+    python main.py <query>
+    python main.py --batch queries.jsonl results.jsonl [--concurrency 4]
+    python main.py --record trace.json <query>
+    python main.py -- <query starting with a dash>
 """
 
+import argparse
+import asyncio
+import json
+
+from src.config.workflow import BATCH_CONCURRENCY
 from src.workflow import run_agent_workflow
 
+
+def run_batch_command(argv: list[str]) -> None:
+    """Run the queries of a JSONL file; rerunning the command resumes an interrupted batch."""
+    """运行JSONL文件中的查询；再次运行相同的命令可以继续中断的批量运行。"""
+    from src.service.batch import run_batch_file
+
+    parser = argparse.ArgumentParser(
+        prog="main.py --batch", description="Run the queries of a JSONL file"
+    )
+    parser.add_argument("input", help="JSONL file with a query or messages per line")
+    parser.add_argument("output", help="JSONL file the results are appended to")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--deep-thinking", action="store_true", help="use the reasoning model for planning")
+    parser.add_argument("--search-before-planning", action="store_true")
+    parser.add_argument("--bypass-step-cache", action="store_true")
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(
+        run_batch_file(
+            args.input,
+            args.output,
+            args.concurrency,
+            deep_thinking_mode=args.deep_thinking,
+            search_before_planning=args.search_before_planning,
+            bypass_step_cache=args.bypass_step_cache,
+        )
+    )
+    print(json.dumps(summary, indent=2))
+
+
+def run_record_command(argv: list[str]) -> None:
+    """Run one query and record its model responses and tool results for replay."""
+    """运行一个查询，并记录其模型回复和工具结果以便回放。"""
+    from src.service.replay import record_workflow
+
+    parser = argparse.ArgumentParser(
+        prog="main.py --record", description="Record a workflow run into a trace file"
+    )
+    parser.add_argument("trace", help="JSON file the trace is written to")
+    parser.add_argument("query", nargs="+")
+    parser.add_argument("--deep-thinking", action="store_true", help="use the reasoning model for planning")
+    parser.add_argument("--search-before-planning", action="store_true")
+    args = parser.parse_args(argv)
+
+    trace = asyncio.run(
+        record_workflow(
+            [{"role": "user", "content": " ".join(args.query)}],
+            args.trace,
+            deep_thinking_mode=args.deep_thinking,
+            search_before_planning=args.search_before_planning,
+        )
+    )
+    print(
+        f"Recorded {len(trace['llm_calls'])} model calls and "
+        f"{len(trace['tool_calls'])} tool calls in {trace['duration']:.1f}s to {args.trace}"
+    )
+
+
 if __name__ == "__main__":
     import sys
 
+    # 批量模式和记录模式使用选项，不会占用以batch或record开头的普通查询
+    # 批量模式：python main.py --batch queries.jsonl results.jsonl
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        run_batch_command(sys.argv[2:])
+        sys.exit()
+    # 记录模式：python main.py --record trace.json 查询内容
+    if len(sys.argv) > 1 and sys.argv[1] == "--record":
+        run_record_command(sys.argv[2:])
+        sys.exit()
+
     # 获取用户查询
     # 如果命令行参数存在，则使用命令行参数作为用户查询
     # 例如：python main.py 查询天气预报
-    if len(sys.argv) > 1:
-        user_query = " ".join(sys.argv[1:])  # 将所有命令行参数连接成一个查询字符串
+    # 以"--"开头时，其后的所有参数都作为查询，即使查询本身以"-"开头
+    query_args = sys.argv[2:] if sys.argv[1:2] == ["--"] else sys.argv[1:]
+    if query_args:
+        user_query = " ".join(query_args)  # 将所有命令行参数连接成一个查询字符串
     else:
         # 如果没有命令行参数，则通过命令行交互方式获取用户输入
         user_query = input("Enter your query: ")
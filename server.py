@@ -1,8 +1,17 @@
 """
 Server script for running the LangManus API.
+
+Without --workers, the server runs in a single process with auto-reload, for
+development. With --workers N (0 for one per CPU core), it runs N worker
+processes without reload; each worker warms up before it accepts requests,
+and the workers share state through the SQLite state store unless
+STATE_STORE is set.
 """
 
+import argparse
 import logging
+import os
+
 import uvicorn
 
 # Configure logging
@@ -13,12 +22,43 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-if __name__ == "__main__":
-    logger.info("Starting LangManus API server")
-    uvicorn.run(
-        "src.api.app:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info",
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the LangManus API server")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ["WEB_CONCURRENCY"]) if "WEB_CONCURRENCY" in os.environ else None,
+        help="number of worker processes, 0 for one per CPU core (production mode)",
     )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.workers is None:
+        logger.info("Starting LangManus API server")
+        uvicorn.run(
+            "src.api.app:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+            log_level="info",
+        )
+    else:
+        workers = args.workers or os.cpu_count() or 1
+        # 工作进程通过共享状态存储共享缓存和后台任务；子进程会继承该环境变量
+        os.environ.setdefault("STATE_STORE", "sqlite")
+        logger.info(
+            f"Starting LangManus API server with {workers} workers "
+            f"(state store: {os.environ['STATE_STORE']})"
+        )
+        uvicorn.run(
+            "src.api.app:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            log_level="info",
+        )
@@ -1,43 +1,80 @@
+import threading
+
+from langgraph.graph.graph import CompiledGraph
 from langgraph.prebuilt import create_react_agent
 
 from src.prompts import apply_prompt_template
-from src.tools import (
-    bash_tool,
-    browser_tool,
-    crawl_tool,
-    python_repl_tool,
-    tavily_tool,
-)
 
 from .llm import get_llm_by_type
+from .tool_node import ParallelToolNode
 from src.config.agents import AGENT_LLM_MAP
 
-# 创建智能体，使用配置好的LLM类型
-# 使用ReAct (Reasoning + Acting) 模式创建各种专业智能体
-
-# 创建研究员智能体
-# 职责：收集信息、执行网络搜索和内容抓取
-# 工具：tavily_tool（网络搜索）和crawl_tool（网页内容抓取）
-research_agent = create_react_agent(
-    get_llm_by_type(AGENT_LLM_MAP["researcher"]),  # 获取研究员配置的LLM模型
-    tools=[tavily_tool, crawl_tool],               # 配置可用工具
-    prompt=lambda state: apply_prompt_template("researcher", state),  # 动态应用研究员提示模板
-)
-
-# 创建程序员智能体
-# 职责：执行代码、运行命令行操作、解决技术问题
-# 工具：python_repl_tool（Python代码执行）和bash_tool（命令行操作）
-coder_agent = create_react_agent(
-    get_llm_by_type(AGENT_LLM_MAP["coder"]),       # 获取程序员配置的LLM模型
-    tools=[python_repl_tool, bash_tool],           # 配置可用工具
-    prompt=lambda state: apply_prompt_template("coder", state),  # 动态应用程序员提示模板
-)
-
-# 创建浏览器智能体
-# 职责：执行网页浏览、交互和信息提取
-# 工具：browser_tool（浏览器自动化工具）
-browser_agent = create_react_agent(
-    get_llm_by_type(AGENT_LLM_MAP["browser"]),     # 获取浏览器智能体配置的LLM模型
-    tools=[browser_tool],                          # 配置可用工具
-    prompt=lambda state: apply_prompt_template("browser", state),  # 动态应用浏览器提示模板
-)
+
+def _get_agent_tools(agent_name: str) -> list:
+    """Return the tools available to the given agent."""
+    """返回指定智能体可以使用的工具列表。"""
+    # 在函数内导入工具，避免 src.tools -> src.agents -> src.tools 的循环导入
+    from src.tools import (
+        bash_tool,
+        browser_tool,
+        crawl_tool,
+        python_repl_tool,
+        tavily_tool,
+    )
+
+    return {
+        # 研究员：收集信息、执行网络搜索和内容抓取
+        "researcher": [tavily_tool, crawl_tool],
+        # 程序员：执行代码、运行命令行操作、解决技术问题
+        "coder": [python_repl_tool, bash_tool],
+        # 浏览器：执行网页浏览、交互和信息提取
+        "browser": [browser_tool],
+    }[agent_name]
+
+
+def create_agent(agent_name: str) -> CompiledGraph:
+    """
+    Create a ReAct agent with the configured LLM, tools and prompt.
+    """
+    """
+    使用配置好的LLM、工具和提示模板创建ReAct (Reasoning + Acting) 智能体
+
+    参数:
+        agent_name: 智能体名称，可以是"researcher"、"coder"或"browser"
+
+    返回:
+        编译好的ReAct智能体
+    """
+    return create_react_agent(
+        get_llm_by_type(AGENT_LLM_MAP[agent_name]),  # 获取智能体配置的LLM模型
+        # 配置可用工具，同一轮中的多个工具调用并发执行
+        tools=ParallelToolNode(_get_agent_tools(agent_name)),
+        prompt=lambda state: apply_prompt_template(agent_name, state),  # 动态应用提示模板
+    )
+
+
+# 智能体实例的缓存
+# 智能体在首次使用时创建，并在整个进程内共享
+_agent_cache: dict[str, CompiledGraph] = {}
+_agent_lock = threading.Lock()
+
+
+def get_agent(agent_name: str) -> CompiledGraph:
+    """
+    Get agent by name. Returns cached instance if available.
+    """
+    """
+    根据名称获取智能体，如果缓存中有可用实例则返回缓存的实例
+
+    参数:
+        agent_name: 智能体名称，可以是"researcher"、"coder"或"browser"
+
+    返回:
+        对应的ReAct智能体
+    """
+    if agent_name not in _agent_cache:
+        with _agent_lock:
+            # 双重检查，避免并发请求重复创建同一个智能体
+            if agent_name not in _agent_cache:
+                _agent_cache[agent_name] = create_agent(agent_name)
+    return _agent_cache[agent_name]
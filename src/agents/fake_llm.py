@@ -0,0 +1,230 @@
+import contextlib
+import json
+import shlex
+import time
+import uuid
+from typing import Any, Callable, Iterator, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables.config import ensure_config
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from . import agents, llm
+
+# 假模型的应答函数：根据智能体名称、消息和绑定的工具名称生成回复
+Responder = Callable[[str, list[BaseMessage], list[str]], AIMessage]
+
+
+def _agent_name() -> str:
+    """Return the workflow node that is calling the model."""
+    """返回调用模型的工作流节点名称。"""
+    # 节点的运行配置保存在上下文中，其中的checkpoint_ns以节点名称开头
+    namespace = ensure_config().get("metadata", {}).get("checkpoint_ns") or ""
+    return namespace.split(":")[0]
+
+
+def _user_input(messages: list[BaseMessage]) -> str:
+    """Return the first message of the user, i.e. the request of the workflow."""
+    """返回用户的第一条消息，即工作流的请求内容。"""
+    for message in messages:
+        if isinstance(message, HumanMessage) and not message.name:
+            return message.text()
+    return ""
+
+
+def scripted_responder(
+    agent_name: str, messages: list[BaseMessage], tools: list[str]
+) -> AIMessage:
+    """Play a complete workflow without calling a real model.
+
+    Requests that start with "hello" are answered by the coordinator, other
+    requests go through planner, researcher, coder (one bash_tool call) and
+    reporter. Every answer quotes the request so that tests can tell the
+    streams of concurrent workflows apart.
+    """
+    """
+    不调用真实模型，按固定脚本完成整个工作流。
+
+    以"hello"开头的请求由协调者直接回答；其他请求依次经过规划者、研究员、程序员
+    （调用一次bash_tool）和报告者。每个回复都引用请求内容，便于测试区分并发工作流的事件流。
+    """
+    request = _user_input(messages)
+    if "Router" in tools:
+        # 主管按研究员、程序员、报告者的顺序委派，全部完成后结束
+        done = {m.name for m in messages if isinstance(m, HumanMessage)}
+        step = next(
+            (name for name in ("researcher", "coder", "reporter") if name not in done),
+            "FINISH",
+        )
+        return AIMessage(
+            content="",
+            tool_calls=[{"name": "Router", "args": {"next": step}, "id": _call_id()}],
+        )
+    if agent_name == "coordinator":
+        if request.lower().startswith("hello"):
+            return AIMessage(content=f"Hi! You said: {request}")
+        return AIMessage(content="handoff_to_planner()")
+    if agent_name == "planner":
+        plan = {
+            "thought": f"The user wants: {request}",
+            "title": request,
+            "steps": [
+                {
+                    "agent_name": name,
+                    "title": f"{name} step",
+                    "description": f"{name} works on: {request}",
+                }
+                for name in ("researcher", "coder")
+            ],
+        }
+        return AIMessage(content=json.dumps(plan, ensure_ascii=False))
+    if agent_name == "coder":
+        results = [m for m in messages if isinstance(m, ToolMessage)]
+        if not results and "bash_tool" in tools:
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": "bash_tool",
+                        "args": {"cmd": f"echo {shlex.quote(request)}"},
+                        "id": _call_id(),
+                    }
+                ],
+            )
+        output = results[-1].text().strip() if results else ""
+        return AIMessage(content=f"Command output: {output}")
+    if agent_name == "reporter":
+        return AIMessage(content=f"# Report\n\nFindings about: {request}")
+    return AIMessage(content=f"{agent_name or 'assistant'} notes about: {request}")
+
+
+def _call_id() -> str:
+    return f"call_{uuid.uuid4().hex[:12]}"
+
+
+class FakeChatModel(BaseChatModel):
+    """A chat model that answers from a responder function instead of an API.
+
+    It streams its answers in small chunks and supports tool calling and
+    structured output, so the whole workflow can run without network access.
+    """
+    """
+    根据应答函数而非API生成回复的聊天模型。
+
+    以较小的片段流式输出回复，并支持工具调用和结构化输出，因此整个工作流无需网络即可运行。
+    """
+
+    responder: Responder = scripted_responder
+    chunk_size: int = 8  # 流式输出时每个片段的字符数
+    latency: float = 0.0  # 每次调用开始输出前的延迟（秒），用于模拟真实模型
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools: list, *, tool_choice: Any = None, **kwargs):
+        # 只需要保留工具定义，应答函数根据工具名称决定如何回复
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _respond(
+        self, messages: list[BaseMessage], tools: Optional[list[dict]]
+    ) -> AIMessage:
+        if self.latency:
+            time.sleep(self.latency)
+        names = [t["function"]["name"] for t in tools or []]
+        return self.responder(_agent_name(), messages, names)
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        tools: Optional[list[dict]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._respond(messages, tools)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        tools: Optional[list[dict]] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        yield from self._chunks(self._respond(messages, tools))
+
+    def _chunks(self, message: AIMessage) -> Iterator[ChatGenerationChunk]:
+        """Split a message into the chunks a streaming model API would send."""
+        """将消息拆分为流式模型API会发送的片段。"""
+        reasoning = message.additional_kwargs.get("reasoning_content")
+        if reasoning:
+            # 推理模型先输出推理内容，再输出回复
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="", additional_kwargs={"reasoning_content": reasoning}
+                )
+            )
+        content = message.content
+        for start in range(0, len(content), self.chunk_size):
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(content=content[start : start + self.chunk_size])
+            )
+        if message.tool_calls:
+            # 工具调用放在最后一个片段中一次性输出
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {
+                            "name": call["name"],
+                            "args": json.dumps(call["args"]),
+                            "id": call["id"],
+                            "index": index,
+                        }
+                        for index, call in enumerate(message.tool_calls)
+                    ],
+                )
+            )
+        if message.usage_metadata:
+            # 与大多数模型API一样，在最后一个片段中报告token用量
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(content="", usage_metadata=message.usage_metadata)
+            )
+
+
+@contextlib.contextmanager
+def use_fake_llms(model: Optional[FakeChatModel] = None, **kwargs):
+    """Run the workflow against FakeChatModel instances within this block.
+
+    Keyword arguments are passed to FakeChatModel, unless a model is given.
+    The cached models and agents are restored on exit.
+    """
+    """
+    在该代码块内使用FakeChatModel运行工作流。
+
+    未提供model时，关键字参数会传递给FakeChatModel；退出时恢复原有的模型和智能体缓存。
+    """
+    saved_llms = dict(llm._llm_cache)
+    saved_agents = dict(agents._agent_cache)
+    model = model or FakeChatModel(**kwargs)
+    llm._llm_cache.update({llm_type: model for llm_type in ("basic", "reasoning", "vision")})
+    # 已创建的智能体绑定了原来的模型，需要重新创建
+    agents._agent_cache.clear()
+    try:
+        yield model
+    finally:
+        llm._llm_cache.clear()
+        llm._llm_cache.update(saved_llms)
+        agents._agent_cache.clear()
+        agents._agent_cache.update(saved_agents)
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import (
+    get_config_list,
+    get_executor_for_config,
+    patch_config,
+)
+from langgraph.prebuilt import ToolNode
+from langgraph.store.base import BaseStore
+from langgraph.types import Command
+
+from src.cache import blob_store
+from src.config.tools import TOOL_CONCURRENCY_LIMITS, TOOL_MAX_CONCURRENCY
+
+# 当前这一轮工具调用中各工具的信号量
+# 工具节点在多个工作流之间共享，因此限制按轮次创建，不同工作流之间互不影响
+_turn_limits: ContextVar[Optional[dict[str, threading.BoundedSemaphore]]] = ContextVar(
+    "turn_limits", default=None
+)
+
+# 异步执行时本轮工具调用共用的并发槽位
+_turn_slots: ContextVar[Optional[asyncio.Semaphore]] = ContextVar(
+    "turn_slots", default=None
+)
+
+# 异步执行时等待信号量的轮询间隔（秒）
+ASYNC_POLL_INTERVAL = 0.05
+
+
+def _store_large_output(output):
+    """Keep large tool results in the blob store, with a reference in the state."""
+    """将较大的工具结果保存到内容存储中，状态中只保留引用。"""
+    if isinstance(output, ToolMessage):
+        # 返回副本而不修改原消息：on_tool_end事件引用的仍是原消息，事件流中需要完整内容
+        return output.model_copy(
+            update={"content": blob_store.externalize(output.content)}
+        )
+    return output
+
+
+class ParallelToolNode(ToolNode):
+    """A ToolNode that runs the tool calls of one turn concurrently.
+
+    All calls of a turn run in a thread pool bounded by max_concurrency, and
+    tools listed in tool_limits run at most that many calls at once. Calls
+    of a tool limited to 1 run one after another in tool_call order on a
+    single worker, so that e.g. code for the same REPL session can depend on
+    the previous call.
+
+    The class overrides ToolNode internals (_func, _afunc, _run_one,
+    _arun_one) whose signatures change between langgraph-prebuilt releases,
+    so pyproject.toml pins the tested versions.
+    """
+    """
+    并发执行同一轮中所有工具调用的ToolNode。
+
+    同一轮的工具调用在大小受max_concurrency限制的线程池中执行；tool_limits中列出的
+    工具同时执行的调用数量不超过对应的值。限制为1的工具的调用按tool_call的顺序在同一个
+    工作线程中依次执行，例如同一REPL会话中的代码可以依赖前一次调用的结果。
+
+    该类重写了ToolNode的内部方法（_func、_afunc、_run_one、_arun_one），这些方法的签名
+    在langgraph-prebuilt的版本之间会变化，因此pyproject.toml中固定了经过测试的版本。
+    """
+
+    def __init__(
+        self,
+        tools: list,
+        max_concurrency: int = TOOL_MAX_CONCURRENCY,
+        tool_limits: dict[str, int] = TOOL_CONCURRENCY_LIMITS,
+        **kwargs,
+    ):
+        super().__init__(tools, **kwargs)
+        self.max_concurrency = max(1, max_concurrency)
+        self.tool_limits = tool_limits
+
+    def _sequential(self, name: str) -> bool:
+        return name in self.tool_limits and self.tool_limits[name] <= 1
+
+    def _new_limits(self) -> dict[str, threading.BoundedSemaphore]:
+        # 限制为1的工具按顺序执行，不需要信号量
+        return {
+            name: threading.BoundedSemaphore(limit)
+            for name, limit in self.tool_limits.items()
+            if name in self.tools_by_name and not self._sequential(name)
+        }
+
+    def _units(self, tool_calls: list) -> list[list[int]]:
+        """Group the calls of a turn into units that run concurrently.
+
+        Each call is its own unit, except that all calls of a tool limited
+        to 1 form a single unit, in tool_call order.
+        """
+        """
+        将一轮中的工具调用分组，各组之间并发执行。
+
+        每个调用单独成组，但限制为1的工具的所有调用按tool_call的顺序组成一组。
+        """
+        units: list[list[int]] = []
+        lanes: dict[str, list[int]] = {}  # 工具名称 -> 按顺序执行的调用
+        for index, call in enumerate(tool_calls):
+            if not self._sequential(call["name"]):
+                units.append([index])
+            elif call["name"] in lanes:
+                lanes[call["name"]].append(index)
+            else:
+                lanes[call["name"]] = [index]
+                units.append(lanes[call["name"]])
+        return units
+
+    def _combine(self, outputs: list, input_type: str):
+        # 与父类相同：没有Command时保持原有的返回格式，否则分别返回各个更新
+        if not any(isinstance(output, Command) for output in outputs):
+            return outputs if input_type == "list" else {self.messages_key: outputs}
+        combined = []
+        for output in outputs:
+            if isinstance(output, Command):
+                combined.append(output)
+            else:
+                combined.append(
+                    [output] if input_type == "list" else {self.messages_key: [output]}
+                )
+        return combined
+
+    # store的类型注解需要与父类一致，LangGraph根据注解决定是否注入存储
+    def _func(self, input, config: RunnableConfig, *, store: Optional[BaseStore]):
+        tool_calls, input_type = self._parse_input(input, store)
+        config = patch_config(config, max_concurrency=self.max_concurrency)
+        config_list = get_config_list(config, len(tool_calls))
+        outputs = [None] * len(tool_calls)
+
+        def run_unit(unit: list[int]) -> None:
+            for index in unit:
+                outputs[index] = self._run_one(
+                    tool_calls[index], input_type, config_list[index]
+                )
+
+        # 线程池会复制上下文，因此各个工具调用都能看到本轮的信号量
+        token = _turn_limits.set(self._new_limits())
+        try:
+            with get_executor_for_config(config) as executor:
+                list(executor.map(run_unit, self._units(tool_calls)))
+        finally:
+            _turn_limits.reset(token)
+        return self._combine(outputs, input_type)
+
+    async def _afunc(self, input, config: RunnableConfig, *, store: Optional[BaseStore]):
+        tool_calls, input_type = self._parse_input(input, store)
+        outputs = [None] * len(tool_calls)
+
+        async def run_unit(unit: list[int]) -> None:
+            for index in unit:
+                outputs[index] = await self._arun_one(tool_calls[index], input_type, config)
+
+        token = _turn_limits.set(self._new_limits())
+        slots_token = _turn_slots.set(asyncio.Semaphore(self.max_concurrency))
+        try:
+            await asyncio.gather(*(run_unit(unit) for unit in self._units(tool_calls)))
+        finally:
+            _turn_slots.reset(slots_token)
+            _turn_limits.reset(token)
+        return self._combine(outputs, input_type)
+
+    def _run_one(self, call, input_type, config):
+        limit = (_turn_limits.get() or {}).get(call["name"])
+        if limit is None:
+            return _store_large_output(super()._run_one(call, input_type, config))
+        with limit:
+            return _store_large_output(super()._run_one(call, input_type, config))
+
+    async def _arun_one(self, call, input_type, config):
+        slots = _turn_slots.get()
+        if slots is None:
+            return await self._arun_limited(call, input_type, config)
+        async with slots:
+            return await self._arun_limited(call, input_type, config)
+
+    async def _arun_limited(self, call, input_type, config):
+        limit = (_turn_limits.get() or {}).get(call["name"])
+        if limit is None:
+            return _store_large_output(await super()._arun_one(call, input_type, config))
+        # 以非阻塞方式获取信号量，避免占用事件循环，并且可以被安全地取消
+        while not limit.acquire(blocking=False):
+            await asyncio.sleep(ASYNC_POLL_INTERVAL)
+        try:
+            return _store_large_output(
+                await super()._arun_one(call, input_type, config)
+            )
+        finally:
+            limit.release()
@@ -3,30 +3,89 @@ FastAPI application for LangManus.
 LangManus的FastAPI应用程序，提供Web API服务。
 """
 
-import json
 import logging
+import time
+from contextlib import asynccontextmanager
 from typing import Dict, List, Any, Optional, Union
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
 from sse_starlette.sse import EventSourceResponse
+from starlette.background import BackgroundTask
 import asyncio
 from typing import AsyncGenerator, Dict, List, Any
 
-from src.graph import build_graph
+from src.cache import blob_store, step_cache
 from src.config import TEAM_MEMBERS
-from src.service.workflow_service import run_agent_workflow
+from src.config.workflow import (
+    BATCH_CONCURRENCY,
+    BATCH_MAX_CONCURRENCY,
+    DISCONNECT_POLL_INTERVAL,
+    END_OF_WORKFLOW_COMPACT,
+    PROFILING_ENABLED,
+    TOOL_RESULT_EVENT_MAX_CHARS,
+    TRANSCRIPT_PAGE_MAX,
+)
+from src.service.admission import (
+    AdmissionRejectedError,
+    AdmissionTicket,
+    admission_controller,
+    admitted,
+)
+from src.service.batch import run_batch, summarize
+from src.service.cancellation import CancellationToken
+from src.service.jobs import Job, StoredJob, job_manager
+from src.service.metrics import collect_metrics, publish_metrics_periodically
+from src.service.profiling import collapsed_stacks, get_profile
+from src.service.transcripts import get_transcript
+from src.service.workflow_service import EVENT_TYPES, run_agent_workflow
+from src.tools.decorators import tool_tracer
+from src.tools.search import search_layer
+from src.service.warmup import warm_up
+from src.store import get_state_store
+from .sse import dumps, encode_event
 
 # 配置日志系统
 logger = logging.getLogger(__name__)
 
+# 记录进程启动时间，用于统计启动耗时和首个请求的延迟
+_process_start = time.perf_counter()
+# 是否已经记录过首个请求的延迟
+_first_request_reported = False
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up models, prompts, tools and the graph before serving requests."""
+    """在开始处理请求之前预热模型、提示模板、工具和工作流图。"""
+    # 在线程中执行预热，避免阻塞事件循环
+    app.state.warm_up_seconds = await asyncio.to_thread(warm_up)
+    app.state.startup_seconds = time.perf_counter() - _process_start
+    logger.info(
+        f"LangManus API ready in {app.state.startup_seconds:.2f}s "
+        f"(warm-up {app.state.warm_up_seconds:.2f}s)"
+    )
+    # 使用共享状态存储时定期写入本工作进程的指标，供其他工作进程的/metrics汇总
+    store = get_state_store()
+    publisher = (
+        asyncio.create_task(publish_metrics_periodically(store)) if store else None
+    )
+    yield
+    if publisher is not None:
+        publisher.cancel()
+    # 停止仍在运行的后台任务
+    await job_manager.shutdown()
+
+
 # 创建FastAPI应用实例
 # 设置应用的元数据，包括标题、描述和版本信息
 app = FastAPI(
     title="LangManus API",
     description="API for LangManus LangGraph-based agent workflow",
     version="0.1.0",
+    lifespan=lifespan,  # 启动时执行预热
 )
 
 # 添加CORS中间件
@@ -39,11 +98,6 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有HTTP头部
 )
 
-# 创建工作流图
-# 构建LangGraph工作流图，定义智能体之间的协作关系
-graph = build_graph()
-
-
 # 定义内容项模型
 # 用于表示消息中的不同类型内容（文本、图像等）
 class ContentItem(BaseModel):
@@ -77,6 +131,173 @@ class ChatRequest(BaseModel):
     search_before_planning: Optional[bool] = Field(
         False, description="Whether to search before planning"  # 是否在规划前执行搜索
     )
+    bypass_step_cache: Optional[bool] = Field(
+        False, description="Whether to bypass the cached agent step results"  # 是否绕过缓存的智能体步骤结果
+    )
+    coalesce_ms: Optional[int] = Field(
+        0,
+        description="Batch message deltas for up to this many milliseconds (0 disables)",  # 合并消息增量的最长等待毫秒数，0表示不按时间合并
+    )
+    coalesce_chars: Optional[int] = Field(
+        0,
+        description="Send batched message deltas once they reach this many characters (0 disables)",  # 合并的消息增量达到该字符数时立即发送，0表示不按字符数合并
+    )
+    events: Optional[List[str]] = Field(
+        None, description="Event types to receive; all event types if omitted"  # 需要接收的事件类型，未提供时接收所有事件
+    )
+    tool_result_max_chars: Optional[int] = Field(
+        None,
+        description="Truncate tool results in tool_call_result events to this many characters (0 sends them in full)",  # 工具结果的最大字符数，0表示完整发送
+    )
+    compact_end_of_workflow: Optional[bool] = Field(
+        None,
+        description="Send only message IDs, the final report and a summary in end_of_workflow",  # end_of_workflow事件是否只包含消息ID、最终报告和摘要
+    )
+    profile: Optional[bool] = Field(
+        False,
+        description="Profile the workflow; end_of_workflow carries the ID of the downloadable profile",  # 是否对工作流进行性能分析，end_of_workflow事件中包含可下载结果的ID
+    )
+
+    @field_validator("events")
+    @classmethod
+    def check_event_types(cls, events: Optional[List[str]]) -> Optional[List[str]]:
+        # 拒绝未知的事件类型，避免客户端因拼写错误而收不到任何事件
+        unknown = set(events or []) - EVENT_TYPES
+        if unknown:
+            raise ValueError(f"Unknown event types: {sorted(unknown)}")
+        return events
+
+
+# 定义批量请求中的单个查询
+class BatchQuery(BaseModel):
+    id: Optional[str] = Field(None, description="Query ID; its position in the batch if omitted")  # 查询ID，未提供时使用其在批量请求中的序号
+    query: Optional[str] = Field(None, description="The user query")  # 用户查询
+    messages: Optional[List[ChatMessage]] = Field(
+        None, description="The conversation history, instead of a query"  # 对话历史，可以代替query
+    )
+
+
+# 定义批量评估请求模型
+class BatchRequest(BaseModel):
+    queries: List[BatchQuery] = Field(..., min_length=1, description="The queries to run")  # 需要运行的查询
+    concurrency: int = Field(
+        BATCH_CONCURRENCY,
+        ge=1,
+        le=BATCH_MAX_CONCURRENCY,
+        description="Maximum number of workflows of the batch running at once",  # 批量请求中同时运行的工作流数量上限
+    )
+    deep_thinking_mode: Optional[bool] = Field(
+        False, description="Whether to enable deep thinking mode"  # 是否启用深度思考模式
+    )
+    search_before_planning: Optional[bool] = Field(
+        False, description="Whether to search before planning"  # 是否在规划前执行搜索
+    )
+    bypass_step_cache: Optional[bool] = Field(
+        False, description="Whether to bypass the cached agent step results"  # 是否绕过缓存的智能体步骤结果
+    )
+
+
+def to_workflow_messages(request: Union[ChatRequest, BatchQuery]) -> list[dict]:
+    """Convert the messages of a chat request or batch query to the format the workflow expects."""
+    """将聊天请求或批量查询中的消息转换为工作流期望的格式。"""
+    # 将Pydantic模型转换为字典并规范化内容格式
+    messages = []
+    for msg in request.messages:
+        message_dict = {"role": msg.role}
+
+        # 处理字符串内容和内容项列表两种形式
+        if isinstance(msg.content, str):
+            # 如果内容是简单字符串，直接使用
+            message_dict["content"] = msg.content
+        else:
+            # 如果内容是列表，转换为工作流期望的格式
+            content_items = []
+            for item in msg.content:
+                if item.type == "text" and item.text:
+                    # 添加文本内容项
+                    content_items.append({"type": "text", "text": item.text})
+                elif item.type == "image" and item.image_url:
+                    # 添加图像内容项
+                    content_items.append(
+                        {"type": "image", "image_url": item.image_url}
+                    )
+
+            message_dict["content"] = content_items
+
+        messages.append(message_dict)
+
+    return messages
+
+
+def workflow_options(request: ChatRequest) -> dict:
+    """Return the run_agent_workflow options requested by a chat request."""
+    """返回聊天请求中指定的run_agent_workflow参数。"""
+    return {
+        "debug": request.debug,  # 是否启用调试
+        "deep_thinking_mode": request.deep_thinking_mode,  # 是否启用深度思考模式
+        "search_before_planning": request.search_before_planning,  # 是否在规划前搜索
+        "bypass_step_cache": request.bypass_step_cache,  # 是否绕过步骤结果缓存
+        # 按请求协商的参数合并消息增量，减少事件数量
+        "coalesce_ms": request.coalesce_ms or 0,
+        "coalesce_chars": request.coalesce_chars or 0,
+        # 只发送客户端订阅的事件，工具结果默认被截断
+        "event_types": set(request.events) if request.events is not None else None,
+        "tool_result_max_chars": (
+            TOOL_RESULT_EVENT_MAX_CHARS
+            if request.tool_result_max_chars is None
+            else request.tool_result_max_chars
+        ),
+        # 完整的对话记录可以通过分页接口获取
+        "compact_end_of_workflow": (
+            END_OF_WORKFLOW_COMPACT
+            if request.compact_end_of_workflow is None
+            else request.compact_end_of_workflow
+        ),
+        "profile": bool(request.profile),  # 是否进行性能分析
+    }
+
+
+def check_profiling(request: ChatRequest) -> None:
+    """Reject profiling requests unless profiling is enabled on this server."""
+    """服务器未开启性能分析时拒绝要求性能分析的请求。"""
+    if request.profile and not PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiling is disabled on this server")
+
+
+def admit() -> AdmissionTicket:
+    """Take a workflow slot or a place in the wait queue, or reject with 429."""
+    """获取工作流名额或等待队列中的位置；队列已满时返回429。"""
+    try:
+        return admission_controller.enter()
+    except AdmissionRejectedError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},  # 建议客户端重试前等待的秒数
+        )
+
+
+async def watch_disconnect(
+    req: Request,
+    cancellation: CancellationToken,
+    interval: float = DISCONNECT_POLL_INTERVAL,
+) -> None:
+    """Cancel the workflow as soon as the client disconnects.
+
+    The check runs on its own schedule, so a disconnect is noticed even while
+    the workflow is busy and produces no events.
+    """
+    """
+    客户端断开连接后立即取消工作流。
+
+    检查按固定间隔独立运行，因此即使工作流正忙且没有产生事件，也能及时发现断开。
+    """
+    while not cancellation.cancelled:
+        if await req.is_disconnected():
+            logger.info("Client disconnected, stopping workflow")  # 客户端断开连接，停止工作流
+            cancellation.cancel("client_disconnected")
+            return
+        await asyncio.sleep(interval)
 
 
 @app.post("/api/chat/stream")
@@ -101,57 +322,49 @@ async def chat_endpoint(request: ChatRequest, req: Request):
     返回:
         服务器发送事件(SSE)流式响应
     """
+    check_profiling(request)
+    # 同时运行的工作流达到上限时排队，队列已满时直接拒绝
+    ticket = admit()
     try:
-        # 将Pydantic模型转换为字典并规范化内容格式
-        messages = []
-        for msg in request.messages:
-            message_dict = {"role": msg.role}
-
-            # 处理字符串内容和内容项列表两种形式
-            if isinstance(msg.content, str):
-                # 如果内容是简单字符串，直接使用
-                message_dict["content"] = msg.content
-            else:
-                # 如果内容是列表，转换为工作流期望的格式
-                content_items = []
-                for item in msg.content:
-                    if item.type == "text" and item.text:
-                        # 添加文本内容项
-                        content_items.append({"type": "text", "text": item.text})
-                    elif item.type == "image" and item.image_url:
-                        # 添加图像内容项
-                        content_items.append(
-                            {"type": "image", "image_url": item.image_url}
-                        )
-
-                message_dict["content"] = content_items
-
-            messages.append(message_dict)
+        messages = to_workflow_messages(request)
 
         # 定义事件生成器函数
         # 用于生成SSE事件流
         async def event_generator():
+            global _first_request_reported
+            request_start = time.perf_counter()
+            # 客户端断开连接时取消工作流，停止仍在运行的模型调用和工具
+            cancellation = CancellationToken()
+            watcher = asyncio.create_task(watch_disconnect(req, cancellation))
             try:
-                # 调用工作流服务，获取异步事件流
-                async for event in run_agent_workflow(
-                    messages,  # 消息历史
-                    request.debug,  # 是否启用调试
-                    request.deep_thinking_mode,  # 是否启用深度思考模式
-                    request.search_before_planning,  # 是否在规划前搜索
+                options = workflow_options(request)
+                # 调用工作流服务，获取异步事件流；排队期间先发送排队位置事件
+                async for event in admitted(
+                    ticket,
+                    run_agent_workflow(
+                        messages,  # 消息历史
+                        cancellation=cancellation,
+                        **options,
+                    ),
+                    cancellation,
+                    options["event_types"],
                 ):
-                    # 检查客户端是否仍然连接
-                    if await req.is_disconnected():
-                        logger.info("Client disconnected, stopping workflow")  # 客户端断开连接，停止工作流
-                        break
-                    # 生成SSE事件
-                    yield {
-                        "event": event["event"],  # 事件类型
-                        "data": json.dumps(event["data"], ensure_ascii=False),  # 事件数据（JSON格式）
-                    }
+                    # 记录进程内首个请求到首个事件的延迟
+                    if not _first_request_reported:
+                        _first_request_reported = True
+                        logger.info(
+                            "First request latency to first event: "
+                            f"{time.perf_counter() - request_start:.2f}s"
+                        )
+                    # 生成编码好的SSE事件（事件类型和JSON格式的事件数据）
+                    yield encode_event(event)
             except asyncio.CancelledError:
-                # 处理异步取消异常
+                # 处理异步取消异常（例如SSE响应检测到客户端断开连接）
                 logger.info("Stream processing cancelled")  # 流处理被取消
+                cancellation.cancel("client_disconnected")
                 raise
+            finally:
+                watcher.cancel()
 
         # 返回SSE响应
         # 使用事件生成器提供的事件流
@@ -159,9 +372,255 @@ async def chat_endpoint(request: ChatRequest, req: Request):
             event_generator(),  # 事件生成器
             media_type="text/event-stream",  # 媒体类型为SSE
             sep="\n",  # 事件分隔符
+            # 事件生成器未能开始运行时（例如客户端立即断开）也要释放名额
+            background=BackgroundTask(ticket.release),
         )
     except Exception as e:
         # 处理任何异常
+        ticket.release()
         logger.error(f"Error in chat endpoint: {e}")  # 记录错误
         # 返回500错误响应
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/batch")
+async def batch_endpoint(request: BatchRequest):
+    """
+    Run many queries and stream one JSON result per line as each workflow
+    ends, followed by a summary line. To resume an interrupted batch, send
+    only the queries that have no completed result yet.
+    """
+    """
+    运行多个查询，每个工作流结束后以一行JSON发送其结果，最后发送一行摘要。
+    要继续中断的批量运行，只需重新发送尚未成功完成的查询。
+    """
+    queries = []
+    for index, query in enumerate(request.queries, start=1):
+        if query.messages:
+            queries.append({"id": query.id or str(index), "messages": to_workflow_messages(query)})
+        elif query.query:
+            queries.append({"id": query.id or str(index), "query": query.query})
+        else:
+            raise HTTPException(
+                status_code=422, detail=f"Query {query.id or index} has no query or messages"
+            )
+
+    async def result_lines():
+        results = []
+        # 批量查询与其他请求共享准入名额，队列已满时等待而不是失败
+        async for result in run_batch(
+            queries,
+            request.concurrency,
+            admission_controller,
+            deep_thinking_mode=request.deep_thinking_mode,
+            search_before_planning=request.search_before_planning,
+            bypass_step_cache=request.bypass_step_cache,
+        ):
+            results.append(result)
+            yield dumps(result) + b"\n"
+        yield dumps({"summary": summarize(results)}) + b"\n"
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+
+async def get_job(job_id: str) -> Union[Job, StoredJob]:
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@app.post("/api/jobs", status_code=202)
+async def create_job_endpoint(request: ChatRequest):
+    """
+    Run a workflow as a background job that keeps running without a client.
+    """
+    """
+    以后台任务的方式运行工作流，任务在没有客户端连接时也会继续运行。
+    """
+    check_profiling(request)
+    job = await job_manager.submit(
+        to_workflow_messages(request), admit(), **workflow_options(request)
+    )
+    return job.summary()
+
+
+@app.get("/api/jobs")
+async def list_jobs_endpoint():
+    """
+    List the running jobs and the recently finished ones.
+    """
+    """
+    列出正在运行以及最近结束的任务。
+    """
+    return {"jobs": [job.summary() for job in await job_manager.list_jobs()]}
+
+
+@app.get("/api/jobs/{job_id}")
+async def job_endpoint(job_id: str, after: Optional[int] = None):
+    """
+    Poll the status of a job. With `after`, also return the buffered events
+    whose IDs are greater than it.
+    """
+    """
+    查询任务状态。提供after时，同时返回缓冲区中ID大于after的事件。
+    """
+    job = await get_job(job_id)
+    response = {**job.summary(), "result": job.result}
+    if after is not None:
+        response["events"] = [
+            {"id": event_id, **event} for event_id, event in await job.replay(after)
+        ]
+    return response
+
+
+@app.get("/api/jobs/{job_id}/stream")
+async def job_stream_endpoint(
+    job_id: str,
+    last_event_id: Optional[int] = Header(None),
+):
+    """
+    Stream the events of a job. Clients that reconnect with the Last-Event-ID
+    header only receive the events they missed. Disconnecting does not stop
+    the job.
+    """
+    """
+    以SSE流的方式发送任务的事件。客户端带上Last-Event-ID请求头重新连接时，
+    只会收到错过的事件。断开连接不会停止任务。
+    """
+    job = await get_job(job_id)
+
+    async def event_generator():
+        async for event_id, event in job.events(last_event_id or 0):
+            # 事件ID随帧一起发送，浏览器的EventSource重连时会自动带上Last-Event-ID
+            yield encode_event(event, event_id)
+
+    return EventSourceResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        sep="\n",
+    )
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job_endpoint(job_id: str):
+    """
+    Cancel a running job. Its stream ends with a workflow_cancelled event.
+    """
+    """
+    取消正在运行的任务，其事件流以workflow_cancelled事件结束。
+    """
+    job = await get_job(job_id)
+    cancelled = await job_manager.cancel(job_id, "cancelled_by_client")
+    return {**job.summary(), "cancelled": cancelled}
+
+
+@app.get("/api/profiles/{profile_id}")
+async def profile_endpoint(profile_id: str, format: str = Query("json", pattern="^(json|folded)$")):
+    """
+    Download the profile of a workflow run with "profile": true. `json`
+    returns the timeline and sampled stacks; `folded` returns the stacks in
+    the collapsed format of flame graph tools (speedscope, flamegraph.pl).
+    """
+    """
+    下载开启了性能分析的工作流运行的结果。json格式包含时间线和采样的调用栈；
+    folded格式以火焰图工具（speedscope、flamegraph.pl）使用的折叠格式返回调用栈。
+    """
+    profile = await asyncio.to_thread(get_profile, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    if format == "folded":
+        return PlainTextResponse(
+            collapsed_stacks(profile),
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+        )
+    return JSONResponse(
+        profile,
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.json"'},
+    )
+
+
+@app.get("/api/workflows/{workflow_id}/transcript")
+async def transcript_endpoint(
+    workflow_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=TRANSCRIPT_PAGE_MAX),
+    max_chars: int = Query(0, ge=0),
+):
+    """
+    Return one page of the messages of a finished workflow that sent a
+    compact end_of_workflow event. `max_chars` truncates large stored
+    contents, e.g. crawled pages.
+    """
+    """
+    分页返回已结束并发送了精简end_of_workflow事件的工作流的消息。
+    max_chars用于截断较大的存储内容，例如抓取的网页。
+    """
+    transcript = await asyncio.to_thread(
+        get_transcript, workflow_id, offset, limit, max_chars
+    )
+    if transcript is None:
+        raise HTTPException(
+            status_code=404, detail=f"Transcript of workflow {workflow_id} not found"
+        )
+    return transcript
+
+
+@app.get("/api/admission/stats")
+async def admission_stats_endpoint():
+    """
+    Report running and queued workflows, rejections and queue wait times.
+    """
+    """
+    返回正在运行和排队的工作流数量、被拒绝的请求数以及排队等待时间。
+    """
+    return admission_controller.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Expose workflow, model, tool and admission metrics in the Prometheus
+    text format.
+
+    With a shared state store, the metrics of every worker process are
+    returned, each sample labelled with the process ID of its worker.
+    """
+    """
+    以Prometheus文本格式提供工作流、模型调用、工具调用和准入控制的指标。
+
+    使用共享状态存储时返回所有工作进程的指标，每个样本带有所属工作进程ID的标签。
+    """
+    # 读写存储可能阻塞，在线程中执行
+    text = await asyncio.to_thread(collect_metrics, get_state_store())
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/cache/stats")
+async def cache_stats_endpoint():
+    """
+    Report hit rates of the step result cache and the search cache, and
+    blob store writes.
+    """
+    """
+    返回步骤结果缓存和搜索缓存的命中率，以及内容存储的写入统计等数据。
+    """
+    return {
+        "step_cache": step_cache.stats(),
+        "search": search_layer.stats(),
+        "blobs": blob_store.stats(),
+    }
+
+
+@app.get("/api/tools/stats")
+async def tool_stats_endpoint(limit: int = 50, tool: Optional[str] = None):
+    """
+    Report per-tool call metrics and the most recent sampled tool calls.
+    """
+    """
+    返回各工具的调用统计数据以及最近被采样的工具调用记录。
+    """
+    return {
+        "tools": tool_tracer.stats(),
+        "recent": tool_tracer.recent(limit=limit, tool=tool),
+    }
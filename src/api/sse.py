@@ -0,0 +1,47 @@
+"""
+Fast encoding of workflow events as Server-Sent Events.
+将工作流事件快速编码为服务器发送事件（SSE）。
+"""
+
+import json
+from typing import Any, Optional
+
+try:
+    # orjson比标准库json快数倍，未安装时退回标准库
+    import orjson
+except ImportError:
+    orjson = None
+
+# 复用同一个编码器；json.dumps在使用非默认参数时每次调用都会新建编码器
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps(data: Any) -> bytes:
+    """Serialize event data to compact UTF-8 JSON."""
+    """将事件数据序列化为紧凑的UTF-8 JSON。"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            # orjson不支持的数据（例如非字符串的键）交给标准库处理
+            pass
+    return _encoder.encode(data).encode("utf-8")
+
+
+def encode_event(event: dict, event_id: Optional[int] = None) -> bytes:
+    """Encode a workflow event as one SSE frame.
+
+    JSON never contains raw line breaks, so the data always fits on a single
+    "data:" line and the frame can be assembled directly. With event_id, the
+    frame has an "id:" line that clients send back as Last-Event-ID.
+    """
+    """
+    将工作流事件编码为一个SSE帧。
+
+    JSON中不会出现原始换行符，因此数据总是可以放在一行"data:"中，可以直接拼接出完整的帧。
+    提供event_id时帧中包含"id:"行，客户端重新连接时会将其作为Last-Event-ID发回。
+    """
+    frame = b"event: %s\ndata: %s\n\n" % (event["event"].encode(), dumps(event["data"]))
+    if event_id is None:
+        return frame
+    return b"id: %d\n%s" % (event_id, frame)
@@ -0,0 +1,18 @@
+from .ttl_cache import TTLCache
+from .blob_store import BlobStore, blob_store, has_blob_ref, truncate_middle
+from .shared_cache import StoreCache, make_cache
+from .step_cache import StepCache, make_step_key, normalize_text, step_cache
+
+__all__ = [
+    "TTLCache",
+    "BlobStore",
+    "blob_store",
+    "has_blob_ref",
+    "truncate_middle",
+    "StoreCache",
+    "make_cache",
+    "StepCache",
+    "make_step_key",
+    "normalize_text",
+    "step_cache",
+]
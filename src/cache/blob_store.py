@@ -0,0 +1,291 @@
+import hashlib
+import hmac
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Optional, Union
+
+from langchain_core.messages import BaseMessage
+
+from src.config.cache import (
+    BLOB_INLINE_MAX_CHARS,
+    BLOB_MEMORY_CACHE_SIZE,
+    BLOB_PROMPT_MAX_CHARS,
+    BLOB_STORE_DIR,
+)
+from .ttl_cache import TTLCache
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+# 消息内容：字符串，或由文本、图像等内容块组成的列表
+Content = Union[str, list]
+
+# 引用中保留的内容预览长度，便于在日志和调试输出中识别内容
+PREVIEW_CHARS = 200
+
+# 状态中的引用格式：<blob id="sha256" chars="长度" sig="签名">预览</blob>
+_REF_PATTERN = re.compile(
+    r'<blob id="([0-9a-f]{64})" chars="(\d+)" sig="([0-9a-f]{32})">(.*?)</blob>',
+    re.DOTALL,
+)
+
+# 存储目录中签名密钥的文件名；内容保存在子目录中，不会与之冲突
+KEY_FILENAME = "key"
+
+
+def truncate_middle(text: str, max_chars: int) -> str:
+    """Keep the head and the tail of a text within max_chars characters."""
+    """在max_chars个字符内保留文本的开头和结尾。"""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    omitted = len(text) - head - tail
+    return f"{text[:head]}\n... [{omitted} chars truncated] ...\n{text[-tail:]}"
+
+
+class BlobStore:
+    """A content-addressed store for large message payloads.
+
+    Large texts are written once to disk under their SHA-256 digest and
+    replaced in the graph state by a short reference. References are turned
+    back into (possibly truncated) text only when a prompt is built.
+
+    References are signed with a key kept in the store directory, so a
+    reference typed by a user or returned by a tool is left as plain text
+    instead of pulling a stored blob into the prompt.
+    """
+    """
+    大型消息内容的内容寻址存储。
+
+    较大的文本以其SHA-256摘要为键写入磁盘且只写一次，图状态中只保留简短的引用；
+    只有在构造提示时才会把引用还原为文本（可能会被截断）。
+
+    引用使用存储目录中的密钥签名，用户输入或工具返回的引用只作为普通文本保留，
+    不会把存储中的内容带入提示。
+    """
+
+    def __init__(
+        self,
+        root: str = BLOB_STORE_DIR,
+        inline_max_chars: int = BLOB_INLINE_MAX_CHARS,
+        memory_cache_size: int = BLOB_MEMORY_CACHE_SIZE,
+    ):
+        self.root = root  # 存储目录
+        self.inline_max_chars = inline_max_chars  # 不超过该长度的内容直接保留在状态中
+        # 最近使用的内容的内存缓存，避免频繁读取磁盘
+        self._memory: TTLCache[str] = TTLCache(
+            max_size=memory_cache_size, ttl=float("inf")
+        )
+        self._lock = threading.Lock()
+        self._key: Optional[bytes] = None  # 引用的签名密钥，首次使用时加载
+        # 统计数据
+        self.writes = 0  # 实际写入磁盘的次数
+        self.deduplicated = 0  # 内容已存在而跳过写入的次数
+        self.bytes_written = 0
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def _signing_key(self) -> bytes:
+        # 共享存储目录的工作进程使用同一个密钥，彼此创建的引用都能展开
+        if self._key is None:
+            path = os.path.join(self.root, KEY_FILENAME)
+            os.makedirs(self.root, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.root)
+            with os.fdopen(fd, "wb") as f:
+                f.write(os.urandom(32))
+            try:
+                # 目标已存在时链接失败，保证并发创建时所有进程读到同一个完整的密钥
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_path)
+            with open(path, "rb") as f:
+                self._key = f.read()
+        return self._key
+
+    def _sign(self, digest: str, chars: str) -> str:
+        return hmac.new(
+            self._signing_key(), f"{digest}:{chars}".encode(), hashlib.sha256
+        ).hexdigest()[:32]
+
+    def _is_signed(self, match: re.Match) -> bool:
+        return hmac.compare_digest(match.group(3), self._sign(match.group(1), match.group(2)))
+
+    def put(self, text: str) -> str:
+        """Store a text and return its digest. Storing it again is a no-op."""
+        """存储文本并返回其摘要；重复存储相同内容不会再次写入。"""
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        with self._lock:
+            if os.path.exists(path):
+                self.deduplicated += 1
+                # 更新修改时间，使正在使用的内容不会被清理
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # 先写入临时文件再重命名，避免其他进程读到不完整的内容
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self.writes += 1
+                self.bytes_written += len(data)
+        self._memory.set(digest, text)
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        """Return the text stored under a digest, or None if it is missing."""
+        """返回摘要对应的文本；不存在时返回None。"""
+        text = self._memory.get(digest)
+        if text is not None:
+            return text
+        try:
+            with open(self._path(digest), "rb") as f:
+                text = f.read().decode("utf-8")
+        except FileNotFoundError:
+            return None
+        self._memory.set(digest, text)
+        return text
+
+    def make_ref(self, text: str) -> str:
+        """Store a large text and return a reference to it; keep small texts."""
+        """存储较大的文本并返回其引用；较小的文本原样返回。"""
+        if len(text) <= self.inline_max_chars:
+            return text
+        match = _REF_PATTERN.fullmatch(text)
+        if match and self._is_signed(match):
+            return text
+        digest = self.put(text)
+        chars = str(len(text))
+        signature = self._sign(digest, chars)
+        preview = text[:PREVIEW_CHARS].replace("</blob>", "")
+        return f'<blob id="{digest}" chars="{chars}" sig="{signature}">{preview}</blob>'
+
+    def externalize(self, content: Content) -> Content:
+        """Replace large text in message content with references."""
+        """将消息内容中较大的文本替换为引用。"""
+        if isinstance(content, str):
+            return self.make_ref(content)
+        if isinstance(content, list):
+            return [
+                {**part, "text": self.make_ref(part["text"])}
+                if isinstance(part, dict)
+                and part.get("type") == "text"
+                and isinstance(part.get("text"), str)
+                else part
+                for part in content
+            ]
+        return content
+
+    def materialize(
+        self, content: Content, max_chars: int = BLOB_PROMPT_MAX_CHARS
+    ) -> Content:
+        """Expand the references in message content, truncating long texts."""
+        """展开消息内容中的引用，并截断过长的文本。"""
+        if isinstance(content, str):
+            if "<blob " not in content:
+                return content
+
+            def expand(match: re.Match) -> str:
+                if not self._is_signed(match):
+                    # 不是本存储创建的引用（例如用户输入或工具返回的文本），原样保留
+                    return match.group(0)
+                text = self.get(match.group(1))
+                if text is None:
+                    # 内容已被清理，只能提供预览
+                    return f"{match.group(4)}\n... [content no longer available]"
+                return truncate_middle(text, max_chars)
+
+            return _REF_PATTERN.sub(expand, content)
+        if isinstance(content, list):
+            return [
+                {**part, "text": self.materialize(part["text"], max_chars)}
+                if isinstance(part, dict)
+                and part.get("type") == "text"
+                and isinstance(part.get("text"), str)
+                else part
+                for part in content
+            ]
+        return content
+
+    def materialize_messages(
+        self, messages: list, max_chars: int = BLOB_PROMPT_MAX_CHARS
+    ) -> list:
+        """Return the messages with references expanded.
+
+        Messages without references are returned as they are, not copied.
+        """
+        """
+        返回展开引用后的消息列表；不包含引用的消息原样返回，不会被复制。
+        """
+        result = []
+        for message in messages:
+            if isinstance(message, BaseMessage):
+                if has_blob_ref(message.content):
+                    message = message.model_copy(
+                        update={"content": self.materialize(message.content, max_chars)}
+                    )
+            elif isinstance(message, dict) and has_blob_ref(message.get("content")):
+                message = {
+                    **message,
+                    "content": self.materialize(message["content"], max_chars),
+                }
+            result.append(message)
+        return result
+
+    def prune(self, max_age: float) -> int:
+        """Delete blobs that have not been stored or used for max_age seconds."""
+        """删除超过max_age秒未被存储或使用的内容，返回删除的数量。"""
+        if not os.path.isdir(self.root):
+            return 0
+        cutoff = time.time() - max_age
+        removed = 0
+        for directory, _, filenames in os.walk(self.root):
+            # 根目录中只有签名密钥，内容都在子目录中
+            if directory == self.root:
+                continue
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        if removed:
+            logger.info(f"Pruned {removed} blobs older than {max_age:.0f}s")
+        return removed
+
+    def stats(self) -> dict:
+        """Return write and deduplication counts."""
+        """返回写入次数和去重次数等统计数据。"""
+        return {
+            "writes": self.writes,
+            "deduplicated": self.deduplicated,
+            "bytes_written": self.bytes_written,
+            "memory_cache": self._memory.stats(),
+        }
+
+
+def has_blob_ref(content: Any) -> bool:
+    """Whether message content contains a blob reference."""
+    """消息内容中是否包含引用。"""
+    if isinstance(content, str):
+        return "<blob " in content and _REF_PATTERN.search(content) is not None
+    if isinstance(content, list):
+        return any(
+            isinstance(part, dict) and has_blob_ref(part.get("text")) for part in content
+        )
+    return False
+
+
+# 进程内共享的内容存储
+blob_store = BlobStore()
@@ -0,0 +1,94 @@
+import json
+import threading
+from typing import Any, Generic, Hashable, Optional, TypeVar, Union
+
+from src.store import StateStore, get_state_store
+from .ttl_cache import TTLCache
+
+# 定义泛型类型变量，用于缓存值的类型注解
+V = TypeVar("V")
+
+
+class StoreCache(Generic[V]):
+    """A TTLCache replacement whose entries live in the shared state store.
+
+    Values must be JSON serializable. Entries beyond max_size are evicted
+    oldest-written first. Hit and miss counters are kept per process.
+    """
+    """
+    条目保存在共享状态存储中的缓存，可以替代TTLCache使用。
+
+    值必须可以序列化为JSON；超出max_size时淘汰最早写入的条目。命中统计在各进程中分别计算。
+    """
+
+    def __init__(self, store: StateStore, namespace: str, max_size: int = 256, ttl: float = 3600):
+        self.store = store
+        self.namespace = namespace  # 存储中的命名空间，不同缓存互不干扰
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # 命中率统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Return the cached value, or None if it is missing or expired."""
+        """返回缓存值；如果不存在或已过期则返回None。"""
+        raw = self.store.get(self.namespace, str(key))
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the oldest entries if full."""
+        """存储一个值；如果缓存已满则淘汰最早写入的条目。"""
+        self.store.set(
+            self.namespace,
+            str(key),
+            json.dumps(value, ensure_ascii=False),
+            self.ttl if ttl is None else ttl,
+        )
+        removed = self.store.trim(self.namespace, self.max_size)
+        with self._lock:
+            self.evictions += removed
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a single entry if present."""
+        """删除指定条目（如果存在）。"""
+        self.store.delete(self.namespace, str(key))
+
+    def clear(self) -> None:
+        """Remove all entries and reset statistics."""
+        """清空所有条目并重置统计数据。"""
+        self.store.clear(self.namespace)
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return self.store.count(self.namespace)
+
+    def stats(self) -> dict[str, Any]:
+        """Return hit/miss counters and the current hit rate."""
+        """返回命中/未命中计数以及当前命中率。"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def make_cache(namespace: str, max_size: int, ttl: float) -> Union[TTLCache, StoreCache]:
+    """Create a cache in the shared state store if there is one, else in memory."""
+    """配置了共享状态存储时在其中创建缓存，否则创建内存缓存。"""
+    store = get_state_store()
+    if store is None:
+        return TTLCache(max_size=max_size, ttl=ttl)
+    return StoreCache(store, namespace, max_size=max_size, ttl=ttl)
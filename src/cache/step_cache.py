@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import re
+from typing import Optional
+
+from langchain_core.messages import BaseMessage
+
+from src.config.cache import STEP_CACHE_ENABLED, STEP_CACHE_MAX_SIZE, STEP_CACHE_TTL
+from .shared_cache import make_cache
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+# 匹配连续空白，用于规范化缓存键中的文本
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize case and spacing so that trivially different phrasings share a cache key.
+
+    Punctuation and symbols are kept: "2+2" and "2-2" are different tasks.
+    """
+    """
+    规范化大小写和空白，使仅有细微差别的表述共享同一缓存键。
+
+    标点和符号会被保留："2+2"和"2-2"是不同的任务。
+    """
+    return _WHITESPACE_PATTERN.sub(" ", text.lower()).strip()
+
+
+def _message_text(message: BaseMessage | dict) -> str:
+    """Extract the plain text of a message, ignoring non-text content items."""
+    """提取消息的纯文本内容，忽略非文本内容项（如图像）。"""
+    content = (
+        message.get("content") if isinstance(message, dict) else message.content
+    )
+    if isinstance(content, str):
+        return content
+    return " ".join(
+        item.get("text", "")
+        for item in content or []
+        if isinstance(item, dict) and item.get("type") == "text"
+    )
+
+
+def _message_name(message: BaseMessage | dict) -> Optional[str]:
+    return message.get("name") if isinstance(message, dict) else message.name
+
+
+def get_step_instruction(agent_name: str, state: dict) -> str:
+    """Return the plan step the agent is about to execute.
+
+    The planner emits a JSON plan; the n-th step assigned to an agent is the one
+    it executes after n-1 previous responses from that agent in the history.
+    Falls back to the raw plan text if it cannot be parsed.
+    """
+    """
+    返回智能体即将执行的计划步骤描述。
+
+    规划者输出JSON格式的计划；如果历史中该智能体已有n-1条响应，则当前执行的是
+    分配给它的第n个步骤。如果计划无法解析，则退回使用原始计划文本。
+    """
+    full_plan = state.get("full_plan") or ""
+    try:
+        steps = json.loads(full_plan).get("steps", [])
+    except (json.JSONDecodeError, AttributeError):
+        return full_plan
+
+    # 只保留分配给当前智能体的步骤
+    agent_steps = [
+        step
+        for step in steps
+        if isinstance(step, dict) and step.get("agent_name") == agent_name
+    ]
+    done = sum(1 for msg in state.get("messages", []) if _message_name(msg) == agent_name)
+    if done >= len(agent_steps):
+        return full_plan
+    step = agent_steps[done]
+    return " ".join(
+        str(step.get(field, "")) for field in ("title", "description", "note")
+    )
+
+
+def get_input_context(state: dict) -> str:
+    """Return the parts of the history that can influence an agent step.
+
+    That is the user's own messages plus the responses of team members. The
+    planner's plan is excluded because the step instruction already covers it.
+    """
+    """
+    返回可能影响智能体步骤结果的历史内容。
+
+    包括用户自己的消息以及团队成员的响应。规划者的计划不包括在内，因为步骤指令
+    已经涵盖了它。
+    """
+    team_members = set(state.get("TEAM_MEMBERS", []))
+    return "\n".join(
+        _message_text(msg)
+        for msg in state.get("messages", [])
+        if _message_name(msg) is None or _message_name(msg) in team_members
+    )
+
+
+def make_step_key(agent_name: str, state: dict) -> str:
+    """Build a cache key from the normalized agent name, step and context."""
+    """根据规范化后的智能体名称、步骤指令和输入上下文构建缓存键。"""
+    agent_name = normalize_text(agent_name)
+    parts = [
+        agent_name,
+        normalize_text(get_step_instruction(agent_name, state)),
+        normalize_text(get_input_context(state)),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class StepCache:
+    """Memoizes agent step results across workflows."""
+    """跨工作流缓存智能体步骤的执行结果。"""
+
+    def __init__(
+        self,
+        max_size: int = STEP_CACHE_MAX_SIZE,
+        ttl: float = STEP_CACHE_TTL,
+        enabled: bool = STEP_CACHE_ENABLED,
+    ):
+        self.enabled = enabled  # 全局开关，关闭后所有查询均视为未命中
+        # 配置了共享状态存储时，各工作进程共享缓存的步骤结果
+        self._cache = make_cache("step_cache", max_size=max_size, ttl=ttl)
+
+    def _usable(self, state: dict) -> bool:
+        # 全局关闭或请求显式要求绕过缓存时均不使用缓存
+        return self.enabled and not state.get("bypass_step_cache")
+
+    def get(self, agent_name: str, state: dict) -> Optional[str]:
+        """Return the cached response of the agent for this step, if any."""
+        """返回该智能体在此步骤上的缓存响应（如果有）。"""
+        if not self._usable(state):
+            return None
+        result = self._cache.get(make_step_key(agent_name, state))
+        if result is not None:
+            logger.info(f"Step cache hit for {agent_name}")
+        return result
+
+    def set(self, agent_name: str, state: dict, result: str) -> None:
+        """Store the response of the agent for this step.
+
+        Bypassed requests still refresh the entry with their fresh result.
+        """
+        """
+        存储该智能体在此步骤上的响应。
+
+        绕过缓存的请求仍会用其最新结果刷新缓存条目。
+        """
+        if not self.enabled:
+            return
+        self._cache.set(make_step_key(agent_name, state), result)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+# 进程内共享的步骤结果缓存实例
+step_cache = StepCache()
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Optional, TypeVar
+
+# 定义泛型类型变量，用于缓存值的类型注解
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """A thread-safe in-memory cache with per-entry TTL and LRU eviction."""
+    """线程安全的内存缓存，支持条目过期时间（TTL）和最近最少使用（LRU）淘汰策略。"""
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        ttl: float = 3600,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size  # 最大条目数，超出后淘汰最久未使用的条目
+        self.ttl = ttl  # 条目的存活时间（秒）
+        self._clock = clock  # 时钟函数，便于测试时替换
+        self._data: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        # 命中率统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Return the cached value, or None if it is missing or expired."""
+        """返回缓存值；如果不存在或已过期则返回None。"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                # 条目已过期，删除并视为未命中
+                del self._data[key]
+                self.misses += 1
+                return None
+            # 命中后移动到末尾，标记为最近使用
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entries if full."""
+        """存储一个值；如果缓存已满则淘汰最久未使用的条目。"""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a single entry if present."""
+        """删除指定条目（如果存在）。"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries and reset statistics."""
+        """清空所有条目并重置统计数据。"""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, Any]:
+        """Return hit/miss counters and the current hit rate."""
+        """返回命中/未命中计数以及当前命中率。"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
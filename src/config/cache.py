@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+# Step result cache configuration
+# 智能体步骤结果缓存的配置
+STEP_CACHE_ENABLED = os.getenv("STEP_CACHE_ENABLED", "true").lower() == "true"
+STEP_CACHE_TTL = int(os.getenv("STEP_CACHE_TTL", "3600"))  # 缓存条目的存活时间（秒）
+STEP_CACHE_MAX_SIZE = int(os.getenv("STEP_CACHE_MAX_SIZE", "256"))  # 最大缓存条目数
+
+# Blob store configuration
+# 大型消息内容（抓取的文章、代码输出等）的内容寻址存储配置
+BLOB_STORE_DIR = os.getenv(
+    "BLOB_STORE_DIR", os.path.join(tempfile.gettempdir(), "langmanus", "blobs")
+)  # 存储目录
+BLOB_INLINE_MAX_CHARS = int(os.getenv("BLOB_INLINE_MAX_CHARS", "4000"))  # 超过该长度的内容存入存储，状态中只保留引用
+BLOB_PROMPT_MAX_CHARS = int(os.getenv("BLOB_PROMPT_MAX_CHARS", "50000"))  # 提示中展开每个引用时保留的最大字符数
+BLOB_MEMORY_CACHE_SIZE = 64  # 内存中缓存的最近使用的内容数量
+BLOB_MAX_AGE = int(os.getenv("BLOB_MAX_AGE", str(7 * 24 * 3600)))  # 启动时清理超过该时间（秒）未使用的内容
+
+# Shared state store configuration
+# 多个工作进程之间共享的状态存储（步骤结果缓存、搜索缓存、后台任务）
+# memory：不共享，状态保存在各进程内存中；sqlite：使用本机的SQLite数据库；
+# 也可以指定"模块路径:类名"来使用自定义的StateStore实现
+STATE_STORE = os.getenv("STATE_STORE", "memory")
+STATE_STORE_PATH = os.getenv(
+    "STATE_STORE_PATH", os.path.join(tempfile.gettempdir(), "langmanus", "state.db")
+)  # SQLite数据库文件路径
@@ -1,2 +1,67 @@
+import os
+
 # Tool configuration
 TAVILY_MAX_RESULTS = 5
+
+# Search backend: "tavily", "local" (BM25 over crawled articles) or "hybrid"
+# (local results when they are good enough, otherwise Tavily, falling back to
+# local results when Tavily fails)
+# 搜索后端："tavily"、"local"（基于已抓取文章的BM25检索）或"hybrid"（本地结果足够好时直接使用，
+# 否则调用Tavily，Tavily失败时退回本地结果）
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "tavily")
+LOCAL_SEARCH_MIN_SCORE = float(os.getenv("LOCAL_SEARCH_MIN_SCORE", "5.0"))  # hybrid模式下直接使用本地结果所需的最低BM25得分
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH")  # 本地语料的持久化文件（JSONL），为空时仅保存在内存中
+LOCAL_INDEX_MAX_ARTICLES = int(os.getenv("LOCAL_INDEX_MAX_ARTICLES", "5000"))  # 本地索引最多保留的文章数量
+
+# Python REPL worker pool configuration
+# Python代码执行工作进程池的配置
+REPL_POOL_SIZE = int(os.getenv("REPL_POOL_SIZE", "2"))  # 预先启动的工作进程数量
+REPL_TIMEOUT = float(os.getenv("REPL_TIMEOUT", "120"))  # 单次代码执行的超时时间（秒）
+REPL_MEMORY_LIMIT_MB = int(os.getenv("REPL_MEMORY_LIMIT_MB", "2048"))  # 每个工作进程的内存上限（MB），0表示不限制
+REPL_MAX_SESSIONS_PER_WORKER = 32  # 每个工作进程最多保留的会话命名空间数量
+REPL_PRELOAD_MODULES = ["pandas", "numpy"]  # 工作进程启动时预先导入的模块
+
+# Bash tool configuration
+# Bash命令执行工具的配置
+BASH_TIMEOUT = float(os.getenv("BASH_TIMEOUT", "120"))  # 单条命令的超时时间（秒）
+BASH_MAX_OUTPUT_BYTES = int(os.getenv("BASH_MAX_OUTPUT_BYTES", "65536"))  # 保留的输出字节数上限（头部和尾部各占一半）
+BASH_PROGRESS_INTERVAL = 0.5  # 流式发送部分输出的最小间隔（秒）
+
+# Search layer configuration
+# 搜索层的配置
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))  # 搜索结果的缓存时间（秒）
+SEARCH_CACHE_MAX_SIZE = int(os.getenv("SEARCH_CACHE_MAX_SIZE", "1024"))  # 最多缓存的查询数量
+SEARCH_MAX_CONCURRENCY = int(os.getenv("SEARCH_MAX_CONCURRENCY", "4"))  # 批量查询的最大并发数
+
+# Browser pool configuration
+# 浏览器池的配置
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))  # 常驻的浏览器实例数量
+BROWSER_MAX_SESSIONS = int(os.getenv("BROWSER_MAX_SESSIONS", "4"))  # 同时运行的浏览器任务上限
+BROWSER_RECYCLE_AFTER = int(os.getenv("BROWSER_RECYCLE_AFTER", "20"))  # 每个浏览器实例执行多少个任务后重建，0表示不重建
+BROWSER_WARM_UP = os.getenv("BROWSER_WARM_UP", "false").lower() == "true"  # 是否在服务启动时预先启动浏览器
+
+# Compact page state for the browser agent
+# 浏览器代理页面状态压缩的配置
+BROWSER_COMPACT_PAGE_STATE = os.getenv("BROWSER_COMPACT_PAGE_STATE", "false").lower() == "true"  # 是否压缩发送给视觉模型的页面状态
+BROWSER_SCREENSHOT_MAX_WIDTH = int(os.getenv("BROWSER_SCREENSHOT_MAX_WIDTH", "1024"))  # 截图缩放后的最大宽度（像素）
+BROWSER_SCREENSHOT_MAX_BYTES = int(os.getenv("BROWSER_SCREENSHOT_MAX_BYTES", "120000"))  # 压缩后截图的字节预算
+BROWSER_SCREENSHOT_HASH_DISTANCE = int(os.getenv("BROWSER_SCREENSHOT_HASH_DISTANCE", "2"))  # 感知哈希差异不超过该值时视为页面未变化，负数表示从不跳过截图
+BROWSER_DOM_MAX_CHARS = int(os.getenv("BROWSER_DOM_MAX_CHARS", "8000"))  # 元素列表超过该长度时改用精简摘要
+
+# Tool call tracing configuration
+# 工具调用追踪的配置
+TOOL_TRACE_BUFFER_SIZE = int(os.getenv("TOOL_TRACE_BUFFER_SIZE", "1000"))  # 保留的最近调用记录数量
+TOOL_TRACE_SAMPLE_RATE = float(os.getenv("TOOL_TRACE_SAMPLE_RATE", "1.0"))  # 记录详细数据（输入输出大小）的调用比例
+TOOL_TRACE_PREVIEW_CHARS = 500  # 调试日志中参数和结果保留的最大字符数
+
+# Parallel tool call configuration
+# 同一轮中多个工具调用并发执行的配置
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "8"))  # 同一轮中最多同时执行的工具调用数量
+# 同一轮中每个工具最多同时执行的调用数量；代码和命令可能依赖前一次调用的结果，因此按顺序执行
+TOOL_CONCURRENCY_LIMITS = {
+    "tavily_search": 4,
+    "crawl_tool": 4,
+    "python_repl_tool": 1,
+    "bash_tool": 1,
+    "browser": 1,
+}
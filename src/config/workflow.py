@@ -0,0 +1,79 @@
+import os
+
+# Workflow budget configuration
+# 工作流预算配置：节点与工作流的时间限制、主管迭代次数上限以及循环检测阈值
+
+# 整个工作流的墙钟时间上限（秒）
+WORKFLOW_TIMEOUT = float(os.getenv("WORKFLOW_TIMEOUT", "1800"))
+
+# 每个节点单次执行的墙钟时间上限（秒），可通过 NODE_TIMEOUT_<NODE> 环境变量覆盖
+NODE_TIMEOUTS: dict[str, float] = {
+    node: float(os.getenv(f"NODE_TIMEOUT_{node.upper()}", default))
+    for node, default in {
+        "coordinator": "60",
+        "planner": "300",
+        "supervisor": "60",
+        "researcher": "300",
+        "coder": "300",
+        "browser": "600",
+        "reporter": "300",
+    }.items()
+}
+
+# 主管最多可以委派任务的次数，超过后强制进入报告阶段
+MAX_SUPERVISOR_ITERATIONS = int(os.getenv("MAX_SUPERVISOR_ITERATIONS", "12"))
+
+# 同一智能体产生相同输出的次数达到该值时视为陷入循环
+MAX_REPEATED_OUTPUTS = int(os.getenv("MAX_REPEATED_OUTPUTS", "2"))
+
+# 检查SSE客户端是否已断开连接的间隔（秒），断开后取消对应的工作流
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "1.0"))
+
+# SSE消息增量合并：客户端可以在请求中要求按时间或字符数合并消息增量，这里是服务器允许的上限
+STREAM_COALESCE_MAX_MS = int(os.getenv("STREAM_COALESCE_MAX_MS", "1000"))  # 最长合并时间（毫秒）
+STREAM_COALESCE_MAX_CHARS = int(os.getenv("STREAM_COALESCE_MAX_CHARS", "4096"))  # 每帧最多合并的字符数
+
+# tool_call_result事件中工具结果的默认最大字符数（保留开头和结尾），0表示发送完整结果
+# 客户端可以在请求中通过tool_result_max_chars覆盖
+TOOL_RESULT_EVENT_MAX_CHARS = int(os.getenv("TOOL_RESULT_EVENT_MAX_CHARS", "2000"))
+
+# 后台工作流任务：每个任务的重放缓冲区最多保存的事件数，客户端重连时从中补发错过的事件
+JOB_REPLAY_BUFFER_SIZE = int(os.getenv("JOB_REPLAY_BUFFER_SIZE", "5000"))
+# 任务结束后保留的时间（秒），期间仍可查询状态和重放事件
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+# 最多保留的已结束任务数
+JOB_MAX_RETAINED = int(os.getenv("JOB_MAX_RETAINED", "200"))
+
+# 准入控制：每个工作进程同时运行的工作流数量上限（0表示不限制）
+MAX_CONCURRENT_WORKFLOWS = int(os.getenv("MAX_CONCURRENT_WORKFLOWS", "8"))
+# 名额已满时最多排队等待的请求数，队列已满的请求会收到429响应
+MAX_QUEUED_WORKFLOWS = int(os.getenv("MAX_QUEUED_WORKFLOWS", "32"))
+# 429响应中Retry-After头的秒数
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "10"))
+# 使用共享状态存储时，将后台任务的事件和状态写入存储、以及其他工作进程轮询任务事件的间隔（秒）
+JOB_SYNC_INTERVAL = float(os.getenv("JOB_SYNC_INTERVAL", "0.25"))
+# 使用共享状态存储时，各工作进程将指标快照写入存储的间隔（秒）；/metrics汇总所有工作进程的快照
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", "15"))
+
+# 工作流结束事件：为true时end_of_workflow事件默认只包含消息ID、最终报告和摘要，
+# 完整的对话记录通过分页接口获取；客户端可以在请求中通过compact_end_of_workflow覆盖
+END_OF_WORKFLOW_COMPACT = os.getenv("END_OF_WORKFLOW_COMPACT", "false").lower() == "true"
+# 对话记录的保留时间（秒）和最多保留的工作流数量
+TRANSCRIPT_TTL = float(os.getenv("TRANSCRIPT_TTL", "3600"))
+TRANSCRIPT_MAX_SIZE = int(os.getenv("TRANSCRIPT_MAX_SIZE", "256"))
+# 对话记录接口每页最多返回的消息数
+TRANSCRIPT_PAGE_MAX = 100
+
+# 批量评估：默认同时运行的工作流数量，以及API批量请求允许的最大并发数
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+# 按请求开启的性能分析：为false时拒绝带profile参数的请求
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# 调用栈的采样间隔（秒）
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.01"))
+# 性能分析结果的保留时间（秒）和最多保留的数量
+PROFILE_TTL = float(os.getenv("PROFILE_TTL", "3600"))
+PROFILE_MAX_SIZE = int(os.getenv("PROFILE_MAX_SIZE", "32"))
+# 每个性能分析结果中保留的采样次数最多的调用栈数量
+PROFILE_MAX_STACKS = 500
@@ -1,7 +1,10 @@
 from .article import Article
 from .crawler import Crawler
+from .local_index import LocalSearchIndex, get_local_index
 
 __all__ = [
     "Article",
     "Crawler",
+    "LocalSearchIndex",
+    "get_local_index",
 ]
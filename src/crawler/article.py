@@ -10,12 +10,17 @@ class Article:
     def __init__(self, title: str, html_content: str):
         self.title = title
         self.html_content = html_content
+        self._body_markdown = None
 
     def to_markdown(self, including_title: bool = True) -> str:
         markdown = ""
         if including_title:
             markdown += f"# {self.title}\n\n"
-        markdown += md(self.html_content)
+        # The HTML conversion is expensive and the article is rendered more
+        # than once (for the local index and for the message), so cache it.
+        if self._body_markdown is None:
+            self._body_markdown = md(self.html_content)
+        markdown += self._body_markdown
         return markdown
 
     def to_message(self) -> list[dict]:
@@ -1,7 +1,10 @@
 import sys
 
+from src.config.tools import SEARCH_BACKEND
+
 from .article import Article
 from .jina_client import JinaClient
+from .local_index import get_local_index
 from .readability_extractor import ReadabilityExtractor
 
 
@@ -22,6 +25,11 @@ class Crawler:
         extractor = ReadabilityExtractor()
         article = extractor.extract_article(html)
         article.url = url
+        # With the local or hybrid search backend, fetched articles go into
+        # the local search index, so the researcher can search them offline
+        # or when Tavily is unavailable.
+        if SEARCH_BACKEND in ("local", "hybrid"):
+            get_local_index().add_article(article)
         return article
 
 
@@ -0,0 +1,310 @@
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from src.config.tools import LOCAL_INDEX_MAX_ARTICLES, LOCAL_INDEX_PATH
+
+from .article import Article
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+# 拉丁字母单词和数字，或单个中日韩字符
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[぀-ヿ㐀-鿿가-힯]")
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-鿿가-힯]")
+
+# 段落的目标长度（字符数），文章按段落建立索引
+PASSAGE_SIZE = 800
+
+# 语料文件中过期记录（被替换或淘汰的文章）少于该数量时不压缩
+COMPACT_MIN_STALE = 100
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into index terms.
+
+    Latin words are kept whole; CJK text has no spaces, so it is indexed as
+    overlapping character bigrams.
+    """
+    """
+    将文本切分为索引词。
+
+    拉丁字母单词保持完整；中日韩文本没有空格，因此按重叠的双字组合建立索引。
+    """
+    terms = []
+    previous_cjk = None
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if _CJK_PATTERN.match(token):
+            if previous_cjk is not None:
+                terms.append(previous_cjk + token)
+            else:
+                terms.append(token)
+            previous_cjk = token
+        else:
+            terms.append(token)
+            previous_cjk = None
+    return terms
+
+
+def split_passages(text: str, size: int = PASSAGE_SIZE) -> list[str]:
+    """Group paragraphs into passages of roughly `size` characters."""
+    """将自然段合并为长度约为`size`个字符的段落。"""
+    passages, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) > size:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+    return passages
+
+
+class LocalSearchIndex:
+    """An incremental BM25 index over crawled articles.
+
+    Articles are split into passages, and each passage is a document. Search
+    results have the same shape as Tavily results.
+
+    The corpus file is appended to as articles are added. Re-crawled and
+    evicted articles leave stale records behind, so once the stale records
+    outnumber the current articles the file is rewritten with the latest
+    record of each of its most recent articles. Worker processes may share
+    the file: appends and rewrites hold a file lock, and a rewrite keeps the
+    articles other workers added.
+    """
+    """
+    基于已抓取文章的增量BM25索引。
+
+    文章被切分为段落，每个段落作为一个文档。搜索结果的格式与Tavily结果相同。
+
+    添加文章时追加写入语料文件。重新抓取和被淘汰的文章会在文件中留下过期记录，
+    过期记录多于当前文章数时重写该文件，只保留最近的各篇文章的最新记录。
+    多个工作进程可以共享该文件：追加和重写时持有文件锁，重写时保留其他工作进程添加的文章。
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_articles: int = LOCAL_INDEX_MAX_ARTICLES,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.path = path  # JSONL格式的语料文件，为空时仅保存在内存中
+        self.max_articles = max_articles
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[int, int]] = {}  # 索引词 -> {文档ID: 词频}
+        self._docs: dict[int, dict] = {}
+        self._articles: OrderedDict[str, list[int]] = OrderedDict()  # URL -> 文档ID列表
+        self._total_length = 0
+        self._next_id = 0
+        self._stale = 0  # 语料文件中过期记录的数量
+        self._lock = threading.RLock()
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def __len__(self) -> int:
+        return len(self._articles)
+
+    def _load(self, path: str) -> None:
+        with self._file_lock(), open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 损坏的行也算作过期记录，压缩时一并清除
+                    self._stale += 1
+                    continue
+                self._index(record["url"], record["title"], record["text"])
+        logger.info(f"Loaded {len(self._articles)} articles into the local index")
+        self._maybe_compact()
+
+    def add_article(self, article: Article) -> None:
+        """Index a crawled article, replacing any previous version of its URL."""
+        """为抓取的文章建立索引，替换该URL之前的版本。"""
+        url = getattr(article, "url", None)
+        if not url:
+            return
+        title = article.title or ""
+        text = article.to_markdown(including_title=False)
+        with self._lock:
+            self._index(url, title, text)
+            if self.path:
+                with self._file_lock(), open(self.path, "a", encoding="utf-8") as f:
+                    f.write(self._record(url, title, text))
+                self._maybe_compact()
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        # 共享语料文件的工作进程之间互斥，重写期间追加的记录不会丢失
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _record(url: str, title: str, text: str) -> str:
+        return json.dumps({"url": url, "title": title, "text": text}, ensure_ascii=False) + "\n"
+
+    def _maybe_compact(self) -> None:
+        # 过期记录多于当前文章时才重写，重写的开销分摊到多次添加上
+        if self.path and self._stale >= max(len(self._articles), COMPACT_MIN_STALE):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the corpus file with the latest record of its most recent articles."""
+        """重写语料文件，只保留最近的各篇文章的最新记录。"""
+        if not self.path:
+            return
+        with self._lock, self._file_lock():
+            # 从文件而不是本进程的索引中读取文章，保留其他工作进程添加的文章
+            records: OrderedDict[str, str] = OrderedDict()
+            dropped = 0
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        url = json.loads(line)["url"]
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        dropped += 1
+                        continue
+                    if url in records:
+                        dropped += 1
+                        records.move_to_end(url)
+                    records[url] = line if line.endswith("\n") else line + "\n"
+            while len(records) > self.max_articles:
+                records.popitem(last=False)
+                dropped += 1
+            # 每个进程使用各自的临时文件，先写入临时文件再替换，中断时不会留下不完整的语料文件
+            fd, temp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.writelines(records.values())
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            logger.info(f"Compacted the local index corpus: dropped {dropped} stale records")
+            self._stale = 0
+
+    def _index(self, url: str, title: str, text: str) -> None:
+        with self._lock:
+            if url in self._articles:
+                # 文件中该URL之前的记录已经过期
+                self._stale += 1
+            self._remove(url)
+            doc_ids = []
+            for passage in split_passages(text):
+                # 包含标题，使主题相关文章的段落排名更靠前
+                terms = Counter(tokenize(f"{title}\n{passage}"))
+                if not terms:
+                    continue
+                doc_id = self._next_id
+                self._next_id += 1
+                length = sum(terms.values())
+                self._docs[doc_id] = {
+                    "url": url,
+                    "title": title,
+                    "content": passage,
+                    "length": length,
+                }
+                self._total_length += length
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[doc_id] = tf
+                doc_ids.append(doc_id)
+            self._articles[url] = doc_ids
+            # 超出容量时淘汰最早加入的文章
+            while len(self._articles) > self.max_articles:
+                self._remove(next(iter(self._articles)))
+                self._stale += 1
+
+    def _remove(self, url: str) -> None:
+        for doc_id in self._articles.pop(url, []):
+            doc = self._docs.pop(doc_id)
+            self._total_length -= doc["length"]
+            for term in set(tokenize(f"{doc['title']}\n{doc['content']}")):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def search(self, query: str, max_results: int = 5) -> list[dict]:
+        """Return the best passage of each of the top matching articles."""
+        """返回匹配度最高的各篇文章中得分最高的段落。"""
+        with self._lock:
+            n = len(self._docs)
+            if n == 0:
+                return []
+            avg_length = self._total_length / n
+            scores: dict[int, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    length = self._docs[doc_id]["length"]
+                    denominator = tf + self.k1 * (
+                        1 - self.b + self.b * length / avg_length
+                    )
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (
+                        self.k1 + 1
+                    ) / denominator
+
+            # 每篇文章只返回得分最高的段落
+            results, seen_urls = [], set()
+            for doc_id, score in sorted(scores.items(), key=lambda x: -x[1]):
+                doc = self._docs[doc_id]
+                if doc["url"] in seen_urls:
+                    continue
+                seen_urls.add(doc["url"])
+                results.append(
+                    {
+                        "title": doc["title"],
+                        "url": doc["url"],
+                        "content": doc["content"],
+                        "score": round(score, 4),
+                    }
+                )
+                if len(results) >= max_results:
+                    break
+            return results
+
+
+# 进程内共享的本地索引，首次使用时加载语料
+_local_index: Optional[LocalSearchIndex] = None
+_local_index_lock = threading.Lock()
+
+
+def get_local_index() -> LocalSearchIndex:
+    """Return the shared local index, loading the corpus on first use."""
+    """返回共享的本地索引，首次使用时加载语料。"""
+    global _local_index
+    if _local_index is None:
+        with _local_index_lock:
+            if _local_index is None:
+                _local_index = LocalSearchIndex(path=LOCAL_INDEX_PATH)
+    return _local_index
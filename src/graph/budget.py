@@ -0,0 +1,270 @@
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler, dispatch_custom_event
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables.config import ensure_config, var_child_runnable_config
+from langchain_core.tracers.context import register_configure_hook
+from langgraph.types import Command
+
+from src.config import TEAM_MEMBERS
+from src.config.workflow import (
+    MAX_REPEATED_OUTPUTS,
+    MAX_SUPERVISOR_ITERATIONS,
+    NODE_TIMEOUTS,
+)
+from src.service.cancellation import CANCELLATION_CONFIG_KEY, CancellationToken
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+# 预算耗尽时在事件流中发出的自定义事件名称
+BUDGET_EXHAUSTED_EVENT = "budget_exhausted"
+
+
+class NodeTimeoutError(Exception):
+    """Raised inside a node when its wall-clock deadline has passed."""
+    """当节点的墙钟时间期限已过时，在节点内部抛出的异常。"""
+
+
+class DeadlineCallbackHandler(BaseCallbackHandler):
+    """Aborts model and tool calls once the node deadline has passed.
+
+    The handler is attached to every callback manager created while a node
+    runs, so an expired deadline interrupts streaming model responses at the
+    next token and prevents further model or tool calls from starting. Calls
+    that are already blocked are handled by with_deadline.
+    """
+    """
+    当节点期限已过时中止模型和工具调用。
+
+    该处理器会附加到节点运行期间创建的所有回调管理器上，因此期限到期后，
+    流式模型响应会在下一个token处被中断，且不会再启动新的模型或工具调用。
+    已经阻塞的调用由with_deadline处理。
+    """
+
+    raise_error = True  # 让异常传播到调用方，而不是被回调管理器吞掉
+    run_inline = True
+
+    def __init__(self, node: str, deadline: float):
+        self.node = node
+        self.deadline = deadline
+
+    def check(self) -> None:
+        if time.time() > self.deadline:
+            raise NodeTimeoutError(f"{self.node} exceeded its deadline")
+
+    def on_chat_model_start(self, *args: Any, **kwargs: Any) -> None:
+        self.check()
+
+    def on_llm_start(self, *args: Any, **kwargs: Any) -> None:
+        self.check()
+
+    def on_llm_new_token(self, *args: Any, **kwargs: Any) -> None:
+        self.check()
+
+    def on_tool_start(self, *args: Any, **kwargs: Any) -> None:
+        self.check()
+
+
+# 当前节点的期限处理器，通过配置钩子自动注入所有回调管理器
+_deadline_handler: ContextVar[Optional[DeadlineCallbackHandler]] = ContextVar(
+    "deadline_handler", default=None
+)
+register_configure_hook(_deadline_handler, inheritable=True)
+
+
+def emit_budget_event(node: str, reason: str, detail: str) -> None:
+    """Publish a budget exhaustion event to the workflow event stream."""
+    """将预算耗尽事件发布到工作流事件流中。"""
+    logger.warning(f"Budget exhausted in {node}: {detail}")
+    try:
+        dispatch_custom_event(
+            BUDGET_EXHAUSTED_EVENT,
+            {"node": node, "reason": reason, "detail": detail},
+        )
+    except RuntimeError:
+        # 不在运行上下文中（例如直接调用节点函数）时无法分发事件
+        pass
+
+
+def force_report(node: str, reason: str, detail: str, state: dict) -> Command:
+    """Route the workflow to the reporter, or end it if that is not possible.
+
+    The reporter summarizes what has been gathered so far. If the reporter
+    itself ran out of budget, or the workflow never reached the supervisor,
+    the workflow ends immediately.
+    """
+    """
+    将工作流路由到报告者，如果无法路由则直接结束工作流。
+
+    报告者会总结目前已收集的信息。如果报告者本身耗尽了预算，或者工作流尚未
+    进入主管阶段，则立即结束工作流。
+    """
+    emit_budget_event(node, reason, detail)
+    goto = "reporter"
+    if node in ("coordinator", "planner", "reporter") or state.get(
+        "budget_exhausted"
+    ):
+        goto = "__end__"
+    return Command(
+        update={
+            "messages": [HumanMessage(content=detail, name="budget")],
+            "budget_exhausted": reason,
+        },
+        goto=goto,
+    )
+
+
+def check_supervisor_budget(state: dict) -> Optional[tuple[str, str]]:
+    """Return (reason, detail) if the supervisor must stop delegating."""
+    """如果主管必须停止委派任务，则返回(原因, 详情)。"""
+    iterations = state.get("supervisor_iterations", 0)
+    if iterations >= MAX_SUPERVISOR_ITERATIONS:
+        return (
+            "max_iterations",
+            f"Supervisor reached the limit of {MAX_SUPERVISOR_ITERATIONS} iterations.",
+        )
+
+    deadline = state.get("workflow_deadline")
+    if deadline and time.time() > deadline:
+        return "workflow_timeout", "Workflow exceeded its deadline."
+
+    repeated = find_repeated_output(state.get("messages", []))
+    if repeated:
+        return (
+            "repeated_output",
+            f"{repeated} returned the same response {MAX_REPEATED_OUTPUTS} times.",
+        )
+    return None
+
+
+def find_repeated_output(
+    messages: list, threshold: int = MAX_REPEATED_OUTPUTS
+) -> Optional[str]:
+    """Return the agent whose latest response has been seen `threshold` times.
+
+    Only the most recent agent response is checked, so a loop is reported as
+    soon as it forms rather than for any historical duplicate.
+    """
+    """
+    如果最近一条智能体响应已经出现了`threshold`次，则返回该智能体名称。
+
+    只检查最近一条智能体响应，从而在循环刚形成时就能发现，而不会因历史中的
+    重复内容误报。
+    """
+    responses = [
+        msg for msg in messages if getattr(msg, "name", None) in TEAM_MEMBERS
+    ]
+    if not responses:
+        return None
+    last = responses[-1]
+    count = sum(
+        1
+        for msg in responses
+        if msg.name == last.name and msg.content == last.content
+    )
+    return last.name if count >= threshold else None
+
+
+def _run_until(func: Callable[[], Any], deadline: float) -> Any:
+    """Run func in its own thread and wait for it until the deadline.
+
+    Raises NodeTimeoutError when the deadline passes first; func keeps
+    running in the background until its blocking call returns, and its
+    result is discarded.
+    """
+    """
+    在独立线程中运行func，并最多等待到期限。
+
+    期限先到时抛出NodeTimeoutError；func会在后台继续运行到其阻塞调用返回，结果被丢弃。
+    """
+    future: Future = Future()
+    context = contextvars.copy_context()
+
+    def run() -> None:
+        try:
+            future.set_result(context.run(func))
+        except BaseException as e:
+            future.set_exception(e)
+
+    # 使用守护线程，仍在阻塞的调用不会阻止进程退出
+    threading.Thread(target=run, name="node-deadline", daemon=True).start()
+    try:
+        return future.result(timeout=max(0.0, deadline - time.time()))
+    except FutureTimeoutError:
+        raise NodeTimeoutError("node exceeded its deadline") from None
+
+
+def with_deadline(node: str, func: Callable[[dict], Command]) -> Callable:
+    """Wrap a graph node so that it runs under its configured deadline.
+
+    The deadline is the node timeout, clipped to the workflow deadline for
+    every node except the reporter, which always gets its full timeout so a
+    report can still be written after the workflow budget runs out.
+
+    The node runs in its own thread with its own cancellation token. When
+    the deadline passes, the wrapper returns at once even if a model or tool
+    call is blocked, and cancels the token, which kills bash commands,
+    interrupts Python REPL code and closes browser tasks of the node.
+    Cancelling the workflow cancels the node's token too.
+    """
+    """
+    包装图节点，使其在配置的期限内运行。
+
+    期限为节点超时时间，并且除报告者以外的所有节点都会被裁剪到工作流期限以内；
+    报告者始终获得完整的超时时间，以便在工作流预算耗尽后仍能写出报告。
+
+    节点在独立线程中运行，并使用自己的取消令牌。期限到达时，即使模型或工具调用仍在阻塞，
+    包装函数也会立即返回，并取消该令牌，从而终止节点的bash命令、中断Python REPL代码
+    并关闭浏览器任务。取消工作流时也会取消节点的令牌。
+    """
+
+    @functools.wraps(func)
+    def wrapper(state: dict) -> Command:
+        deadline = time.time() + NODE_TIMEOUTS.get(node, float("inf"))
+        workflow_deadline = state.get("workflow_deadline")
+        if workflow_deadline and node != "reporter":
+            deadline = min(deadline, workflow_deadline)
+
+        # 节点自己的取消令牌，工作流被取消时一并取消
+        config = ensure_config()
+        configurable = config.get("configurable", {})
+        node_token = CancellationToken()
+        workflow_token = configurable.get(CANCELLATION_CONFIG_KEY)
+        remove_callback = (
+            workflow_token.on_cancel(lambda: node_token.cancel(workflow_token.reason))
+            if workflow_token is not None
+            else lambda: None
+        )
+        # 节点中的工具通过运行配置获取令牌
+        config_token = var_child_runnable_config.set(
+            {**config, "configurable": {**configurable, CANCELLATION_CONFIG_KEY: node_token}}
+        )
+        token = _deadline_handler.set(DeadlineCallbackHandler(node, deadline))
+        try:
+            if deadline == float("inf"):
+                return func(state)
+            return _run_until(lambda: func(state), deadline)
+        except NodeTimeoutError:
+            # 停止仍在阻塞的工具调用
+            node_token.cancel("deadline")
+            return force_report(
+                node,
+                "node_timeout",
+                f"{node} did not finish before its deadline.",
+                state,
+            )
+        finally:
+            _deadline_handler.reset(token)
+            var_child_runnable_config.reset(config_token)
+            remove_callback()
+
+    return wrapper
@@ -1,5 +1,8 @@
+import threading
+
 from langgraph.graph import StateGraph, START
 
+from .budget import with_deadline
 from .types import State
 from .nodes import (
     supervisor_node,
@@ -20,13 +23,31 @@ def build_graph():
     # 添加工作流的起始边，从START指向coordinator节点
     builder.add_edge(START, "coordinator")
     
-    # 添加所有节点到工作流图中
-    builder.add_node("coordinator", coordinator_node)  # 添加协调者节点，负责与用户沟通
-    builder.add_node("planner", planner_node)          # 添加规划者节点，生成完整的执行计划
-    builder.add_node("supervisor", supervisor_node)    # 添加主管节点，决定下一步操作
-    builder.add_node("researcher", research_node)      # 添加研究员节点，执行信息收集任务
-    builder.add_node("coder", code_node)               # 添加程序员节点，执行代码和技术任务
-    builder.add_node("browser", browser_node)          # 添加浏览器节点，执行网页浏览任务
-    builder.add_node("reporter", reporter_node)        # 添加报告者节点，编写最终报告
+    # 添加所有节点到工作流图中，每个节点都在其配置的期限内运行
+    builder.add_node("coordinator", with_deadline("coordinator", coordinator_node))  # 添加协调者节点，负责与用户沟通
+    builder.add_node("planner", with_deadline("planner", planner_node))          # 添加规划者节点，生成完整的执行计划
+    builder.add_node("supervisor", with_deadline("supervisor", supervisor_node))    # 添加主管节点，决定下一步操作
+    builder.add_node("researcher", with_deadline("researcher", research_node))      # 添加研究员节点，执行信息收集任务
+    builder.add_node("coder", with_deadline("coder", code_node))               # 添加程序员节点，执行代码和技术任务
+    builder.add_node("browser", with_deadline("browser", browser_node))          # 添加浏览器节点，执行网页浏览任务
+    builder.add_node("reporter", with_deadline("reporter", reporter_node))        # 添加报告者节点，编写最终报告
     
     return builder.compile()  # 编译工作流图并返回，使其可以被执行
+
+
+# 进程内共享的已编译工作流图
+# CLI和API服务共用同一个实例，避免每个模块导入时都重新编译图
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    """Return the shared compiled workflow graph, building it on first use."""
+    """返回共享的已编译工作流图，首次使用时才进行构建。"""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            # 双重检查，避免并发请求重复编译图
+            if _graph is None:
+                _graph = build_graph()
+    return _graph
@@ -1,17 +1,18 @@
 import logging
 import json
-from copy import deepcopy
 from typing import Literal
 from langchain_core.messages import HumanMessage
 from langgraph.types import Command
 from langgraph.graph import END
 
-from src.agents import research_agent, coder_agent, browser_agent
+from src.agents import get_agent
 from src.agents.llm import get_llm_by_type
+from src.cache import blob_store, step_cache
 from src.config import TEAM_MEMBERS
 from src.config.agents import AGENT_LLM_MAP
 from src.prompts.template import apply_prompt_template
 from src.tools.search import tavily_tool
+from .budget import check_supervisor_budget, force_report
 from .types import State, Router
 
 logger = logging.getLogger(__name__)
@@ -21,20 +22,24 @@ logger = logging.getLogger(__name__)
 RESPONSE_FORMAT = "Response from {}:\n\n<response>\n{}\n</response>\n\n*Please execute the next step.*"
 
 
-def research_node(state: State) -> Command[Literal["supervisor"]]:
+def research_node(state: State) -> Command[Literal["supervisor", "reporter"]]:
     """Node for the researcher agent that performs research tasks."""
     """研究员智能体节点，执行信息收集和研究任务。"""
     logger.info("Research agent starting task")  # 记录研究智能体开始任务
-    result = research_agent.invoke(state)  # 调用研究智能体处理当前状态
+    # 优先使用缓存的步骤结果，命中时跳过整个ReAct循环
+    response = step_cache.get("researcher", state)
+    if response is None:
+        result = get_agent("researcher").invoke(state)  # 调用研究智能体处理当前状态
+        response = result["messages"][-1].content
+        step_cache.set("researcher", state, response)  # 缓存本步骤的结果
     logger.info("Research agent completed task")  # 记录研究智能体完成任务
-    logger.debug(f"Research agent response: {result['messages'][-1].content}")  # 记录研究智能体的详细响应
+    logger.debug("Research agent response: %s", response)  # 记录研究智能体的详细响应
     return Command(
         update={
             "messages": [
                 HumanMessage(
-                    content=RESPONSE_FORMAT.format(
-                        "researcher", result["messages"][-1].content
-                    ),
+                    # 较长的响应保存到内容存储中，状态中只保留引用
+                    content=RESPONSE_FORMAT.format("researcher", blob_store.make_ref(response)),
                     name="researcher",  # 设置消息的发送者为"researcher"
                 )
             ]
@@ -43,20 +48,22 @@ def research_node(state: State) -> Command[Literal["supervisor"]]:
     )
 
 
-def code_node(state: State) -> Command[Literal["supervisor"]]:
+def code_node(state: State) -> Command[Literal["supervisor", "reporter"]]:
     """Node for the coder agent that executes Python code."""
     """程序员智能体节点，执行Python代码和处理技术任务。"""
     logger.info("Code agent starting task")  # 记录代码智能体开始任务
-    result = coder_agent.invoke(state)  # 调用代码智能体处理当前状态
+    # 不使用步骤结果缓存：代码的副作用（REPL中定义的变量、写入的文件）是后续步骤的输入，
+    # 复用其他工作流的结果会跳过这些副作用
+    result = get_agent("coder").invoke(state)  # 调用代码智能体处理当前状态
+    response = result["messages"][-1].content
     logger.info("Code agent completed task")  # 记录代码智能体完成任务
-    logger.debug(f"Code agent response: {result['messages'][-1].content}")  # 记录代码智能体的详细响应
+    logger.debug("Code agent response: %s", response)  # 记录代码智能体的详细响应
     return Command(
         update={
             "messages": [
                 HumanMessage(
-                    content=RESPONSE_FORMAT.format(
-                        "coder", result["messages"][-1].content
-                    ),
+                    # 较长的响应保存到内容存储中，状态中只保留引用
+                    content=RESPONSE_FORMAT.format("coder", blob_store.make_ref(response)),
                     name="coder",  # 设置消息的发送者为"coder"
                 )
             ]
@@ -65,19 +72,21 @@ def code_node(state: State) -> Command[Literal["supervisor"]]:
     )
 
 
-def browser_node(state: State) -> Command[Literal["supervisor"]]:
+def browser_node(state: State) -> Command[Literal["supervisor", "reporter"]]:
     """Node for the browser agent that performs web browsing tasks."""
     """浏览器智能体节点，执行网页浏览和信息提取任务。"""
     logger.info("Browser agent starting task")  # 记录浏览器智能体开始任务 
-    result = browser_agent.invoke(state)  # 调用浏览器智能体处理当前状态
+    result = get_agent("browser").invoke(state)  # 调用浏览器智能体处理当前状态
+    response = result["messages"][-1].content
     logger.info("Browser agent completed task")  # 记录浏览器智能体完成任务
-    logger.debug(f"Browser agent response: {result['messages'][-1].content}")  # 记录浏览器智能体的详细响应
+    logger.debug("Browser agent response: %s", response)  # 记录浏览器智能体的详细响应
     return Command(
         update={
             "messages": [
                 HumanMessage(
+                    # 较长的响应保存到内容存储中，状态中只保留引用
                     content=RESPONSE_FORMAT.format(
-                        "browser", result["messages"][-1].content
+                        "browser", blob_store.make_ref(response)
                     ),
                     name="browser",  # 设置消息的发送者为"browser"
                 )
@@ -91,6 +100,16 @@ def supervisor_node(state: State) -> Command[Literal[*TEAM_MEMBERS, "__end__"]]:
     """Supervisor node that decides which agent should act next."""
     """主管节点，决定下一步由哪个智能体执行操作或完成任务。"""
     logger.info("Supervisor evaluating next action")  # 记录主管正在评估下一步操作
+    # 预算已耗尽且报告者已完成报告时，直接结束工作流
+    if state.get("budget_exhausted"):
+        logger.info("Workflow completed after budget exhaustion")
+        return Command(goto="__end__", update={"next": "__end__"})
+
+    # 检查迭代次数、工作流期限和重复输出，超出预算时强制进入报告阶段
+    exhausted = check_supervisor_budget(state)
+    if exhausted:
+        return force_report("supervisor", *exhausted, state)
+
     messages = apply_prompt_template("supervisor", state)  # 应用主管的提示模板，生成消息列表
     response = (
         get_llm_by_type(AGENT_LLM_MAP["supervisor"])  # 获取主管智能体对应的语言模型
@@ -98,8 +117,8 @@ def supervisor_node(state: State) -> Command[Literal[*TEAM_MEMBERS, "__end__"]]:
         .invoke(messages)  # 调用语言模型处理消息
     )
     goto = response["next"]  # 获取下一步的目标节点
-    logger.debug(f"Current state messages: {state['messages']}")  # 记录当前状态的消息
-    logger.debug(f"Supervisor response: {response}")  # 记录主管的详细响应
+    logger.debug("Current state messages: %s", state["messages"])  # 记录当前状态的消息
+    logger.debug("Supervisor response: %s", response)  # 记录主管的详细响应
 
     if goto == "FINISH":
         goto = "__end__"  # 如果下一步是FINISH，则将目标设为__end__，表示工作流结束
@@ -107,7 +126,13 @@ def supervisor_node(state: State) -> Command[Literal[*TEAM_MEMBERS, "__end__"]]:
     else:
         logger.info(f"Supervisor delegating to: {goto}")  # 记录主管将任务委派给哪个智能体
 
-    return Command(goto=goto, update={"next": goto})  # 返回Command，指示下一步和更新状态
+    return Command(
+        goto=goto,
+        update={
+            "next": goto,
+            "supervisor_iterations": state.get("supervisor_iterations", 0) + 1,  # 累计主管委派次数
+        },
+    )  # 返回Command，指示下一步和更新状态
 
 
 def planner_node(state: State) -> Command[Literal["supervisor", "__end__"]]:
@@ -124,17 +149,20 @@ def planner_node(state: State) -> Command[Literal["supervisor", "__end__"]]:
     # 如果启用规划前搜索，则使用Tavily工具搜索相关信息并添加到提示中
     if state.get("search_before_planning"):
         searched_content = tavily_tool.invoke({"query": state["messages"][-1].content})  # 使用Tavily搜索
-        messages = deepcopy(messages)  # 创建消息列表的深拷贝
-        messages[
-            -1
-        ].content += f"\n\n# Relative Search Results\n\n{json.dumps([{'titile': elem['title'], 'content': elem['content']} for elem in searched_content], ensure_ascii=False)}"  # 将搜索结果添加到最后一条消息中
+        # 只复制最后一条消息并追加搜索结果，不再深拷贝整个消息列表
+        messages[-1] = messages[-1].model_copy(
+            update={
+                "content": messages[-1].content
+                + f"\n\n# Relative Search Results\n\n{json.dumps([{'titile': elem['title'], 'content': elem['content']} for elem in searched_content], ensure_ascii=False)}"  # 将搜索结果添加到最后一条消息中
+            }
+        )
     
     stream = llm.stream(messages)  # 使用流式API调用语言模型
     full_response = ""  # 初始化完整响应
     for chunk in stream:
         full_response += chunk.content  # 累积模型返回的内容块
-    logger.debug(f"Current state messages: {state['messages']}")  # 记录当前状态的消息
-    logger.debug(f"Planner response: {full_response}")  # 记录规划者的详细响应
+    logger.debug("Current state messages: %s", state["messages"])  # 记录当前状态的消息
+    logger.debug("Planner response: %s", full_response)  # 记录规划者的详细响应
 
     # 处理响应格式，移除可能的Markdown代码块标记
     if full_response.startswith("```json"):
@@ -165,8 +193,8 @@ def coordinator_node(state: State) -> Command[Literal["planner", "__end__"]]:
     logger.info("Coordinator talking.")  # 记录协调者正在交谈
     messages = apply_prompt_template("coordinator", state)  # 应用协调者的提示模板，生成消息列表
     response = get_llm_by_type(AGENT_LLM_MAP["coordinator"]).invoke(messages)  # 调用协调者对应的语言模型
-    logger.debug(f"Current state messages: {state['messages']}")  # 记录当前状态的消息
-    logger.debug(f"reporter response: {response}")  # 记录协调者的详细响应
+    logger.debug("Current state messages: %s", state["messages"])  # 记录当前状态的消息
+    logger.debug("reporter response: %s", response)  # 记录协调者的详细响应
 
     goto = "__end__"  # 默认下一步为__end__，结束工作流
     if "handoff_to_planner" in response.content:
@@ -177,14 +205,14 @@ def coordinator_node(state: State) -> Command[Literal["planner", "__end__"]]:
     )
 
 
-def reporter_node(state: State) -> Command[Literal["supervisor"]]:
+def reporter_node(state: State) -> Command[Literal["supervisor", "__end__"]]:
     """Reporter node that write a final report."""
     """报告者节点，负责编写最终报告。"""
     logger.info("Reporter write final report")  # 记录报告者正在编写最终报告
     messages = apply_prompt_template("reporter", state)  # 应用报告者的提示模板，生成消息列表
     response = get_llm_by_type(AGENT_LLM_MAP["reporter"]).invoke(messages)  # 调用报告者对应的语言模型
-    logger.debug(f"Current state messages: {state['messages']}")  # 记录当前状态的消息
-    logger.debug(f"reporter response: {response}")  # 记录报告者的详细响应
+    logger.debug("Current state messages: %s", state["messages"])  # 记录当前状态的消息
+    logger.debug("reporter response: %s", response)  # 记录报告者的详细响应
 
     return Command(
         update={
@@ -28,3 +28,9 @@ class State(MessagesState):
     full_plan: str  # 完整的执行计划，通常由planner节点生成的JSON格式计划
     deep_thinking_mode: bool  # 是否启用深度思考模式，启用时会使用reasoning LLM而不是basic LLM
     search_before_planning: bool  # 是否在规划前执行搜索，为规划提供更多上下文信息
+    bypass_step_cache: bool  # 是否绕过步骤结果缓存，启用时研究员和程序员总是重新执行
+
+    # Budget Variables（预算变量）
+    workflow_deadline: float  # 工作流的截止时间（Unix时间戳），超过后强制进入报告阶段
+    supervisor_iterations: int  # 主管已委派任务的次数
+    budget_exhausted: str  # 预算耗尽的原因，非空时工作流在报告后结束
@@ -1,11 +1,15 @@
 import os
 import re
 from datetime import datetime
+from functools import lru_cache
 
 from langchain_core.prompts import PromptTemplate
 from langgraph.prebuilt.chat_agent_executor import AgentState
 
+from src.cache import blob_store
 
+
+@lru_cache(maxsize=None)
 def get_prompt_template(prompt_name: str) -> str:
     template = open(os.path.join(os.path.dirname(__file__), f"{prompt_name}.md")).read()
     # Escape curly braces using backslash
@@ -15,9 +19,18 @@ def get_prompt_template(prompt_name: str) -> str:
     return template
 
 
-def apply_prompt_template(prompt_name: str, state: AgentState) -> list:
-    system_prompt = PromptTemplate(
+@lru_cache(maxsize=None)
+def load_prompt_template(prompt_name: str) -> PromptTemplate:
+    # Parse each prompt file once and reuse the template across requests
+    return PromptTemplate(
         input_variables=["CURRENT_TIME"],
         template=get_prompt_template(prompt_name),
-    ).format(CURRENT_TIME=datetime.now().strftime("%a %b %d %Y %H:%M:%S %z"), **state)
-    return [{"role": "system", "content": system_prompt}] + state["messages"]
+    )
+
+
+def apply_prompt_template(prompt_name: str, state: AgentState) -> list:
+    system_prompt = load_prompt_template(prompt_name).format(CURRENT_TIME=datetime.now().strftime("%a %b %d %Y %H:%M:%S %z"), **state)
+    # Large payloads are kept in the blob store; expand them only for the prompt
+    return [{"role": "system", "content": system_prompt}] + blob_store.materialize_messages(
+        state["messages"]
+    )
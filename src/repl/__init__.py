@@ -0,0 +1,8 @@
+from .pool import ReplPool, ReplSessionLostError, ReplTimeoutError, get_repl_pool
+
+__all__ = [
+    "ReplPool",
+    "ReplSessionLostError",
+    "ReplTimeoutError",
+    "get_repl_pool",
+]
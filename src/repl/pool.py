@@ -0,0 +1,345 @@
+import asyncio
+import atexit
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from src.config.tools import (
+    REPL_MAX_SESSIONS_PER_WORKER,
+    REPL_MEMORY_LIMIT_MB,
+    REPL_POOL_SIZE,
+    REPL_PRELOAD_MODULES,
+    REPL_TIMEOUT,
+)
+from .worker import worker_main
+
+if TYPE_CHECKING:
+    # 工作进程也会导入本包，运行时不导入取消模块以保持工作进程轻量
+    from src.service.cancellation import CancellationToken
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+# 使用spawn方式创建进程，避免fork带有线程的服务器进程带来的问题，并兼容Windows
+_mp_context = multiprocessing.get_context("spawn")
+
+# 等待工作进程启动（包括预先导入模块）的最长时间（秒）
+WORKER_START_TIMEOUT = 60
+
+
+class ReplTimeoutError(Exception):
+    """Raised when code does not finish within the execution timeout."""
+    """当代码未在执行超时时间内完成时抛出的异常。"""
+
+
+class ReplSessionLostError(Exception):
+    """Raised when the namespace of a session was lost before its code ran.
+
+    This happens when the worker restarted (after another execution timed out
+    or the process died) or evicted the session to stay under its session
+    limit. The code is not executed; the next execution of the session starts
+    from an empty namespace.
+    """
+    """
+    当会话的命名空间在代码执行前已经丢失时抛出的异常。
+
+    工作进程重启（其他代码执行超时或进程退出）或为了不超过会话数量上限淘汰该会话时会发生。
+    代码不会被执行；该会话的下一次执行从空的命名空间开始。
+    """
+
+
+class ReplWorker:
+    """Handle to one persistent Python worker process."""
+    """一个常驻Python工作进程的句柄。"""
+
+    def __init__(
+        self,
+        preload_modules: list[str],
+        memory_limit_mb: int,
+        max_sessions: int,
+        state_lock: Optional[threading.Lock] = None,
+    ):
+        self.preload_modules = preload_modules
+        self.memory_limit_mb = memory_limit_mb
+        self.max_sessions = max_sessions
+        # 以下会话记录由进程池和工作进程共同修改，统一由state_lock保护
+        self.sessions: set[str] = set()  # 分配到该进程的会话ID
+        self.resumable: set[str] = set()  # 已在该进程中执行过代码、命名空间应当存在的会话ID
+        self.pending_releases: list[str] = []  # 等待随下一个请求一起释放的会话ID
+        self.state_lock = state_lock or threading.Lock()
+        self._lock = threading.Lock()  # 一个进程同一时间只执行一个请求
+        self._process: Optional[multiprocessing.Process] = None
+        self._conn = None
+
+    def start(self) -> None:
+        """Spawn the worker process and wait until its preloads are done."""
+        """启动工作进程，并等待其完成模块预加载。"""
+        parent_conn, child_conn = _mp_context.Pipe()
+        self._process = _mp_context.Process(
+            target=worker_main,
+            args=(
+                child_conn,
+                self.preload_modules,
+                self.memory_limit_mb,
+                self.max_sessions,
+            ),
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        if not self._conn.poll(WORKER_START_TIMEOUT):
+            self.stop()
+            raise RuntimeError("Python REPL worker failed to start")
+        self._conn.recv()
+
+    def stop(self) -> None:
+        """Terminate the worker process."""
+        """终止工作进程。"""
+        if self._process is not None and self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def restart(self) -> None:
+        """Replace the worker process; the namespaces of all its sessions are lost.
+
+        The sessions stay pinned to the worker, and their next execution
+        raises ReplSessionLostError instead of silently running against an
+        empty namespace.
+        """
+        """
+        替换工作进程；该进程上所有会话的命名空间都会丢失。
+
+        这些会话仍然固定分配在该工作进程上，它们的下一次执行会抛出ReplSessionLostError，
+        而不是在空的命名空间中静默执行。
+        """
+        self.stop()
+        with self.state_lock:
+            # 新进程中没有任何命名空间，无需再释放
+            self.pending_releases = []
+        self.start()
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def interrupt(self) -> None:
+        """Interrupt the code that is running in the worker, keeping its sessions."""
+        """中断工作进程中正在执行的代码，保留其中的会话。"""
+        if os.name == "posix" and self.is_alive():
+            os.kill(self._process.pid, signal.SIGINT)
+
+    def request(
+        self,
+        message: dict,
+        timeout: float,
+        cancellation: Optional["CancellationToken"] = None,
+    ) -> dict:
+        """Send a request and wait for its reply.
+
+        On timeout or if the process dies, the worker is restarted so the next
+        request gets a healthy process. Cancelling the token interrupts the
+        request while it runs. A run request raises ReplSessionLostError if
+        the session already ran code here but its namespace is gone.
+        """
+        """
+        发送请求并等待响应。
+
+        如果超时或进程意外退出，工作进程会被重启，以保证下一个请求能使用健康的进程。
+        请求执行期间取消令牌会中断该请求。如果会话之前已在该进程中执行过代码但命名空间
+        已经不存在，执行请求会抛出ReplSessionLostError。
+        """
+        session_id = message.get("session_id")
+        with self._lock:
+            if cancellation is not None:
+                # 等待其他请求期间工作流可能已被取消
+                cancellation.check()
+            if not self.is_alive():
+                self.restart()
+            with self.state_lock:
+                # 顺带释放已结束会话的命名空间
+                message = {**message, "release": self.pending_releases}
+                self.pending_releases = []
+                if message.get("op") == "run":
+                    # 命名空间应当存在时，工作进程找不到它就报告丢失，而不是创建空的命名空间
+                    message["resume"] = session_id in self.resumable
+            remove_callback = lambda: None
+            try:
+                self._conn.send(message)
+                if cancellation is not None:
+                    # 只在本请求执行期间注册，避免中断其他会话的代码
+                    remove_callback = cancellation.on_cancel(self.interrupt)
+                if not self._conn.poll(timeout):
+                    self.restart()
+                    with self.state_lock:
+                        # 超时错误已经告知该会话变量丢失，下一次执行直接使用新的命名空间
+                        self.resumable.discard(session_id)
+                    raise ReplTimeoutError(
+                        f"Execution timed out after {timeout:.0f}s"
+                    )
+                reply = self._conn.recv()
+            except (EOFError, BrokenPipeError, ConnectionResetError):
+                # 进程被杀死（例如超出内存限制）
+                self.restart()
+                raise RuntimeError("Python REPL worker exited unexpectedly")
+            finally:
+                remove_callback()
+            if message.get("op") == "run":
+                with self.state_lock:
+                    if reply["op"] == "lost":
+                        self.resumable.discard(session_id)
+                    elif session_id in self.sessions:
+                        self.resumable.add(session_id)
+                if reply["op"] == "lost":
+                    raise ReplSessionLostError(
+                        "The Python session was reset because its worker process "
+                        "restarted or evicted it; variables defined by earlier code "
+                        "are gone and the code was not run"
+                    )
+            if cancellation is not None:
+                cancellation.check()
+            return reply
+
+
+class ReplPool:
+    """A pool of pre-started Python workers with per-session namespaces.
+
+    Each session (normally one workflow) is pinned to a worker so that the
+    variables it defines persist across its coder steps, while different
+    sessions never see each other's globals.
+    """
+    """
+    预先启动的Python工作进程池，每个会话拥有独立的命名空间。
+
+    每个会话（通常对应一个工作流）会固定分配到一个工作进程，因此它定义的变量
+    能在多次程序员步骤之间保留，而不同会话之间不会看到彼此的全局变量。
+    """
+
+    def __init__(
+        self,
+        size: int = REPL_POOL_SIZE,
+        timeout: float = REPL_TIMEOUT,
+        memory_limit_mb: int = REPL_MEMORY_LIMIT_MB,
+        preload_modules: list[str] = REPL_PRELOAD_MODULES,
+        max_sessions_per_worker: int = REPL_MAX_SESSIONS_PER_WORKER,
+    ):
+        self.timeout = timeout
+        # 保护会话分配以及各工作进程的会话记录
+        self._lock = threading.Lock()
+        self._workers = [
+            ReplWorker(preload_modules, memory_limit_mb, max_sessions_per_worker, self._lock)
+            for _ in range(max(1, size))
+        ]
+        self._assignments: dict[str, ReplWorker] = {}  # 会话ID到工作进程的映射
+        self._started = False
+
+    def start(self) -> None:
+        """Start all worker processes. Safe to call more than once."""
+        """启动所有工作进程，可以安全地重复调用。"""
+        with self._lock:
+            if self._started:
+                return
+            for worker in self._workers:
+                worker.start()
+            self._started = True
+            logger.info(f"Started {len(self._workers)} Python REPL workers")
+
+    def shutdown(self) -> None:
+        """Stop all worker processes."""
+        """停止所有工作进程。"""
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._assignments.clear()
+            self._started = False
+
+    def _worker_for(self, session_id: str) -> ReplWorker:
+        with self._lock:
+            worker = self._assignments.get(session_id)
+            if worker is None or session_id not in worker.sessions:
+                # 新会话分配给当前会话数最少的工作进程
+                worker = min(self._workers, key=lambda w: len(w.sessions))
+                worker.sessions.add(session_id)
+                self._assignments[session_id] = worker
+            return worker
+
+    def run(
+        self,
+        session_id: str,
+        code: str,
+        timeout: Optional[float] = None,
+        cancellation: Optional["CancellationToken"] = None,
+    ) -> str:
+        """Execute code in the session's namespace and return its stdout.
+
+        Raises WorkflowCancelledError if the token is cancelled before or
+        while the code runs, and ReplSessionLostError if the session's
+        namespace was lost since its previous execution.
+        """
+        """
+        在会话的命名空间中执行代码，并返回标准输出。
+
+        如果令牌在代码执行前或执行期间被取消，则抛出WorkflowCancelledError；
+        如果会话的命名空间在上一次执行之后已经丢失，则抛出ReplSessionLostError。
+        """
+        self.start()
+        worker = self._worker_for(session_id)
+        reply = worker.request(
+            {"op": "run", "session_id": session_id, "code": code},
+            self.timeout if timeout is None else timeout,
+            cancellation,
+        )
+        return reply["output"]
+
+    async def arun(
+        self,
+        session_id: str,
+        code: str,
+        timeout: Optional[float] = None,
+        cancellation: Optional["CancellationToken"] = None,
+    ) -> str:
+        """Execute code without blocking the event loop."""
+        """在不阻塞事件循环的情况下执行代码。"""
+        return await asyncio.to_thread(self.run, session_id, code, timeout, cancellation)
+
+    def release(self, session_id: str) -> None:
+        """Drop the namespace of a finished session.
+
+        The release is sent along with the next request to the worker, so this
+        never blocks behind code that is still running.
+        """
+        """
+        释放已结束会话的命名空间。
+
+        释放指令会随下一个发往该工作进程的请求一起发送，因此不会被仍在执行的代码阻塞。
+        """
+        with self._lock:
+            worker = self._assignments.pop(session_id, None)
+            if worker is None or session_id not in worker.sessions:
+                return
+            worker.sessions.discard(session_id)
+            worker.resumable.discard(session_id)
+            worker.pending_releases.append(session_id)
+
+
+# 进程内共享的工作进程池，首次使用时才启动工作进程
+_pool: Optional[ReplPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_repl_pool() -> ReplPool:
+    """Return the shared REPL pool, creating it on first use."""
+    """返回共享的REPL工作进程池，首次使用时创建。"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ReplPool()
+                atexit.register(_pool.shutdown)
+    return _pool
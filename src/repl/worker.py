@@ -0,0 +1,114 @@
+"""
+Worker process main loop for the Python REPL pool.
+
+This module is imported in freshly spawned processes, so it must stay free of
+heavy imports; only the configured preload modules are imported on startup.
+"""
+
+import builtins
+import importlib
+import io
+import logging
+import signal
+from collections import OrderedDict
+from contextlib import redirect_stdout
+from multiprocessing.connection import Connection
+
+logger = logging.getLogger(__name__)
+
+
+def _apply_memory_limit(memory_limit_mb: int) -> None:
+    """Cap the address space of the current process, where supported."""
+    """限制当前进程的地址空间大小（仅在支持的平台上生效）。"""
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+    except ImportError:
+        # Windows没有resource模块，无法限制内存
+        return
+    limit = memory_limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _new_namespace() -> dict:
+    return {"__name__": "__main__", "__builtins__": builtins}
+
+
+# 当前是否正在执行代码；只有执行期间收到的中断信号才会打断代码
+_executing = False
+
+
+def _handle_interrupt(signum, frame) -> None:
+    """Interrupt running code on SIGINT; ignore the signal while idle."""
+    """收到SIGINT时中断正在执行的代码；空闲时忽略该信号。"""
+    if _executing:
+        raise KeyboardInterrupt
+
+
+def execute(namespace: dict, code: str) -> str:
+    """Execute code in the namespace and return its stdout, like PythonREPL.run."""
+    """在命名空间中执行代码并返回标准输出，行为与PythonREPL.run一致。"""
+    global _executing
+    buffer = io.StringIO()
+    try:
+        with redirect_stdout(buffer):
+            _executing = True
+            try:
+                exec(code, namespace)
+            finally:
+                _executing = False
+        return buffer.getvalue()
+    except BaseException as e:
+        return repr(e)
+
+
+def worker_main(
+    conn: Connection,
+    preload_modules: list[str],
+    memory_limit_mb: int,
+    max_sessions: int,
+) -> None:
+    """Serve execution requests from the pool until the pipe is closed."""
+    """处理来自进程池的执行请求，直到管道被关闭。"""
+    # 预先导入常用模块，使每次执行不必再承担导入开销
+    for module in preload_modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            logger.warning(f"Could not preload module {module}")
+    _apply_memory_limit(memory_limit_mb)
+    # 工作流被取消时，进程池通过SIGINT中断正在执行的代码
+    signal.signal(signal.SIGINT, _handle_interrupt)
+
+    # 会话ID到命名空间的映射，按最近使用排序，超出上限时淘汰最久未使用的会话
+    sessions: OrderedDict[str, dict] = OrderedDict()
+    conn.send({"op": "ready"})
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        # 释放已结束会话的命名空间
+        for session_id in request.get("release", []):
+            sessions.pop(session_id, None)
+
+        op = request.get("op")
+        if op == "run":
+            session_id = request["session_id"]
+            namespace = sessions.pop(session_id, None)
+            if namespace is None and request.get("resume"):
+                # 会话之前执行过代码，但命名空间已被淘汰或进程已重启，不执行代码
+                conn.send({"op": "lost"})
+                continue
+            namespace = namespace or _new_namespace()
+            sessions[session_id] = namespace
+            while len(sessions) > max_sessions:
+                sessions.popitem(last=False)
+            conn.send({"op": "result", "output": execute(namespace, request["code"])})
+        elif op == "ping":
+            conn.send({"op": "pong"})
+        elif op == "stop":
+            break
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Collection, Optional
+
+from src.config.workflow import (
+    ADMISSION_RETRY_AFTER,
+    MAX_CONCURRENT_WORKFLOWS,
+    MAX_QUEUED_WORKFLOWS,
+)
+from src.service.cancellation import CancellationToken
+from src.service.metrics import ADMISSION_REJECTED, QUEUE_WAIT, registry
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+# 统计等待时间分位数时保留的最近样本数
+WAIT_SAMPLES = 1000
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when all workflow slots are busy and the wait queue is full."""
+    """所有工作流名额都被占用且等待队列已满时抛出的异常。"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many concurrent workflows")
+        self.retry_after = retry_after  # 建议客户端重试前等待的秒数
+
+
+class AdmissionTicket:
+    """A request's place in the workflow queue, and later its workflow slot."""
+    """一个请求在工作流等待队列中的位置，被放行后代表它占用的工作流名额。"""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self.enqueued_at = time.monotonic()
+        self.admitted = False
+        self.released = False
+        # 被放行或排队位置变化时被设置，随后换成新的Event对象
+        self._changed = asyncio.Event()
+
+    @property
+    def position(self) -> int:
+        """1-based position in the wait queue; 0 once admitted."""
+        """在等待队列中的位置（从1开始），被放行后为0。"""
+        if self.admitted or self.released:
+            return 0
+        return self._controller._queue.index(self) + 1
+
+    async def wait(self) -> AsyncIterator[int]:
+        """Yield the queue position whenever it changes, until admitted or released."""
+        """排队位置每次变化时返回新的位置，直到被放行或离开队列。"""
+        last = None
+        while not self.admitted and not self.released:
+            changed = self._changed
+            position = self.position
+            if position != last:
+                yield position
+                last = position
+            await changed.wait()
+
+    def release(self) -> None:
+        """Free the slot, or leave the queue if not admitted yet. Idempotent."""
+        """释放名额；尚未被放行时离开等待队列。可以重复调用。"""
+        self._controller._release(self)
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class AdmissionController:
+    """Limits the workflows running at once in this worker process.
+
+    Requests beyond max_concurrent wait in a FIFO queue of at most max_queued
+    entries; beyond that they are rejected and should be retried later. A
+    max_concurrent of 0 admits everything.
+    """
+    """
+    限制本工作进程中同时运行的工作流数量。
+
+    超过max_concurrent的请求进入先进先出的等待队列，队列最多容纳max_queued个请求；
+    队列已满时拒绝请求，客户端应稍后重试。max_concurrent为0时不做限制。
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_WORKFLOWS,
+        max_queued: int = MAX_QUEUED_WORKFLOWS,
+        retry_after: int = ADMISSION_RETRY_AFTER,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.retry_after = retry_after
+        self._running = 0
+        self._queue: deque[AdmissionTicket] = deque()
+        # 统计数据
+        self._admitted = 0  # 被放行的请求数
+        self._rejected = 0  # 因队列已满被拒绝的请求数
+        self._abandoned = 0  # 在排队期间离开的请求数
+        self._max_queue_depth = 0  # 出现过的最大队列长度
+        self._waits: deque[float] = deque(maxlen=WAIT_SAMPLES)  # 最近被放行请求的等待时间（秒）
+
+    def enter(self) -> AdmissionTicket:
+        """Admit a workflow, or queue it if all slots are busy.
+
+        Raises:
+            AdmissionRejectedError: If the wait queue is full
+        """
+        """
+        放行一个工作流；所有名额都被占用时让它排队。
+
+        异常:
+            AdmissionRejectedError: 等待队列已满
+        """
+        ticket = AdmissionTicket(self)
+        if not self.max_concurrent or (
+            self._running < self.max_concurrent and not self._queue
+        ):
+            self._admit(ticket)
+        elif len(self._queue) < self.max_queued:
+            self._queue.append(ticket)
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+        else:
+            self._rejected += 1
+            ADMISSION_REJECTED.inc()
+            logger.warning(
+                f"Rejected workflow: {self._running} running, {len(self._queue)} queued"
+            )
+            raise AdmissionRejectedError(self.retry_after)
+        return ticket
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def percentile(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 3) if waits else 0.0
+
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "running": self._running,
+            "queued": len(self._queue),
+            "max_queue_depth": self._max_queue_depth,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "abandoned": self._abandoned,
+            "wait_seconds": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+        }
+
+    def _admit(self, ticket: AdmissionTicket) -> None:
+        ticket.admitted = True
+        self._running += 1
+        self._admitted += 1
+        wait = time.monotonic() - ticket.enqueued_at
+        self._waits.append(wait)
+        QUEUE_WAIT.observe(wait)
+        ticket._notify()
+
+    def _release(self, ticket: AdmissionTicket) -> None:
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.admitted:
+            self._running -= 1
+        else:
+            self._queue.remove(ticket)
+            self._abandoned += 1
+            ticket._notify()
+        # 将空出的名额交给排在最前面的请求，其余请求的排队位置随之前移
+        while self._queue and (
+            not self.max_concurrent or self._running < self.max_concurrent
+        ):
+            self._admit(self._queue.popleft())
+        for waiting in self._queue:
+            waiting._notify()
+
+
+async def admitted(
+    ticket: AdmissionTicket,
+    workflow: AsyncGenerator[dict, None],
+    cancellation: Optional[CancellationToken] = None,
+    event_types: Optional[Collection[str]] = None,
+) -> AsyncIterator[dict]:
+    """Send queue_position events until the ticket is admitted, then the workflow's events.
+
+    A workflow cancelled while queued leaves the queue without starting. The
+    slot is released when the workflow ends or the caller stops reading.
+    """
+    """
+    在请求被放行前发送queue_position事件，之后发送工作流的事件。
+
+    在排队期间被取消的工作流直接离开队列，不会开始运行。
+    工作流结束或调用方停止读取事件时释放名额。
+    """
+
+    def wanted(event_type: str) -> bool:
+        return event_types is None or event_type in event_types
+
+    loop = asyncio.get_running_loop()
+    # 排队期间被取消时离开队列；令牌可能在其他线程中被取消
+    remove_callback = (
+        cancellation.on_cancel(lambda: loop.call_soon_threadsafe(ticket.release))
+        if cancellation is not None
+        else lambda: None
+    )
+    try:
+        async for position in ticket.wait():
+            if wanted("queue_position"):
+                yield {"event": "queue_position", "data": {"position": position}}
+        # 放行后名额由工作流占用，直到工作流真正停止才释放
+        remove_callback()
+        if not ticket.admitted:
+            if wanted("workflow_cancelled"):
+                yield {
+                    "event": "workflow_cancelled",
+                    "data": {"workflow_id": None, "reason": cancellation.reason},
+                }
+            return
+        async for event in workflow:
+            yield event
+    finally:
+        remove_callback()
+        ticket.release()
+        # 关闭工作流生成器，使其立即停止图的运行并清理资源
+        await workflow.aclose()
+
+
+# 进程内共享的准入控制器实例
+admission_controller = AdmissionController()
+
+# 在收集指标时读取当前的并发数和队列长度
+registry.gauge(
+    "langmanus_workflows_running",
+    "Workflows holding a slot",
+    lambda: admission_controller._running,
+)
+registry.gauge(
+    "langmanus_workflows_queued",
+    "Workflows waiting for a slot",
+    lambda: len(admission_controller._queue),
+)
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Iterable, Optional
+
+from src.config.workflow import BATCH_CONCURRENCY
+from src.service.admission import (
+    AdmissionController,
+    AdmissionRejectedError,
+    admitted,
+)
+from src.service.workflow_service import run_agent_workflow
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+
+def read_queries(path: str) -> list[dict]:
+    """Read the queries of a batch from a JSONL file.
+
+    Every line is an object with a "query" string or a "messages" list in the
+    chat request format. Lines without an "id" are identified by their line
+    number, so the file must not be reordered between a run and its resume.
+    """
+    """
+    从JSONL文件中读取一批查询。
+
+    每行是一个包含"query"字符串或"messages"消息列表（与聊天请求格式相同）的对象。
+    没有"id"的行以行号作为ID，因此在中断后继续运行之前不能调整文件中各行的顺序。
+    """
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if not item.get("query") and not item.get("messages"):
+                raise ValueError(f"{path}:{line_number}: a query or messages is required")
+            queries.append({**item, "id": str(item.get("id", line_number))})
+    return queries
+
+
+def finished_ids(path: str) -> set[str]:
+    """Return the IDs of the queries that already completed in a results file."""
+    """返回结果文件中已经成功完成的查询ID。"""
+    if not os.path.exists(path):
+        return set()
+    finished = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # 中断时可能只写入了最后一行的一部分
+                continue
+            if result.get("status") == "completed":
+                finished.add(result["id"])
+    return finished
+
+
+def _messages(query: dict) -> list:
+    if query.get("messages"):
+        return query["messages"]
+    return [{"role": "user", "content": query["query"]}]
+
+
+async def run_query(
+    query: dict,
+    admission: Optional[AdmissionController] = None,
+    **options,
+) -> dict:
+    """Run the workflow of one query and return its result record.
+
+    Args:
+        query: A query as returned by read_queries
+        admission: Admission controller whose slots the workflow shares with
+            other requests; if the wait queue is full, the query waits and
+            tries again instead of failing
+        **options: Further run_agent_workflow options
+
+    Returns:
+        The ID, status, final report, latency, time to first token, number of
+        events and model usage of the workflow
+    """
+    """
+    运行一个查询的工作流并返回其结果记录。
+
+    参数:
+        query: read_queries返回的一个查询
+        admission: 与其他请求共享名额的准入控制器；等待队列已满时查询稍后重试，而不是失败
+        **options: 传给run_agent_workflow的其他参数
+
+    返回:
+        工作流的ID、状态、最终报告、延迟、首个token的延迟、事件数和模型用量
+    """
+    started = time.perf_counter()
+    result = {
+        "id": query["id"],
+        "status": "failed",
+        "workflow_id": None,
+        "final_report": None,
+        "latency_seconds": None,
+        "first_token_seconds": None,
+        "events": 0,
+        "usage": None,
+        "error": None,
+    }
+    # 批量运行只需要最终报告，不需要完整的消息列表
+    workflow = run_agent_workflow(_messages(query), compact_end_of_workflow=True, **options)
+    answer = []  # 协调者直接回答时没有报告，使用其消息内容
+    try:
+        if admission is not None:
+            while True:
+                try:
+                    ticket = admission.enter()
+                    break
+                except AdmissionRejectedError as e:
+                    # 批量查询让位于交互请求，稍后重试
+                    await asyncio.sleep(e.retry_after)
+            workflow = admitted(ticket, workflow)
+        status = "completed"
+        async for event in workflow:
+            result["events"] += 1
+            data = event["data"]
+            if event["event"] == "message" and "content" in data["delta"]:
+                if result["first_token_seconds"] is None:
+                    result["first_token_seconds"] = round(time.perf_counter() - started, 3)
+                answer.append(data["delta"]["content"])
+            elif event["event"] == "start_of_workflow":
+                result["workflow_id"] = data["workflow_id"]
+            elif event["event"] == "end_of_workflow":
+                result["final_report"] = data["final_report"]
+                result["usage"] = data["usage"]
+            elif event["event"] == "workflow_cancelled":
+                status = "cancelled"
+                result["error"] = data["reason"]
+        result["status"] = status
+        if status == "completed" and result["final_report"] is None:
+            result["final_report"] = "".join(answer)
+    except Exception as e:
+        logger.exception(f"Batch query {query['id']} failed")
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        await workflow.aclose()
+    result["latency_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+async def run_batch(
+    queries: Iterable[dict],
+    concurrency: int = BATCH_CONCURRENCY,
+    admission: Optional[AdmissionController] = None,
+    **options,
+) -> AsyncIterator[dict]:
+    """Run the workflows of many queries, at most concurrency at a time.
+
+    Results are yielded in the order the workflows finish. Closing the
+    generator cancels the workflows that are still running.
+    """
+    """
+    运行多个查询的工作流，同时最多运行concurrency个。
+
+    按工作流结束的顺序产生结果。关闭生成器时取消仍在运行的工作流。
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def run(query: dict) -> dict:
+        async with semaphore:
+            return await run_query(query, admission, **options)
+
+    tasks = [asyncio.create_task(run(query)) for query in queries]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def summarize(results: list[dict]) -> dict:
+    """Return counts, latency percentiles and token totals of batch results."""
+    """返回批量结果的数量统计、延迟分位数和token总数。"""
+    latencies = sorted(r["latency_seconds"] for r in results if r["status"] == "completed")
+
+    def percentile(p: float) -> Optional[float]:
+        return latencies[min(int(p * len(latencies)), len(latencies) - 1)] if latencies else None
+
+    usages = [r["usage"] for r in results if r["usage"]]
+    return {
+        "completed": len(latencies),
+        "failed": sum(r["status"] != "completed" for r in results),
+        "latency_p50": percentile(0.5),
+        "latency_p95": percentile(0.95),
+        "latency_max": latencies[-1] if latencies else None,
+        "input_tokens": sum(u["input_tokens"] for u in usages),
+        "output_tokens": sum(u["output_tokens"] for u in usages),
+    }
+
+
+async def run_batch_file(
+    input_path: str,
+    output_path: str,
+    concurrency: int = BATCH_CONCURRENCY,
+    **options,
+) -> dict:
+    """Run the queries of a JSONL file and append their results to another.
+
+    Every result is written as soon as its workflow ends. Queries that
+    already completed in the output file are skipped, so an interrupted
+    batch resumes where it stopped; failed queries are run again.
+
+    Returns:
+        A summary of the queries run this time (see summarize), with the
+        number of queries in the file and the number skipped
+    """
+    """
+    运行JSONL文件中的查询，并将结果追加到输出文件中。
+
+    每个工作流结束后立即写入其结果。输出文件中已经成功完成的查询会被跳过，
+    因此中断的批量运行可以从中断处继续；失败的查询会重新运行。
+
+    返回:
+        本次运行的查询的摘要（见summarize），以及文件中的查询总数和跳过的查询数
+    """
+    queries = read_queries(input_path)
+    finished = finished_ids(output_path)
+    pending = [query for query in queries if query["id"] not in finished]
+    logger.info(
+        f"Running {len(pending)} of {len(queries)} queries "
+        f"({len(queries) - len(pending)} already completed)"
+    )
+    results = []
+    # 中断时写了一半的行单独留在一行，不影响后续结果的解析
+    needs_newline = False
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    with open(output_path, "a", encoding="utf-8") as f:
+        if needs_newline:
+            f.write("\n")
+        async for result in run_batch(pending, concurrency, **options):
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            results.append(result)
+    return {
+        "total": len(queries),
+        "skipped": len(queries) - len(pending),
+        **summarize(results),
+    }
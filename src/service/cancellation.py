@@ -0,0 +1,146 @@
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import ensure_config
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+# 运行配置中保存取消令牌的键
+CANCELLATION_CONFIG_KEY = "cancellation"
+
+
+class WorkflowCancelledError(Exception):
+    """Raised inside a workflow once it has been cancelled."""
+    """工作流被取消后，在其内部抛出的异常。"""
+
+
+class CancellationToken:
+    """Cancellation state shared by one workflow and everything it runs.
+
+    Model calls and tools run in worker threads that asyncio cannot cancel, so
+    they either check the token or register a callback that stops their work,
+    e.g. killing a subprocess or cancelling a browser task.
+    """
+    """
+    一个工作流及其运行的所有任务共享的取消状态。
+
+    模型调用和工具运行在asyncio无法取消的工作线程中，因此它们要么检查该令牌，
+    要么注册一个用于停止工作的回调，例如终止子进程或取消浏览器任务。
+    """
+
+    def __init__(self):
+        self.reason: Optional[str] = None  # 取消原因
+        self._event = threading.Event()
+        self._callbacks: list[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Cancel the workflow. Returns False if it was already cancelled."""
+        """取消工作流；如果已经被取消则返回False。"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancellation callback failed: {e!r}")
+        return True
+
+    def check(self) -> None:
+        """Raise WorkflowCancelledError if the workflow has been cancelled."""
+        """如果工作流已被取消，则抛出WorkflowCancelledError。"""
+        if self._event.is_set():
+            raise WorkflowCancelledError(f"Workflow cancelled: {self.reason}")
+
+    def on_cancel(self, callback: Callable[[], Any]) -> Callable[[], None]:
+        """Call callback when the workflow is cancelled; return an unregister function.
+
+        The callback runs immediately if the workflow is already cancelled.
+        """
+        """
+        在工作流被取消时调用callback，返回用于取消注册的函数。
+
+        如果工作流已经被取消，回调会立即执行。
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], Any]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+class CancellationCallbackHandler(BaseCallbackHandler):
+    """Stops a cancelled workflow at its next node, model call, token or tool call."""
+    """在下一个节点、模型调用、token或工具调用处停止已被取消的工作流。"""
+
+    raise_error = True  # 让异常传播到调用方，而不是被回调管理器吞掉
+    run_inline = True
+
+    def __init__(self, token: CancellationToken):
+        self.token = token
+
+    def on_chain_start(self, *args: Any, **kwargs: Any) -> None:
+        self.token.check()
+
+    def on_chat_model_start(self, *args: Any, **kwargs: Any) -> None:
+        self.token.check()
+
+    def on_llm_start(self, *args: Any, **kwargs: Any) -> None:
+        self.token.check()
+
+    def on_llm_new_token(self, *args: Any, **kwargs: Any) -> None:
+        self.token.check()
+
+    def on_tool_start(self, *args: Any, **kwargs: Any) -> None:
+        self.token.check()
+
+
+# 正在运行的工作流的取消令牌，按工作流ID索引
+_tokens: dict[str, CancellationToken] = {}
+_tokens_lock = threading.Lock()
+
+
+def register_workflow(workflow_id: str, token: CancellationToken) -> None:
+    with _tokens_lock:
+        _tokens[workflow_id] = token
+
+
+def unregister_workflow(workflow_id: str) -> None:
+    with _tokens_lock:
+        _tokens.pop(workflow_id, None)
+
+
+def cancel_workflow(workflow_id: str, reason: str = "cancelled") -> bool:
+    """Cancel a running workflow by its ID. Returns False if it is not running."""
+    """根据ID取消正在运行的工作流；工作流不在运行时返回False。"""
+    with _tokens_lock:
+        token = _tokens.get(workflow_id)
+    return token is not None and token.cancel(reason)
+
+
+def get_cancellation_token(
+    config: Optional[RunnableConfig] = None,
+) -> Optional[CancellationToken]:
+    """Return the token of the workflow the caller is running in, if any."""
+    """返回调用方所在工作流的取消令牌（如果有）。"""
+    # 未传入配置时使用当前上下文中的运行配置
+    # 令牌随运行配置传递，工作流结束后仍在运行的工具也能看到取消状态
+    return ensure_config(config).get("configurable", {}).get(CANCELLATION_CONFIG_KEY)
@@ -0,0 +1,101 @@
+import time
+from typing import Callable, Optional
+
+
+class DeltaCoalescer:
+    """Batches consecutive message deltas of the same message into frames.
+
+    A frame is sent once it holds max_chars characters or its first delta is
+    interval seconds old, whichever comes first. Any other event sends the
+    pending frame first, so the order of events is kept.
+    """
+    """
+    将同一条消息的连续增量内容合并成帧。
+
+    当帧中累积了max_chars个字符，或其中第一个增量已等待interval秒时（以先到者为准）发送该帧。
+    收到其他事件时会先发送待发送的帧，因此事件的顺序保持不变。
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        max_chars: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.interval = interval  # 帧的最长等待时间（秒），0表示不按时间发送
+        self.max_chars = max_chars  # 帧的最大字符数，0表示不按字符数发送
+        self.clock = clock
+        self.enabled = interval > 0 or max_chars > 0  # 两个限制均为0时事件原样发送
+        self._message_id: Optional[str] = None
+        self._key: Optional[str] = None  # 增量的类型：content或reasoning_content
+        self._parts: list[str] = []
+        self._chars = 0
+        self._started = 0.0  # 帧中第一个增量的时间
+        # 统计数据
+        self.deltas = 0  # 收到的增量数量
+        self.frames = 0  # 发送的帧数量
+
+    def add(self, event: dict) -> list[dict]:
+        """Take an event and return the events to send now."""
+        """接收一个事件，返回此刻需要发送的事件。"""
+        if not self.enabled:
+            return [event]
+        delta = self._delta(event)
+        if delta is None:
+            return [*self.flush(), event]
+
+        message_id = event["data"]["message_id"]
+        ((key, text),) = delta.items()
+        ready = []
+        if self._parts and (message_id != self._message_id or key != self._key):
+            ready = self.flush()
+        if not self._parts:
+            self._message_id, self._key = message_id, key
+            self._started = self.clock()
+        self._parts.append(text)
+        self._chars += len(text)
+        self.deltas += 1
+        if self.max_chars and self._chars >= self.max_chars:
+            ready += self.flush()
+        elif self.interval and self.clock() - self._started >= self.interval:
+            ready += self.flush()
+        return ready
+
+    def flush(self) -> list[dict]:
+        """Return the pending frame, if there is one."""
+        """返回待发送的帧（如果有）。"""
+        if not self._parts:
+            return []
+        frame = {
+            "event": "message",
+            "data": {
+                "message_id": self._message_id,
+                "delta": {self._key: "".join(self._parts)},
+            },
+        }
+        self._parts = []
+        self._chars = 0
+        self.frames += 1
+        return [frame]
+
+    def timeout(self) -> Optional[float]:
+        """Seconds until the pending frame is due, or None if nothing is pending."""
+        """距离待发送的帧到期还有多少秒；没有待发送的帧时返回None。"""
+        if not self._parts or not self.interval:
+            return None
+        return max(0.0, self._started + self.interval - self.clock())
+
+    @staticmethod
+    def _delta(event: dict) -> Optional[dict]:
+        # 只合并只包含一种增量内容的消息事件
+        if event.get("event") != "message":
+            return None
+        delta = event["data"].get("delta")
+        if (
+            isinstance(delta, dict)
+            and len(delta) == 1
+            and len(event["data"]) == 2
+            and isinstance(next(iter(delta.values())), str)
+        ):
+            return delta
+        return None
@@ -0,0 +1,413 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Optional, Union
+
+from src.config.workflow import (
+    JOB_MAX_RETAINED,
+    JOB_REPLAY_BUFFER_SIZE,
+    JOB_RETENTION_SECONDS,
+    JOB_SYNC_INTERVAL,
+)
+from src.service.admission import AdmissionTicket, admitted
+from src.service.cancellation import CancellationToken
+from src.service.workflow_service import run_agent_workflow
+from src.store import StateStore, get_state_store
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+# 共享状态存储中保存任务状态和取消请求的命名空间
+JOBS_NAMESPACE = "jobs"
+JOB_CANCELS_NAMESPACE = "job_cancels"
+
+
+class Job:
+    """A workflow running in the background, independent of any client connection.
+
+    Events are numbered from 1 and the most recent ones are kept in a bounded
+    replay buffer, so a client that reconnects with the ID of the last event it
+    received gets only the events it missed.
+    """
+    """
+    在后台运行的工作流，与任何客户端连接无关。
+
+    事件从1开始编号，最近的事件保存在有界的重放缓冲区中。客户端重新连接时带上
+    最后收到的事件ID，即可只收到错过的事件。
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = JOB_REPLAY_BUFFER_SIZE,
+        ticket: Optional[AdmissionTicket] = None,
+    ):
+        self.id = str(uuid.uuid4())
+        self.status = "running"  # running、completed、cancelled或failed
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.result: Optional[dict] = None  # end_of_workflow事件的数据
+        self.cancellation = CancellationToken()
+        self._events: deque[tuple[int, dict]] = deque(maxlen=buffer_size)
+        self._last_event_id = 0
+        # 有新事件或任务结束时被设置，随后换成新的Event对象
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._ticket = ticket  # 准入控制的排队凭证，未经准入控制时为None
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def last_event_id(self) -> int:
+        return self._last_event_id
+
+    @property
+    def first_event_id(self) -> int:
+        """ID of the oldest event still in the replay buffer."""
+        """重放缓冲区中最早事件的ID。"""
+        return self._events[0][0] if self._events else self._last_event_id + 1
+
+    def buffered(self, last_event_id: int = 0) -> list[tuple[int, dict]]:
+        """Return the buffered events after last_event_id."""
+        """返回缓冲区中ID大于last_event_id的事件。"""
+        # 事件ID是连续的，可以直接计算出起始位置
+        start = max(0, last_event_id - self.first_event_id + 1)
+        return list(itertools.islice(self._events, start, None))
+
+    async def replay(self, last_event_id: int = 0) -> list[tuple[int, dict]]:
+        """Return the buffered events after last_event_id, like StoredJob.replay."""
+        """返回缓冲区中ID大于last_event_id的事件，与StoredJob.replay的接口相同。"""
+        return self.buffered(last_event_id)
+
+    async def events(self, last_event_id: int = 0) -> AsyncIterator[tuple[int, dict]]:
+        """Yield (event ID, event) pairs after last_event_id until the job ends.
+
+        Events that have already left the replay buffer are skipped; clients can
+        tell from the event IDs that they missed some.
+        """
+        """
+        依次返回ID大于last_event_id的（事件ID, 事件），直到任务结束。
+
+        已被移出重放缓冲区的事件会被跳过，客户端可以根据事件ID判断是否有遗漏。
+        """
+        while True:
+            # 先取得当前的Event对象再读取缓冲区，避免错过在两者之间到达的事件
+            changed = self._changed
+            pending = self.buffered(last_event_id)
+            for event_id, event in pending:
+                yield event_id, event
+                last_event_id = event_id
+            if self.done and last_event_id >= self._last_event_id:
+                return
+            if not pending:
+                await changed.wait()
+
+    def summary(self) -> dict:
+        queued = self.status == "running" and self._ticket is not None and not (
+            self._ticket.admitted or self._ticket.released
+        )
+        return {
+            "job_id": self.id,
+            "status": "queued" if queued else self.status,
+            "queue_position": self._ticket.position if queued else 0,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "first_event_id": self.first_event_id,
+            "last_event_id": self._last_event_id,
+            "error": self.error,
+        }
+
+    def record(self) -> dict:
+        """Return the summary and result, as saved in the shared state store."""
+        """返回任务概要和结果，即保存在共享状态存储中的内容。"""
+        return {**self.summary(), "result": self.result}
+
+    def _append(self, event: dict) -> None:
+        self._last_event_id += 1
+        self._events.append((self._last_event_id, event))
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _run(self, workflow: AsyncIterator[dict]) -> None:
+        try:
+            async for event in workflow:
+                if event["event"] == "end_of_workflow":
+                    self.result = event["data"]
+                self._append(event)
+            self.status = "cancelled" if self.cancellation.cancelled else "completed"
+        except asyncio.CancelledError:
+            # 服务器关闭时任务被取消
+            self.status = "cancelled"
+            raise
+        except Exception as e:
+            logger.exception(f"Job {self.id} failed")
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = time.time()
+            self._notify()
+
+
+class StoredJob:
+    """A job run by another worker process, read from the shared state store.
+
+    Offers the same read interface as Job. Its events are polled from the
+    store, where the owning worker saves them every JOB_SYNC_INTERVAL seconds.
+    """
+    """
+    由其他工作进程运行的任务，从共享状态存储中读取。
+
+    提供与Job相同的读取接口。运行该任务的工作进程每隔JOB_SYNC_INTERVAL秒将事件写入存储，
+    这里通过轮询存储获取事件。
+    """
+
+    def __init__(self, store: StateStore, record: dict, poll_interval: float = JOB_SYNC_INTERVAL):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.id = record["job_id"]
+        self._record = record
+
+    @classmethod
+    async def load(
+        cls, store: StateStore, job_id: str, poll_interval: float = JOB_SYNC_INTERVAL
+    ) -> Optional["StoredJob"]:
+        # 读取存储可能阻塞，在线程中执行
+        raw = await asyncio.to_thread(store.get, JOBS_NAMESPACE, job_id)
+        return None if raw is None else cls(store, json.loads(raw), poll_interval)
+
+    @property
+    def status(self) -> str:
+        return self._record["status"]
+
+    @property
+    def done(self) -> bool:
+        return self._record["finished_at"] is not None
+
+    @property
+    def result(self) -> Optional[dict]:
+        return self._record["result"]
+
+    @property
+    def last_event_id(self) -> int:
+        return self._record["last_event_id"]
+
+    def summary(self) -> dict:
+        return {k: v for k, v in self._record.items() if k != "result"}
+
+    def record(self) -> dict:
+        return self._record
+
+    def _read_events(self, last_event_id: int) -> list[tuple[int, dict]]:
+        return [
+            (event_id, json.loads(data))
+            for event_id, data in self.store.read_events(self.id, last_event_id)
+        ]
+
+    async def replay(self, last_event_id: int = 0) -> list[tuple[int, dict]]:
+        """Return the stored events after last_event_id."""
+        """返回存储中ID大于last_event_id的事件。"""
+        return await asyncio.to_thread(self._read_events, last_event_id)
+
+    async def events(self, last_event_id: int = 0) -> AsyncIterator[tuple[int, dict]]:
+        while True:
+            # 先读取任务状态再读取事件：任务结束前的所有事件都先于最终状态写入存储
+            raw = await asyncio.to_thread(self.store.get, JOBS_NAMESPACE, self.id)
+            if raw is None:
+                return
+            self._record = json.loads(raw)
+            pending = await self.replay(last_event_id)
+            for event_id, event in pending:
+                yield event_id, event
+                last_event_id = event_id
+            if self.done and last_event_id >= self.last_event_id:
+                return
+            if not pending:
+                await asyncio.sleep(self.poll_interval)
+
+
+class JobManager:
+    """Starts background workflow jobs and keeps them for a while after they end.
+
+    With a shared state store, the events and status of every job are saved
+    there too, so the other worker processes can list, poll, stream and cancel
+    it.
+    """
+    """
+    启动后台工作流任务，并在任务结束后保留一段时间。
+
+    配置了共享状态存储时，每个任务的事件和状态也会写入该存储，
+    其他工作进程因此可以列出、查询、订阅和取消该任务。
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = JOB_REPLAY_BUFFER_SIZE,
+        retention: float = JOB_RETENTION_SECONDS,
+        max_retained: int = JOB_MAX_RETAINED,
+        store: Optional[StateStore] = None,
+        sync_interval: float = JOB_SYNC_INTERVAL,
+    ):
+        self.buffer_size = buffer_size  # 每个任务的重放缓冲区最多保存的事件数
+        self.retention = retention  # 任务结束后保留的时间（秒）
+        self.max_retained = max_retained  # 最多保留的已结束任务数
+        self.store = store  # 共享状态存储，为None时任务只在本进程中可见
+        self.sync_interval = sync_interval  # 将任务写入共享存储的间隔（秒）
+        self._jobs: dict[str, Job] = {}
+        self._sync_tasks: set[asyncio.Task] = set()
+
+    async def submit(
+        self,
+        messages: list,
+        ticket: Optional[AdmissionTicket] = None,
+        **workflow_options,
+    ) -> Job:
+        """Start a workflow job; workflow_options are passed to run_agent_workflow.
+
+        With an admission ticket, the workflow waits in the queue until the
+        ticket is admitted.
+        """
+        """
+        启动一个工作流任务；workflow_options会被传给run_agent_workflow。
+
+        提供准入凭证时，工作流先在队列中等待，直到凭证被放行。
+        """
+        await self._prune()
+        job = Job(self.buffer_size, ticket)
+        workflow = run_agent_workflow(
+            messages, cancellation=job.cancellation, **workflow_options
+        )
+        if ticket is not None:
+            workflow = admitted(
+                ticket, workflow, job.cancellation, workflow_options.get("event_types")
+            )
+        job._task = asyncio.create_task(job._run(workflow))
+        self._jobs[job.id] = job
+        if self.store is not None:
+            # 立即写入任务状态，客户端随后连接到任何工作进程都能找到该任务；
+            # 在线程中写入，存储繁忙时不会阻塞事件循环
+            try:
+                await asyncio.to_thread(self._save, job.id, [], job.record(), False)
+            except Exception as e:
+                # 同步任务会再次写入
+                logger.warning(f"Failed to save job {job.id}: {e!r}")
+            sync_task = asyncio.create_task(self._sync(job))
+            self._sync_tasks.add(sync_task)
+            sync_task.add_done_callback(self._sync_tasks.discard)
+        logger.info(f"Started job {job.id}")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Union[Job, StoredJob]]:
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            # 由其他工作进程运行的任务
+            return await StoredJob.load(self.store, job_id, self.sync_interval)
+        return job
+
+    async def list_jobs(self) -> list[Union[Job, StoredJob]]:
+        await self._prune()
+        jobs: list[Union[Job, StoredJob]] = list(self._jobs.values())
+        if self.store is not None:
+            stored = await asyncio.to_thread(self.store.items, JOBS_NAMESPACE)
+            jobs += [
+                StoredJob(self.store, json.loads(raw), self.sync_interval)
+                for job_id, raw in stored
+                if job_id not in self._jobs
+            ]
+        return jobs
+
+    async def cancel(self, job_id: str, reason: str = "cancelled") -> bool:
+        """Cancel a running job. Returns False if it is unknown or has ended."""
+        """取消正在运行的任务；任务不存在或已结束时返回False。"""
+        job = await self.get(job_id)
+        if job is None or job.done:
+            return False
+        if isinstance(job, StoredJob):
+            # 通过共享存储通知运行该任务的工作进程
+            await asyncio.to_thread(
+                self.store.set, JOB_CANCELS_NAMESPACE, job_id, reason, ttl=self.retention
+            )
+            return True
+        return job.cancellation.cancel(reason)
+
+    async def shutdown(self) -> None:
+        """Cancel all running jobs and wait for them to stop."""
+        """取消所有正在运行的任务并等待它们停止。"""
+        running = [job for job in self._jobs.values() if not job.done]
+        for job in running:
+            job.cancellation.cancel("shutdown")
+        await asyncio.gather(*(job._task for job in running), return_exceptions=True)
+        # 等待任务的最终状态写入共享存储
+        await asyncio.gather(*self._sync_tasks, return_exceptions=True)
+
+    async def _sync(self, job: Job) -> None:
+        # 定期将任务的新事件和状态写入共享存储，并检查其他工作进程发来的取消请求
+        saved_event_id = 0
+        while True:
+            done = job.done
+            # 在事件循环中取得快照，写入操作在线程中进行
+            events = job.buffered(saved_event_id)
+            record = job.record()
+            try:
+                reason = await asyncio.to_thread(self._save, job.id, events, record, done)
+            except Exception as e:
+                logger.warning(f"Failed to save job {job.id}: {e!r}")
+                reason = None
+            else:
+                if events:
+                    saved_event_id = events[-1][0]
+            if done:
+                return
+            if reason is not None:
+                job.cancellation.cancel(reason)
+            await asyncio.wait({job._task}, timeout=self.sync_interval)
+
+    def _save(self, job_id: str, events: list, record: dict, done: bool) -> Optional[str]:
+        if events:
+            self.store.append_events(
+                job_id,
+                [(event_id, json.dumps(event, ensure_ascii=False)) for event_id, event in events],
+            )
+            self.store.trim_events(job_id, self.buffer_size)
+        # 事件先于状态写入，读取方看到任务结束时，所有事件都已经在存储中
+        self.store.set(JOBS_NAMESPACE, job_id, json.dumps(record, ensure_ascii=False), self.retention)
+        if done:
+            self.store.delete(JOB_CANCELS_NAMESPACE, job_id)
+            return None
+        return self.store.get(JOB_CANCELS_NAMESPACE, job_id)
+
+    async def _prune(self) -> None:
+        # 删除超过保留时间的已结束任务，以及超出数量上限的最早结束的任务
+        finished = sorted(
+            (job for job in self._jobs.values() if job.done),
+            key=lambda job: job.finished_at,
+        )
+        expired = time.time() - self.retention
+        excess = len(finished) - self.max_retained
+        pruned = [
+            job.id
+            for index, job in enumerate(finished)
+            if index < excess or job.finished_at < expired
+        ]
+        for job_id in pruned:
+            del self._jobs[job_id]
+        if pruned and self.store is not None:
+            # 在线程中删除，避免存储繁忙时阻塞事件循环
+            await asyncio.to_thread(self._delete, pruned)
+
+    def _delete(self, job_ids: list[str]) -> None:
+        for job_id in job_ids:
+            self.store.delete(JOBS_NAMESPACE, job_id)
+            self.store.delete_events(job_id)
+
+
+# 进程内共享的任务管理器实例，配置了共享状态存储时任务对所有工作进程可见
+job_manager = JobManager(store=get_state_store())
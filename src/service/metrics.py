@@ -0,0 +1,461 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Optional, Sequence
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import ToolMessage
+
+from src.config import TEAM_MEMBERS
+from src.config.agents import AGENT_LLM_MAP
+from src.config.workflow import METRICS_PUBLISH_INTERVAL
+
+if TYPE_CHECKING:
+    from src.store import StateStore
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+# 延迟类直方图的默认分桶（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# 首个token延迟的分桶（秒）
+TTFT_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+# 作为标签值的智能体名称；其他节点不记录，保证标签的取值数量有限
+AGENTS = frozenset({*TEAM_MEMBERS, "coordinator", "planner", "supervisor"})
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+    """按标签组合分别累加的计数器。"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self, extra: str = "") -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram:
+    """Counts observations in cumulative buckets, per label set."""
+    """按标签组合分别统计观测值落入各累积分桶的次数。"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每个标签组合：各分桶的计数（不累积，最后一个为+Inf）、总和
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(tuple(labels[name] for name in self.labelnames))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self, extra: str = "") -> list[str]:
+        with self._lock:
+            values = sorted((key, (list(c), t[0])) for key, (c, t) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = ",".join(filter(None, (extra, f'le="{_format_value(bound)}"')))
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key, extra)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A value read from a callback when metrics are collected."""
+    """在收集指标时通过回调函数读取的当前值。"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def samples(self, extra: str = "") -> list[str]:
+        return [f"{self.name}{_format_labels((), (), extra)} {_format_value(self.callback())}"]
+
+
+class MetricsRegistry:
+    """Collects metrics and renders them in the Prometheus text format."""
+    """收集指标并以Prometheus文本格式输出。"""
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | Gauge] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, callback))
+
+    def snapshot(self, worker: str) -> list[dict]:
+        """Return the current samples of every metric, labelled with the worker."""
+        """返回所有指标的当前样本，样本带有工作进程标签。"""
+        extra = f'worker="{_escape(worker)}"'
+        return [
+            {
+                "name": metric.name,
+                "help": metric.documentation,
+                "type": metric.type,
+                "samples": metric.samples(extra),
+            }
+            for metric in self._metrics.values()
+        ]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+def render_snapshots(snapshots: list[list[dict]]) -> str:
+    """Render the snapshots of several workers as one exposition, one block per metric."""
+    """将多个工作进程的指标快照输出为一份文本，每个指标只有一组说明行。"""
+    metrics: dict[str, dict] = {}
+    for snapshot in snapshots:
+        for metric in snapshot:
+            merged = metrics.setdefault(metric["name"], {**metric, "samples": []})
+            merged["samples"].extend(metric["samples"])
+    lines = []
+    for metric in metrics.values():
+        lines.append(f"# HELP {metric['name']} {metric['help']}")
+        lines.append(f"# TYPE {metric['name']} {metric['type']}")
+        lines.extend(metric["samples"])
+    return "\n".join(lines) + "\n"
+
+
+# 进程内共享的指标注册表
+registry = MetricsRegistry()
+
+WORKFLOWS = registry.counter(
+    "langmanus_workflows_total", "Workflows that ended, by outcome", ["status"]
+)
+WORKFLOW_DURATION = registry.histogram(
+    "langmanus_workflow_duration_seconds", "Wall-clock duration of workflows"
+)
+NODE_DURATION = registry.histogram(
+    "langmanus_node_duration_seconds", "Duration of agent node runs", ["agent"]
+)
+LLM_DURATION = registry.histogram(
+    "langmanus_llm_duration_seconds", "Duration of model calls", ["agent", "llm_type"]
+)
+LLM_TTFT = registry.histogram(
+    "langmanus_llm_time_to_first_token_seconds",
+    "Time from a streamed model call's start to its first content",
+    ["agent", "llm_type"],
+    TTFT_BUCKETS,
+)
+LLM_TOKENS = registry.counter(
+    "langmanus_llm_tokens_total",
+    "Tokens reported by the model API, by direction (input or output)",
+    ["agent", "llm_type", "direction"],
+)
+TOOL_CALLS = registry.counter(
+    "langmanus_tool_calls_total", "Tool calls, by tool and outcome", ["tool", "status"]
+)
+TOOL_DURATION = registry.histogram(
+    "langmanus_tool_duration_seconds", "Duration of tool calls", ["tool"]
+)
+QUEUE_WAIT = registry.histogram(
+    "langmanus_admission_wait_seconds", "Time workflows waited for a slot"
+)
+ADMISSION_REJECTED = registry.counter(
+    "langmanus_admission_rejected_total",
+    "Requests rejected because the wait queue was full",
+)
+# 没有拒绝时也输出0，rate()从进程启动开始就有数据
+ADMISSION_REJECTED.inc(0)
+
+# 共享状态存储中保存各工作进程指标快照的命名空间
+METRICS_NAMESPACE = "metrics"
+# 本进程在指标中的标识
+WORKER_ID = str(os.getpid())
+
+
+def publish_metrics(store: "StateStore") -> None:
+    """Write this worker's metrics to the shared state store.
+
+    A snapshot expires after a few publish intervals, so workers that exit
+    drop out of /metrics.
+    """
+    """
+    将本工作进程的指标写入共享状态存储。
+
+    快照在几个发布间隔之后过期，已退出的工作进程会从/metrics中消失。
+    """
+    store.set(
+        METRICS_NAMESPACE,
+        WORKER_ID,
+        json.dumps(registry.snapshot(WORKER_ID)),
+        ttl=3 * METRICS_PUBLISH_INTERVAL,
+    )
+
+
+async def publish_metrics_periodically(store: "StateStore") -> None:
+    """Publish this worker's metrics every METRICS_PUBLISH_INTERVAL seconds until cancelled."""
+    """每隔METRICS_PUBLISH_INTERVAL秒写入一次本工作进程的指标，直到被取消。"""
+    while True:
+        try:
+            # 在线程中写入，避免存储繁忙时阻塞事件循环
+            await asyncio.to_thread(publish_metrics, store)
+        except Exception:
+            logger.exception("Failed to publish metrics to the state store")
+        await asyncio.sleep(METRICS_PUBLISH_INTERVAL)
+
+
+def collect_metrics(store: Optional["StateStore"]) -> str:
+    """Render the metrics of every worker sharing the store, or of this process alone.
+
+    With a shared store, this worker publishes a fresh snapshot first, and
+    every sample carries a worker label with the process ID of its worker.
+    """
+    """
+    输出共享同一存储的所有工作进程的指标；没有共享存储时只输出本进程的指标。
+
+    使用共享存储时，本工作进程先写入最新的快照，每个样本都带有工作进程ID的worker标签。
+    """
+    if store is None:
+        return registry.render()
+    publish_metrics(store)
+    snapshots = [json.loads(value) for _, value in store.items(METRICS_NAMESPACE)]
+    return render_snapshots(snapshots)
+
+
+class ToolErrorCallbackHandler(BaseCallbackHandler):
+    """Records when tool calls fail, for a WorkflowObserver.
+
+    A tool that raises inside ToolNode emits on_tool_start but no end event
+    in the event stream, so failures are taken from the callbacks instead.
+    """
+    """
+    为WorkflowObserver记录工具调用失败的时间。
+
+    在ToolNode中抛出异常的工具只会在事件流中发出on_tool_start，没有结束事件，
+    因此通过回调获取失败信息。
+    """
+
+    run_inline = True
+
+    def __init__(self, observer: "WorkflowObserver"):
+        self.observer = observer
+
+    def on_tool_error(self, error: BaseException, *, run_id, **kwargs) -> None:
+        self.observer.tool_failed(str(run_id))
+
+
+class WorkflowObserver:
+    """Feeds the metrics from the graph events of one workflow run.
+
+    Start events are paired with their end events by run ID, so the
+    observer only keeps the start times of runs that are still going.
+    Failed tool calls have no end event; pass callback_handler() to the
+    graph run so they are recorded too.
+    """
+    """
+    根据一次工作流运行的图事件更新指标。
+
+    开始事件与结束事件通过运行ID配对，观察者只保存尚未结束的运行的开始时间。
+    失败的工具调用没有结束事件，需要将callback_handler()传给图的运行，才能记录这些调用。
+    """
+
+    def __init__(
+        self,
+        deep_thinking_mode: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.deep_thinking_mode = deep_thinking_mode
+        self.clock = clock
+        self.started = clock()
+        self._starts: dict[str, float] = {}  # 运行ID -> 开始时间
+        self._first_token: set[str] = set()  # 已经收到首个内容的模型调用
+        self._tools: dict[str, str] = {}  # 运行ID -> 尚未结束的工具调用的工具名称
+        self._tool_errors: dict[str, float] = {}  # 运行ID -> 工具调用失败的时间，由回调在工作线程中写入
+        self._errors_lock = threading.Lock()
+        # 本次工作流的模型调用次数和模型API报告的token数
+        self.llm_calls = 0
+        self.tokens = {"input": 0, "output": 0}
+
+    def llm_type(self, agent: str) -> str:
+        # 规划者在深度思考模式下使用推理模型，其他情况下使用基础模型
+        if agent == "planner":
+            return "reasoning" if self.deep_thinking_mode else "basic"
+        return AGENT_LLM_MAP.get(agent, "basic")
+
+    def callback_handler(self) -> ToolErrorCallbackHandler:
+        """Return the callback handler that reports failed tool calls to this observer."""
+        """返回向该观察者报告失败的工具调用的回调处理器。"""
+        return ToolErrorCallbackHandler(self)
+
+    def tool_failed(self, run_id: str) -> None:
+        with self._errors_lock:
+            self._tool_errors[run_id] = self.clock()
+
+    def _record_tool_errors(self) -> None:
+        # 失败的工具调用在其开始事件之后才会被处理，尚未看到开始事件的留到下次
+        with self._errors_lock:
+            failed = [
+                (run_id, self._tool_errors.pop(run_id))
+                for run_id in list(self._tool_errors)
+                if run_id in self._tools
+            ]
+        for run_id, failed_at in failed:
+            tool = self._tools.pop(run_id)
+            started = self._starts.pop(run_id)
+            TOOL_DURATION.observe(failed_at - started, tool=tool)
+            TOOL_CALLS.inc(tool=tool, status="error")
+
+    def observe(self, kind: str, name: str, node: str, run_id: str, data: dict) -> None:
+        if kind in ("on_chain_start", "on_chat_model_start", "on_tool_start"):
+            # 链事件只记录智能体节点本身
+            if kind != "on_chain_start" or name in AGENTS:
+                self._starts[run_id] = self.clock()
+            if kind == "on_tool_start":
+                self._tools[run_id] = name
+            return
+        if kind == "on_chat_model_stream":
+            if run_id in self._starts and run_id not in self._first_token:
+                chunk = data.get("chunk")
+                if chunk is not None and (chunk.content or chunk.additional_kwargs):
+                    self._first_token.add(run_id)
+                    LLM_TTFT.observe(
+                        self.clock() - self._starts[run_id],
+                        agent=self._agent(node),
+                        llm_type=self.llm_type(node),
+                    )
+            return
+        if kind not in ("on_chain_end", "on_chat_model_end", "on_tool_end"):
+            return
+        if kind == "on_chain_end":
+            # 工具节点结束时，其中失败的工具调用都已经报告
+            self._record_tool_errors()
+        started = self._starts.pop(run_id, None)
+        if started is None:
+            return
+        elapsed = self.clock() - started
+        if kind == "on_chain_end":
+            NODE_DURATION.observe(elapsed, agent=name)
+        elif kind == "on_chat_model_end":
+            self._first_token.discard(run_id)
+            self.llm_calls += 1
+            agent, llm_type = self._agent(node), self.llm_type(node)
+            LLM_DURATION.observe(elapsed, agent=agent, llm_type=llm_type)
+            usage = getattr(data.get("output"), "usage_metadata", None)
+            # 只有模型API返回了用量信息时才能统计token数
+            if usage:
+                for direction in ("input", "output"):
+                    tokens = usage.get(f"{direction}_tokens", 0)
+                    self.tokens[direction] += tokens
+                    LLM_TOKENS.inc(
+                        tokens, agent=agent, llm_type=llm_type, direction=direction
+                    )
+        else:
+            self._tools.pop(run_id, None)
+            output = data.get("output")
+            failed = isinstance(output, ToolMessage) and output.status == "error"
+            TOOL_DURATION.observe(elapsed, tool=name)
+            TOOL_CALLS.inc(tool=name, status="error" if failed else "ok")
+
+    def usage(self) -> dict:
+        """Return the model calls and reported tokens of this workflow so far."""
+        """返回本次工作流到目前为止的模型调用次数和报告的token数。"""
+        return {
+            "llm_calls": self.llm_calls,
+            "input_tokens": self.tokens["input"],
+            "output_tokens": self.tokens["output"],
+        }
+
+    def finish(self, status: str) -> None:
+        """Record the outcome and duration of the workflow."""
+        """记录工作流的结果和持续时间。"""
+        self._record_tool_errors()
+        WORKFLOWS.inc(status=status)
+        WORKFLOW_DURATION.observe(self.clock() - self.started)
+
+    @staticmethod
+    def _agent(node: str) -> str:
+        return node if node in AGENTS else "other"
@@ -0,0 +1,166 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from src.cache import make_cache
+from src.config.workflow import (
+    PROFILE_MAX_SIZE,
+    PROFILE_MAX_STACKS,
+    PROFILE_SAMPLE_INTERVAL,
+    PROFILE_TTL,
+)
+from src.service.metrics import AGENTS
+
+# 已完成的性能分析结果，按工作流ID索引，可以通过接口下载
+_profiles = make_cache("profiles", max_size=PROFILE_MAX_SIZE, ttl=PROFILE_TTL)
+
+# 时间线中各类事件的开始和结束事件
+_SPAN_KINDS = {
+    "on_chain_start": "node",
+    "on_chat_model_start": "llm",
+    "on_tool_start": "tool",
+}
+_SPAN_ENDS = frozenset({"on_chain_end", "on_chat_model_end", "on_tool_end"})
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # 只保留路径的最后两级，足以区分同名文件
+    path = os.path.join(*code.co_filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of all threads at a fixed interval.
+
+    Samples are counted per stack in the collapsed format used by flame
+    graph tools: the thread name, then one frame per level, root first.
+    Other requests running at the same time show up in the samples too.
+    """
+    """
+    以固定间隔对所有线程的Python调用栈采样。
+
+    按调用栈统计采样次数，调用栈使用火焰图工具的折叠格式：线程名称在前，之后从根到叶
+    每层一个栈帧。同时运行的其他请求也会出现在采样结果中。
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+
+class WorkflowProfile:
+    """Profiles one workflow run: sampled stacks and a timeline of its steps.
+
+    The timeline holds every agent node, model call and tool call with its
+    start and end, in seconds from the start of the profile.
+    """
+    """
+    对一次工作流运行进行性能分析：采样调用栈，并记录各步骤的时间线。
+
+    时间线包含每个智能体节点、模型调用和工具调用的开始和结束时间（从性能分析开始计算的秒数）。
+    """
+
+    def __init__(self, workflow_id: str, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.workflow_id = workflow_id
+        self.profiler = SamplingProfiler(interval)
+        self.started = time.monotonic()
+        self.timeline: list[dict] = []
+        self._running: dict[str, dict] = {}  # 运行ID -> 尚未结束的步骤
+        self._finished = False
+
+    def _now(self) -> float:
+        return round(time.monotonic() - self.started, 6)
+
+    def start(self) -> None:
+        self.started = time.monotonic()
+        self.profiler.start()
+
+    def observe(self, kind: str, name: str, node: str, run_id: str, data: dict) -> None:
+        """Add the graph event of a node, model call or tool call to the timeline."""
+        """将节点、模型调用或工具调用的图事件加入时间线。"""
+        if kind in _SPAN_KINDS:
+            span_kind = _SPAN_KINDS[kind]
+            # 链事件只记录智能体节点本身
+            if span_kind == "node" and name not in AGENTS:
+                return
+            span = {"kind": span_kind, "name": name, "agent": node or name, "start": self._now()}
+            self._running[run_id] = span
+        elif kind in _SPAN_ENDS:
+            span = self._running.pop(run_id, None)
+            if span is not None:
+                span["end"] = self._now()
+                self.timeline.append(span)
+
+    def finish(self, status: str) -> str:
+        """Stop sampling and store the profile. Returns the profile ID.
+
+        Later calls only return the ID.
+        """
+        """
+        停止采样并保存性能分析结果，返回结果的ID。
+
+        之后的调用只返回ID。
+        """
+        if self._finished:
+            return self.workflow_id
+        self._finished = True
+        self.profiler.stop()
+        duration = self._now()
+        # 未结束的步骤（例如工作流被取消时）没有结束时间
+        unfinished = [{**span, "end": None} for span in self._running.values()]
+        stacks = self.profiler.samples.most_common(PROFILE_MAX_STACKS)
+        _profiles.set(
+            self.workflow_id,
+            {
+                "profile_id": self.workflow_id,
+                "workflow_id": self.workflow_id,
+                "status": status,
+                "duration": duration,
+                "interval": self.profiler.interval,
+                "samples": sum(self.profiler.samples.values()),
+                "timeline": sorted(
+                    self.timeline + unfinished, key=lambda span: span["start"]
+                ),
+                "stacks": [{"stack": stack, "samples": count} for stack, count in stacks],
+            },
+        )
+        return self.workflow_id
+
+
+def get_profile(profile_id: str) -> Optional[dict]:
+    """Return a stored profile, or None if it is unknown or expired."""
+    """返回保存的性能分析结果；不存在或已过期时返回None。"""
+    return _profiles.get(profile_id)
+
+
+def collapsed_stacks(profile: dict) -> str:
+    """Return the sampled stacks in the collapsed format of flame graph tools."""
+    """以火焰图工具使用的折叠格式返回采样的调用栈。"""
+    return "".join(f"{entry['stack']} {entry['samples']}\n" for entry in profile["stacks"])
@@ -0,0 +1,444 @@
+import contextlib
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Iterator, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool, StructuredTool
+
+from src.agents import agents
+from src.agents.fake_llm import FakeChatModel, _agent_name, _call_id, use_fake_llms
+from src.graph import nodes
+from src.service.workflow_service import run_agent_workflow
+
+# 追踪文件格式的版本
+TRACE_VERSION = 1
+
+# 回放时无法按原样重现的事件，不计入事件流的特征
+_UNREPLAYABLE_EVENTS = frozenset({"tool_call_progress", "queue_position"})
+
+
+class TraceMismatchError(Exception):
+    """The workflow asked for a model response or tool result the trace does not have."""
+    """工作流请求的模型回复或工具结果在追踪记录中不存在。"""
+
+
+def stream_signature(events: list[dict]) -> list[list[str]]:
+    """Reduce an event stream to its event types and agent or tool names.
+
+    IDs, timings and message chunking differ between runs, so consecutive
+    message events count as one and tool progress events are left out.
+    """
+    """
+    将事件流简化为事件类型及其智能体或工具名称。
+
+    ID、时间和消息的分片方式在每次运行中都不同，因此连续的消息事件只计为一个，
+    工具的部分输出事件不计入。
+    """
+    signature = []
+    for event in events:
+        if event["event"] in _UNREPLAYABLE_EVENTS:
+            continue
+        data = event.get("data") or {}
+        entry = [event["event"], data.get("agent_name") or data.get("tool_name") or ""]
+        if entry[0] == "message" and signature and signature[-1] == entry:
+            continue
+        signature.append(entry)
+    return signature
+
+
+def _agent(metadata: Optional[dict]) -> str:
+    # 与事件流相同，通过checkpoint命名空间确定所属的智能体节点
+    return ((metadata or {}).get("checkpoint_ns") or "").split(":")[0]
+
+
+def _message_to_dict(message: BaseMessage) -> dict:
+    data = {
+        "content": message.content if isinstance(message.content, str) else message.text(),
+        "tool_calls": [
+            {"name": call["name"], "args": call["args"], "id": call["id"]}
+            for call in getattr(message, "tool_calls", [])
+        ],
+        "usage_metadata": getattr(message, "usage_metadata", None),
+    }
+    reasoning = message.additional_kwargs.get("reasoning_content")
+    if reasoning:
+        data["reasoning_content"] = reasoning
+    return data
+
+
+def _json_safe(value: Any) -> Any:
+    try:
+        json.dumps(value)
+        return value
+    except TypeError:
+        return str(value)
+
+
+class TraceRecorder(BaseCallbackHandler):
+    """Captures every model response and tool result of a workflow run.
+
+    Each call is kept with its agent, its start time relative to the start of
+    the recording, its duration and, for streamed model calls, the time to
+    its first token.
+    """
+    """
+    记录一次工作流运行中的所有模型回复和工具结果。
+
+    每次调用都记录所属的智能体、相对于记录开始的开始时间和持续时间；
+    流式模型调用还记录首个token的延迟。
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.llm_calls: list[dict] = []
+        self.tool_calls: list[dict] = []
+        self._running: dict[UUID, dict] = {}  # 运行ID -> 尚未结束的调用
+        self._lock = threading.Lock()
+
+    def _now(self) -> float:
+        return round(time.monotonic() - self.started, 6)
+
+    def on_chat_model_start(
+        self, serialized: dict, messages: list, *, run_id: UUID, metadata=None, **kwargs
+    ) -> None:
+        invocation_params = kwargs.get("invocation_params") or {}
+        with self._lock:
+            self._running[run_id] = {
+                "agent": _agent(metadata),
+                "start": self._now(),
+                "first_token": None,
+                # 以JSON格式返回的结构化输出，回放时需要转换为工具调用
+                "structured": "response_format" in invocation_params,
+            }
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs) -> None:
+        with self._lock:
+            call = self._running.get(run_id)
+            if call is not None and call["first_token"] is None:
+                call["first_token"] = round(self._now() - call["start"], 6)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        with self._lock:
+            call = self._running.pop(run_id, None)
+            if call is None:
+                return
+            generation = response.generations[0][0]
+            call["duration"] = round(self._now() - call["start"], 6)
+            call["message"] = _message_to_dict(generation.message)
+            self.llm_calls.append(call)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        with self._lock:
+            self._running.pop(run_id, None)
+
+    def on_tool_start(
+        self,
+        serialized: dict,
+        input_str: str,
+        *,
+        run_id: UUID,
+        metadata=None,
+        inputs: Optional[dict] = None,
+        **kwargs,
+    ) -> None:
+        with self._lock:
+            self._running[run_id] = {
+                "agent": _agent(metadata),
+                "tool": serialized["name"],
+                "input": _json_safe(inputs if inputs is not None else input_str),
+                "start": self._now(),
+            }
+
+    def _end_tool(self, run_id: UUID, output: Any, error: Optional[str]) -> None:
+        with self._lock:
+            call = self._running.pop(run_id, None)
+            if call is None:
+                return
+            call["duration"] = round(self._now() - call["start"], 6)
+            call["output"] = _json_safe(output)
+            call["error"] = error
+            self.tool_calls.append(call)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs) -> None:
+        content = output.content if isinstance(output, ToolMessage) else output
+        self._end_tool(run_id, content, None)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._end_tool(run_id, None, str(error))
+
+    def trace(self, input_messages: list, events: list[dict], options: dict) -> dict:
+        """Return the recording as a trace that replay_workflow can play back."""
+        """返回可以由replay_workflow回放的追踪记录。"""
+        return {
+            "version": TRACE_VERSION,
+            "input": input_messages,
+            "options": options,
+            "duration": self._now(),
+            "llm_calls": sorted(self.llm_calls, key=lambda call: call["start"]),
+            "tool_calls": sorted(self.tool_calls, key=lambda call: call["start"]),
+            "events": stream_signature(events),
+        }
+
+
+def save_trace(path: str, trace: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trace, f, ensure_ascii=False, indent=1)
+
+
+def load_trace(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        trace = json.load(f)
+    if trace.get("version") != TRACE_VERSION:
+        raise ValueError(f"Unsupported trace version: {trace.get('version')}")
+    return trace
+
+
+class TracePlayer:
+    """Hands out the recorded model responses and tool results of a trace.
+
+    Model responses are played back per agent in the order they were
+    recorded. Tool results are matched by tool name and input, falling back
+    to the next recorded call of the same tool.
+    """
+    """
+    按顺序提供追踪记录中的模型回复和工具结果。
+
+    模型回复按智能体分别以记录的顺序回放；工具结果按工具名称和输入匹配，
+    匹配不到时使用同一工具下一个被记录的调用。
+    """
+
+    def __init__(self, trace: dict, timed: bool = False):
+        self.timed = timed  # 是否按记录的耗时等待
+        self.mismatches: list[str] = []  # 追踪记录中没有对应结果的请求
+        self._llm_calls: dict[str, deque] = defaultdict(deque)
+        self._tool_calls: dict[str, list] = defaultdict(list)
+        for call in trace["llm_calls"]:
+            self._llm_calls[call["agent"]].append(call)
+        for call in trace["tool_calls"]:
+            self._tool_calls[call["tool"]].append(call)
+        self._lock = threading.Lock()
+
+    def next_llm_call(self, agent: str) -> dict:
+        with self._lock:
+            if not self._llm_calls[agent]:
+                self.mismatches.append(f"model call of {agent or 'unknown agent'}")
+                raise TraceMismatchError(f"No recorded model call left for {agent!r}")
+            return self._llm_calls[agent].popleft()
+
+    def next_tool_call(self, tool: str, tool_input: dict) -> dict:
+        with self._lock:
+            calls = self._tool_calls[tool]
+            if not calls:
+                self.mismatches.append(f"call of {tool}")
+                raise TraceMismatchError(f"No recorded call left for tool {tool!r}")
+            index = next(
+                (i for i, call in enumerate(calls) if call["input"] == tool_input), 0
+            )
+            return calls.pop(index)
+
+    def remaining(self) -> int:
+        """Return the number of recorded calls that were not played back."""
+        """返回尚未回放的调用数。"""
+        with self._lock:
+            return sum(map(len, self._llm_calls.values())) + sum(
+                map(len, self._tool_calls.values())
+            )
+
+    def play_tool(self, tool: str, tool_input: dict) -> Any:
+        call = self.next_tool_call(tool, tool_input)
+        if self.timed:
+            time.sleep(call["duration"])
+        if call["error"] is not None:
+            raise RuntimeError(call["error"])
+        return call["output"]
+
+
+class ReplayChatModel(FakeChatModel):
+    """A chat model that answers with the responses recorded in a trace."""
+    """使用追踪记录中的回复作答的聊天模型。"""
+
+    player: Any
+
+    def _recorded(self, tools: Optional[list[dict]]) -> tuple[AIMessage, dict]:
+        call = self.player.next_llm_call(_agent_name())
+        data = call["message"]
+        tool_calls = data["tool_calls"]
+        names = [t["function"]["name"] for t in tools or []]
+        if call.get("structured") and not tool_calls and names:
+            # 记录时以JSON内容返回的结构化输出，通过绑定的工具返回
+            tool_calls = [{"name": names[0], "args": json.loads(data["content"]), "id": _call_id()}]
+            data = {**data, "content": ""}
+        message = AIMessage(
+            content=data["content"],
+            tool_calls=tool_calls,
+            usage_metadata=data.get("usage_metadata"),
+            additional_kwargs=(
+                {"reasoning_content": data["reasoning_content"]}
+                if data.get("reasoning_content")
+                else {}
+            ),
+        )
+        return message, call
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        message, call = self._recorded(tools)
+        if self.player.timed:
+            time.sleep(call["duration"])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self, messages, stop=None, run_manager=None, tools=None, **kwargs
+    ) -> Iterator[ChatGenerationChunk]:
+        message, call = self._recorded(tools)
+        if not self.player.timed:
+            yield from self._chunks(message)
+            return
+        # 首个片段前等待记录的首个token延迟，其余时间平均分配到后续片段之间
+        first_token = call["first_token"] or call["duration"]
+        chunks = list(self._chunks(message))
+        gap = max(call["duration"] - first_token, 0) / max(len(chunks) - 1, 1)
+        time.sleep(first_token)
+        for index, chunk in enumerate(chunks):
+            if index:
+                time.sleep(gap)
+            yield chunk
+
+
+def _replay_tool(tool: BaseTool, player: TracePlayer) -> BaseTool:
+    """Return a tool with the same name and schema that plays back recorded results."""
+    """返回名称和参数与原工具相同、回放记录结果的工具。"""
+
+    def play(**kwargs):
+        return player.play_tool(tool.name, kwargs)
+
+    return StructuredTool.from_function(
+        func=play,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+    )
+
+
+@contextlib.contextmanager
+def replaying(trace: dict, timed: bool = False):
+    """Run workflows against the model responses and tool results of a trace within this block.
+
+    Yields:
+        The TracePlayer, e.g. to check that every recorded call was used
+    """
+    """
+    在该代码块内使用追踪记录中的模型回复和工具结果运行工作流。
+
+    产生:
+        TracePlayer，例如用于检查所有记录的调用是否都被使用
+    """
+    player = TracePlayer(trace, timed)
+    get_agent_tools = agents._get_agent_tools
+    planner_search = nodes.tavily_tool
+    # 智能体在use_fake_llms中重新创建，因此使用回放的工具
+    agents._get_agent_tools = lambda agent_name: [
+        _replay_tool(tool, player) for tool in get_agent_tools(agent_name)
+    ]
+    nodes.tavily_tool = _replay_tool(planner_search, player)
+    try:
+        with use_fake_llms(model=ReplayChatModel(player=player)):
+            yield player
+    finally:
+        agents._get_agent_tools = get_agent_tools
+        nodes.tavily_tool = planner_search
+
+
+async def record_workflow(
+    user_input_messages: list, path: Optional[str] = None, **options
+) -> dict:
+    """Run a workflow and record its model responses and tool results.
+
+    The step cache is bypassed so that every agent step is recorded.
+
+    Args:
+        user_input_messages: The user request messages
+        path: Save the trace to this file if given
+        **options: Further run_agent_workflow options
+
+    Returns:
+        The trace
+    """
+    """
+    运行工作流并记录其模型回复和工具结果。
+
+    不使用步骤结果缓存，以便记录每个智能体步骤。
+
+    参数:
+        user_input_messages: 用户的消息列表
+        path: 提供时将追踪记录保存到该文件
+        **options: 传给run_agent_workflow的其他参数
+
+    返回:
+        追踪记录
+    """
+    options = {"bypass_step_cache": True, **options}
+    recorder = TraceRecorder()
+    events = [
+        event
+        async for event in run_agent_workflow(
+            user_input_messages, callbacks=[recorder], **options
+        )
+    ]
+    # 只保存影响工作流图运行过程的参数
+    graph_options = {
+        key: options[key]
+        for key in ("deep_thinking_mode", "search_before_planning")
+        if key in options
+    }
+    trace = recorder.trace(user_input_messages, events, graph_options)
+    if path is not None:
+        save_trace(path, trace)
+    return trace
+
+
+async def replay_workflow(trace: dict, timed: bool = False, **options) -> list[dict]:
+    """Run the workflow of a trace again, without calling models or tools.
+
+    Args:
+        trace: A trace from record_workflow or load_trace
+        timed: Wait as long as the recorded model and tool calls took;
+            otherwise play them back without delay
+        **options: Further run_agent_workflow options
+
+    Returns:
+        The events of the replayed workflow
+
+    Raises:
+        TraceMismatchError: If the workflow asked for a call the trace does not have
+    """
+    """
+    不调用模型和工具，重新运行追踪记录中的工作流。
+
+    参数:
+        trace: record_workflow或load_trace返回的追踪记录
+        timed: 为True时按记录的模型调用和工具调用的耗时等待，否则不等待直接回放
+        **options: 传给run_agent_workflow的其他参数
+
+    返回:
+        回放的工作流产生的事件
+
+    异常:
+        TraceMismatchError: 工作流请求了追踪记录中没有的调用
+    """
+    options = {**trace["options"], "bypass_step_cache": True, **options}
+    with replaying(trace, timed) as player:
+        events = [
+            event async for event in run_agent_workflow(trace["input"], **options)
+        ]
+    # 工具节点会把工具中的异常转换为错误消息，因此在回放结束后检查
+    if player.mismatches:
+        raise TraceMismatchError(f"Not in the trace: {', '.join(player.mismatches)}")
+    return events
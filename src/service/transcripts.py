@@ -0,0 +1,79 @@
+from collections import Counter
+from typing import Optional
+
+from langchain_community.adapters.openai import convert_message_to_dict
+from langchain_core.messages import BaseMessage
+
+from src.cache import blob_store, make_cache
+from src.config.workflow import TRANSCRIPT_MAX_SIZE, TRANSCRIPT_TTL
+
+# 已结束工作流的对话记录，按工作流ID索引
+# 消息中的大段内容仍以内容存储引用的形式保存，读取时才展开
+_transcripts = make_cache("transcripts", max_size=TRANSCRIPT_MAX_SIZE, ttl=TRANSCRIPT_TTL)
+
+
+def save_transcript(workflow_id: str, messages: list[BaseMessage]) -> None:
+    """Keep the final messages of a workflow for the transcript endpoint."""
+    """保存工作流的最终消息，供对话记录接口读取。"""
+    # 转换后的用户消息不含名称，因此单独保存发送者名称
+    _transcripts.set(
+        workflow_id,
+        [
+            {"id": message.id, "name": message.name, **convert_message_to_dict(message)}
+            for message in messages
+        ],
+    )
+
+
+def get_transcript(
+    workflow_id: str, offset: int = 0, limit: int = 20, max_chars: int = 0
+) -> Optional[dict]:
+    """Return one page of a workflow's transcript, or None if it is unknown.
+
+    Args:
+        workflow_id: The workflow ID sent in the workflow's events
+        offset: Index of the first message to return
+        limit: Number of messages to return
+        max_chars: Truncate each stored text to this many characters; 0 keeps it whole
+    """
+    """
+    返回工作流对话记录中的一页；工作流不存在或记录已过期时返回None。
+
+    参数:
+        workflow_id: 工作流事件中的工作流ID
+        offset: 返回的第一条消息的序号
+        limit: 返回的消息数
+        max_chars: 每段存储内容展开后的最大字符数，0表示不截断
+    """
+    messages = _transcripts.get(workflow_id)
+    if messages is None:
+        return None
+    page = messages[offset : offset + limit]
+    return {
+        "workflow_id": workflow_id,
+        "total": len(messages),
+        "offset": offset,
+        "limit": limit,
+        "messages": blob_store.materialize_messages(page, max_chars=max_chars),
+    }
+
+
+def compact_summary(workflow_id: str, messages: list[BaseMessage]) -> dict:
+    """Build the compact end_of_workflow data: message IDs, the final report and counts."""
+    """构造精简的end_of_workflow事件数据：消息ID、最终报告和消息统计。"""
+    report = next(
+        (message for message in reversed(messages) if message.name == "reporter"), None
+    )
+    return {
+        "workflow_id": workflow_id,
+        "compact": True,
+        "message_ids": [message.id for message in messages],
+        "final_report": (
+            None if report is None else blob_store.materialize(report.content, max_chars=0)
+        ),
+        "summary": {
+            "messages": len(messages),
+            # 各智能体产生的消息数，用户消息计入"user"
+            "by_agent": dict(Counter(message.name or message.type for message in messages)),
+        },
+    }
@@ -0,0 +1,70 @@
+import logging
+import os
+import time
+
+from src.agents import get_agent
+from src.agents.llm import get_llm_by_type
+from src.cache import blob_store
+from src.config import TEAM_MEMBERS
+from src.config.agents import AGENT_LLM_MAP
+from src.config.cache import BLOB_MAX_AGE
+from src.config.tools import BROWSER_WARM_UP
+from src.graph import get_graph
+from src.prompts import load_prompt_template
+from src.repl import get_repl_pool
+from src.tools.browser import get_browser_pool
+
+# 获取当前模块的日志记录器
+logger = logging.getLogger(__name__)
+
+# 提示模板所在目录
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts")
+
+
+def warm_up() -> float:
+    """Pre-create models, prompts, tools, agents and the compiled graph.
+
+    Returns:
+        The time spent warming up, in seconds
+    """
+    """
+    预先创建模型、提示模板、工具、智能体以及已编译的工作流图，
+    使第一个请求不必承担这些初始化开销。
+
+    返回:
+        预热所花费的时间（秒）
+    """
+    start = time.perf_counter()
+
+    # 创建所有智能体用到的LLM实例
+    for llm_type in set(AGENT_LLM_MAP.values()):
+        get_llm_by_type(llm_type)
+
+    # 解析所有提示模板
+    for filename in os.listdir(PROMPTS_DIR):
+        if filename.endswith(".md"):
+            load_prompt_template(filename.removesuffix(".md"))
+
+    # 创建使用工具的ReAct智能体（同时会加载所有工具）
+    for agent_name in TEAM_MEMBERS:
+        if agent_name != "reporter":
+            get_agent(agent_name)
+
+    # 预先启动Python REPL工作进程（会预先导入pandas和numpy）
+    get_repl_pool().start()
+
+    # 启动浏览器池的事件循环；按配置预先启动浏览器，启动失败不影响服务
+    try:
+        get_browser_pool().start(launch=BROWSER_WARM_UP)
+    except Exception as e:
+        logger.warning(f"Failed to warm up the browser pool: {e}")
+
+    # 清理长时间未使用的大型消息内容
+    blob_store.prune(BLOB_MAX_AGE)
+
+    # 编译共享的工作流图
+    get_graph()
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Warm-up completed in {elapsed:.2f}s")
+    return elapsed
@@ -1,7 +1,33 @@
+import asyncio
 import logging
+import time
+from typing import Callable, Collection, Optional
 
+from src.cache import blob_store, truncate_middle
 from src.config import TEAM_MEMBERS
-from src.graph import build_graph
+from src.config.workflow import (
+    END_OF_WORKFLOW_COMPACT,
+    STREAM_COALESCE_MAX_CHARS,
+    STREAM_COALESCE_MAX_MS,
+    TOOL_RESULT_EVENT_MAX_CHARS,
+    WORKFLOW_TIMEOUT,
+)
+from src.graph import get_graph
+from src.graph.budget import BUDGET_EXHAUSTED_EVENT
+from src.repl import get_repl_pool
+from src.service.coalescing import DeltaCoalescer
+from src.service.metrics import WorkflowObserver
+from src.service.profiling import WorkflowProfile
+from src.service.transcripts import compact_summary, save_transcript
+from src.service.cancellation import (
+    CANCELLATION_CONFIG_KEY,
+    CancellationCallbackHandler,
+    CancellationToken,
+    WorkflowCancelledError,
+    register_workflow,
+    unregister_workflow,
+)
+from src.tools.progress import TOOL_PROGRESS_EVENT
 from langchain_community.adapters.openai import convert_message_to_dict
 import uuid
 
@@ -22,27 +48,136 @@ def enable_debug_logging():
 # 获取当前模块的日志记录器
 logger = logging.getLogger(__name__)
 
-# 创建工作流图
-# 调用build_graph函数构建完整的智能体工作流图
-graph = build_graph()
-
-# 协调者消息缓存
-# 用于临时存储协调者产生的消息块，以便进行消息处理和判断
-coordinator_cache = []
+# 协调者消息缓存的最大片段数
+# 每个工作流的事件流各自缓存协调者产生的前几个消息块，用于判断是否切换到planner
 MAX_CACHE_SIZE = 2  # 最大缓存大小，用于决定何时处理和发送协调者消息
 
+# 工作流事件流中可能出现的所有事件类型，客户端可以只订阅其中的一部分
+EVENT_TYPES = frozenset(
+    {
+        "start_of_workflow",
+        "end_of_workflow",
+        "workflow_cancelled",
+        "start_of_agent",
+        "end_of_agent",
+        "start_of_llm",
+        "end_of_llm",
+        "message",
+        "tool_call",
+        "tool_call_progress",
+        "tool_call_result",
+        "budget_exhausted",
+        "queue_position",
+    }
+)
+
+# 图事件转发队列中表示事件流结束的标记
+_END = object()
+
+
+async def _forward_events(events, queue: asyncio.Queue) -> None:
+    """Move graph events into the queue, ending with _END or the error."""
+    """将图事件转移到队列中，最后放入_END标记或发生的异常。"""
+    try:
+        async for event in events:
+            queue.put_nowait(event)
+        queue.put_nowait(_END)
+    except WorkflowCancelledError:
+        queue.put_nowait(_END)
+    except Exception as e:
+        queue.put_nowait(e)
+
+
+async def _drain(
+    queue: asyncio.Queue, timeout: Callable[[], Optional[float]] = lambda: None
+):
+    """Yield events from the queue until the stream ends or fails.
+
+    None is yielded when no event arrived within timeout() seconds.
+    """
+    """
+    从队列中逐个取出事件，直到事件流结束或出错。
+
+    如果在timeout()秒内没有收到事件，则产生None。
+    """
+    while True:
+        wait = timeout()
+        if wait is None or not queue.empty():
+            event = await queue.get()
+        else:
+            try:
+                event = await asyncio.wait_for(queue.get(), wait)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+        if event is _END:
+            return
+        if isinstance(event, Exception):
+            raise event
+        yield event
+
+
+def _tool_result(content, max_chars: int) -> tuple:
+    """Return a tool result for the event stream, truncated to max_chars."""
+    """返回发送到事件流中的工具结果（截断为max_chars个字符）及是否被截断。"""
+    # 展开内容存储中的引用
+    content = blob_store.materialize(content, max_chars=0)
+    if max_chars <= 0:
+        return content, False
+    if isinstance(content, str):
+        return truncate_middle(content, max_chars), len(content) > max_chars
+    if isinstance(content, list):
+        # 内容块列表（例如抓取结果中的文本和图像）只截断其中的文本
+        truncated = False
+        parts = []
+        for part in content:
+            if isinstance(part, dict) and isinstance(part.get("text"), str):
+                truncated = truncated or len(part["text"]) > max_chars
+                part = {**part, "text": truncate_middle(part["text"], max_chars)}
+            parts.append(part)
+        return parts, truncated
+    return content, False
+
 
 async def run_agent_workflow(
     user_input_messages: list,
     debug: bool = False,
     deep_thinking_mode: bool = False,
     search_before_planning: bool = False,
+    bypass_step_cache: bool = False,
+    cancellation: Optional[CancellationToken] = None,
+    coalesce_ms: int = 0,
+    coalesce_chars: int = 0,
+    event_types: Optional[Collection[str]] = None,
+    tool_result_max_chars: int = TOOL_RESULT_EVENT_MAX_CHARS,
+    compact_end_of_workflow: bool = END_OF_WORKFLOW_COMPACT,
+    callbacks: Optional[list] = None,
+    profile: bool = False,
 ):
     """Run the agent workflow with the given user input.
 
+    The graph runs in its own task. Cancelling the token, or closing this
+    generator before the workflow ends, stops that task and the model calls
+    and tools still running in worker threads.
+
     Args:
         user_input_messages: The user request messages
         debug: If True, enables debug level logging
+        bypass_step_cache: If True, agent steps are never served from the cache
+        cancellation: Token used to cancel the workflow from outside
+        coalesce_ms: Batch message deltas for up to this many milliseconds
+        coalesce_chars: Send a batch of message deltas once it has this many
+            characters; with coalesce_ms, whichever limit is reached first
+        event_types: Event types to send (see EVENT_TYPES); all if None
+        tool_result_max_chars: Truncate tool results in tool_call_result
+            events to this many characters; 0 sends them in full
+        compact_end_of_workflow: Send only message IDs, the final report and
+            a summary in end_of_workflow; the messages themselves can be read
+            with get_transcript
+        callbacks: Further LangChain callback handlers for the graph run,
+            e.g. a TraceRecorder
+        profile: Run the workflow under the sampling profiler and record a
+            timeline of its steps; end_of_workflow carries the profile ID
 
     Returns:
         The final state after the workflow completes
@@ -55,7 +190,21 @@ async def run_agent_workflow(
         debug: 如果为True，则启用DEBUG级别的日志记录
         deep_thinking_mode: 如果为True，则启用深度思考模式，使用推理LLM
         search_before_planning: 如果为True，则在规划前执行搜索
+        bypass_step_cache: 如果为True，则智能体步骤不使用缓存结果
+        cancellation: 用于从外部取消工作流的令牌
+        coalesce_ms: 将消息增量合并后再发送，最多等待的毫秒数
+        coalesce_chars: 合并的消息增量达到该字符数时立即发送；与coalesce_ms同时设置时以先到者为准
+        event_types: 需要发送的事件类型（见EVENT_TYPES），为None时发送所有事件
+        tool_result_max_chars: tool_call_result事件中工具结果的最大字符数，0表示发送完整结果
+        compact_end_of_workflow: end_of_workflow事件只包含消息ID、最终报告和摘要，
+            完整的消息可以通过get_transcript读取
+        callbacks: 图运行时使用的其他LangChain回调处理器，例如TraceRecorder
+        profile: 在采样性能分析器下运行工作流，并记录各步骤的时间线；
+            end_of_workflow事件中包含性能分析结果的ID
         
+    工作流图在独立的任务中运行。取消令牌或在工作流结束前关闭该生成器时，
+    会停止该任务以及仍在工作线程中运行的模型调用和工具。
+
     返回:
         异步生成工作流事件流
     """
@@ -77,15 +226,33 @@ async def run_agent_workflow(
     # 包括所有团队成员以及planner和coordinator
     streaming_llm_agents = [*TEAM_MEMBERS, "planner", "coordinator"]
 
-    # 在每次工作流启动时重置协调者缓存
-    global coordinator_cache
+    # 协调者消息缓存和切换标记属于本次工作流的事件流
+    # 使用局部变量，同一进程中并发的多个事件流互不干扰
     coordinator_cache = []
-    global is_handoff_case
     is_handoff_case = False  # 标记是否为切换到planner的情况
+    final_output = None  # 工作流结束时的最终状态
+
+    def wanted(event_type: str) -> bool:
+        # 客户端是否订阅了该类型的事件
+        return event_types is None or event_type in event_types
 
+    # 按请求协商的参数合并消息增量，参数不超过服务器允许的上限，均为0时不合并
+    coalescer = DeltaCoalescer(
+        interval=min(max(coalesce_ms, 0), STREAM_COALESCE_MAX_MS) / 1000,
+        max_chars=min(max(coalesce_chars, 0), STREAM_COALESCE_MAX_CHARS),
+    )
+
+    # 根据图事件记录节点、模型调用和工具调用的耗时等指标
+    observer = WorkflowObserver(deep_thinking_mode)
+
+    # 注册取消令牌，以便根据工作流ID取消工作流
+    token = cancellation or CancellationToken()
+    register_workflow(workflow_id, token)
+    # 图事件由独立的任务转发到队列中，取消时可以立即停止该任务，而不必等待下一个事件
+    queue: asyncio.Queue = asyncio.Queue()
     # 使用异步流式API获取工作流事件
     # TODO: 提取消息内容，特别是用于on_chat_model_stream事件
-    async for event in graph.astream_events(
+    graph_events = get_graph().astream_events(
         {
             # 常量设置
             "TEAM_MEMBERS": TEAM_MEMBERS,  # 团队成员列表
@@ -93,119 +260,176 @@ async def run_agent_workflow(
             "messages": user_input_messages,  # 用户输入消息
             "deep_thinking_mode": deep_thinking_mode,  # 深度思考模式设置
             "search_before_planning": search_before_planning,  # 规划前搜索设置
+            "bypass_step_cache": bypass_step_cache,  # 是否绕过步骤结果缓存
+            "workflow_deadline": time.time() + WORKFLOW_TIMEOUT,  # 工作流截止时间
+        },
+        config={
+            "configurable": {
+                "workflow_id": workflow_id,  # 工具通过工作流ID区分会话
+                CANCELLATION_CONFIG_KEY: token,  # 工具通过令牌感知取消
+            },
+            "callbacks": [
+                # 取消后在下一个节点、模型调用、token或工具调用处停止
+                CancellationCallbackHandler(token),
+                # 失败的工具调用没有结束事件，通过回调记录到指标中
+                observer.callback_handler(),
+                *(callbacks or []),
+            ],
         },
         version="v2",  # 使用v2版本的事件流API
-    ):
-        # 从事件中提取关键信息
-        kind = event.get("event")  # 事件类型
-        data = event.get("data")   # 事件数据
-        name = event.get("name")   # 事件名称
-        metadata = event.get("metadata")  # 元数据
+    )
+    producer = asyncio.create_task(_forward_events(graph_events, queue))
+    loop = asyncio.get_running_loop()
+
+    def stop_producer():
+        # 令牌可能在其他线程中被取消
+        loop.call_soon_threadsafe(producer.cancel)
+        loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+    remove_callback = token.on_cancel(stop_producer)
+    status = "failed"  # 工作流的结果，用于指标统计
+    # 按请求开启的性能分析：采样调用栈，并记录节点、模型调用和工具调用的时间线
+    profiler = WorkflowProfile(workflow_id) if profile else None
+    if profiler is not None:
+        profiler.start()
+
+    try:
+        async for event in _drain(queue, coalescer.timeout):
+            # 一段时间内没有新事件，发送已到期的合并帧
+            if event is None:
+                for frame in coalescer.flush():
+                    yield frame
+                continue
+
+            # 从事件中提取关键信息
+            kind = event.get("event")  # 事件类型
+            data = event.get("data")   # 事件数据
+            name = event.get("name")   # 事件名称
+            metadata = event.get("metadata")  # 元数据
         
-        # 提取当前节点名称（从checkpoint命名空间中）
-        node = (
-            ""
-            if (metadata.get("checkpoint_ns") is None)
-            else metadata.get("checkpoint_ns").split(":")[0]
-        )
+            # 提取当前节点名称（从checkpoint命名空间中）
+            node = (
+                ""
+                if (metadata.get("checkpoint_ns") is None)
+                else metadata.get("checkpoint_ns").split(":")[0]
+            )
         
-        # 提取LangGraph执行步骤
-        langgraph_step = (
-            ""
-            if (metadata.get("langgraph_step") is None)
-            else str(metadata["langgraph_step"])
-        )
+            # 提取LangGraph执行步骤
+            langgraph_step = (
+                ""
+                if (metadata.get("langgraph_step") is None)
+                else str(metadata["langgraph_step"])
+            )
         
-        # 提取运行ID
-        run_id = "" if (event.get("run_id") is None) else str(event["run_id"])
-
-        # 根据事件类型和节点名称处理不同的事件
-        # 1. 智能体链开始事件
-        if kind == "on_chain_start" and name in streaming_llm_agents:
-            # 如果是规划者开始，则发出工作流开始事件
-            if name == "planner":
-                yield {
-                    "event": "start_of_workflow",
-                    "data": {"workflow_id": workflow_id, "input": user_input_messages},
+            # 提取运行ID
+            run_id = "" if (event.get("run_id") is None) else str(event["run_id"])
+            observer.observe(kind, name, node, run_id, data)
+            if profiler is not None:
+                profiler.observe(kind, name, node, run_id, data)
+
+            # 记录整个工作流的最终状态，用于发送工作流结束事件
+            if kind == "on_chain_end" and not metadata.get("langgraph_node"):
+                final_output = data.get("output")
+
+            # 根据事件类型和节点名称处理不同的事件
+            # 1. 智能体链开始事件
+            if kind == "on_chain_start" and name in streaming_llm_agents:
+                # 如果是规划者开始，则发出工作流开始事件
+                if name == "planner" and wanted("start_of_workflow"):
+                    for out in coalescer.add(
+                        {
+                            "event": "start_of_workflow",
+                            "data": {"workflow_id": workflow_id, "input": user_input_messages},
+                        }
+                    ):
+                        yield out
+                # 为所有智能体发出智能体开始事件
+                ydata = {
+                    "event": "start_of_agent",
+                    "data": {
+                        "agent_name": name,  # 智能体名称
+                        "agent_id": f"{workflow_id}_{name}_{langgraph_step}",  # 唯一智能体实例ID
+                    },
                 }
-            # 为所有智能体发出智能体开始事件
-            ydata = {
-                "event": "start_of_agent",
-                "data": {
-                    "agent_name": name,  # 智能体名称
-                    "agent_id": f"{workflow_id}_{name}_{langgraph_step}",  # 唯一智能体实例ID
-                },
-            }
-        # 2. 智能体链结束事件
-        elif kind == "on_chain_end" and name in streaming_llm_agents:
-            ydata = {
-                "event": "end_of_agent",
-                "data": {
-                    "agent_name": name,  # 智能体名称
-                    "agent_id": f"{workflow_id}_{name}_{langgraph_step}",  # 唯一智能体实例ID
-                },
-            }
-        # 3. 语言模型开始事件
-        elif kind == "on_chat_model_start" and node in streaming_llm_agents:
-            ydata = {
-                "event": "start_of_llm",
-                "data": {"agent_name": node},  # 使用LLM的智能体名称
-            }
-        # 4. 语言模型结束事件
-        elif kind == "on_chat_model_end" and node in streaming_llm_agents:
-            ydata = {
-                "event": "end_of_llm",
-                "data": {"agent_name": node},  # 使用LLM的智能体名称
-            }
-        # 5. 语言模型流式输出事件（处理模型生成的内容块）
-        elif kind == "on_chat_model_stream" and node in streaming_llm_agents:
-            content = data["chunk"].content  # 获取内容块
-            
-            # 处理空内容或只有推理内容的情况
-            if content is None or content == "":
-                if not data["chunk"].additional_kwargs.get("reasoning_content"):
-                    # 跳过完全空的消息
-                    continue
-                # 生成包含推理内容的事件
+            # 2. 智能体链结束事件
+            elif kind == "on_chain_end" and name in streaming_llm_agents:
                 ydata = {
-                    "event": "message",
+                    "event": "end_of_agent",
                     "data": {
-                        "message_id": data["chunk"].id,  # 消息ID
-                        "delta": {
-                            "reasoning_content": (
-                                data["chunk"].additional_kwargs["reasoning_content"]  # 推理内容
-                            )
-                        },
+                        "agent_name": name,  # 智能体名称
+                        "agent_id": f"{workflow_id}_{name}_{langgraph_step}",  # 唯一智能体实例ID
                     },
                 }
-            else:
-                # 处理有实际内容的消息
-                # 特别处理来自协调者的消息
-                if node == "coordinator":
-                    if len(coordinator_cache) < MAX_CACHE_SIZE:
-                        # 将内容添加到缓存
-                        coordinator_cache.append(content)
-                        cached_content = "".join(coordinator_cache)  # 合并缓存内容
+            # 3. 语言模型开始事件
+            elif kind == "on_chat_model_start" and node in streaming_llm_agents:
+                ydata = {
+                    "event": "start_of_llm",
+                    "data": {"agent_name": node},  # 使用LLM的智能体名称
+                }
+            # 4. 语言模型结束事件
+            elif kind == "on_chat_model_end" and node in streaming_llm_agents:
+                ydata = {
+                    "event": "end_of_llm",
+                    "data": {"agent_name": node},  # 使用LLM的智能体名称
+                }
+            # 5. 语言模型流式输出事件（处理模型生成的内容块）
+            elif kind == "on_chat_model_stream" and node in streaming_llm_agents:
+                content = data["chunk"].content  # 获取内容块
+            
+                # 处理空内容或只有推理内容的情况
+                if content is None or content == "":
+                    if not data["chunk"].additional_kwargs.get("reasoning_content"):
+                        # 跳过完全空的消息
+                        continue
+                    # 生成包含推理内容的事件
+                    ydata = {
+                        "event": "message",
+                        "data": {
+                            "message_id": data["chunk"].id,  # 消息ID
+                            "delta": {
+                                "reasoning_content": (
+                                    data["chunk"].additional_kwargs["reasoning_content"]  # 推理内容
+                                )
+                            },
+                        },
+                    }
+                else:
+                    # 处理有实际内容的消息
+                    # 特别处理来自协调者的消息
+                    if node == "coordinator":
+                        if len(coordinator_cache) < MAX_CACHE_SIZE:
+                            # 将内容添加到缓存
+                            coordinator_cache.append(content)
+                            cached_content = "".join(coordinator_cache)  # 合并缓存内容
                         
-                        # 检查是否为切换到planner的指令
-                        if cached_content.startswith("handoff"):
-                            is_handoff_case = True  # 标记为切换情况
-                            continue
+                            # 检查是否为切换到planner的指令
+                            if cached_content.startswith("handoff"):
+                                is_handoff_case = True  # 标记为切换情况
+                                continue
                             
-                        # 如果缓存未满，继续收集
-                        if len(coordinator_cache) < MAX_CACHE_SIZE:
-                            continue
+                            # 如果缓存未满，继续收集
+                            if len(coordinator_cache) < MAX_CACHE_SIZE:
+                                continue
                             
-                        # 缓存已满，发送完整的缓存内容
-                        ydata = {
-                            "event": "message",
-                            "data": {
-                                "message_id": data["chunk"].id,
-                                "delta": {"content": cached_content},  # 发送合并后的内容
-                            },
-                        }
-                    elif not is_handoff_case:
-                        # 如果不是切换情况且缓存已满，直接发送当前内容
+                            # 缓存已满，发送完整的缓存内容
+                            ydata = {
+                                "event": "message",
+                                "data": {
+                                    "message_id": data["chunk"].id,
+                                    "delta": {"content": cached_content},  # 发送合并后的内容
+                                },
+                            }
+                        elif not is_handoff_case:
+                            # 如果不是切换情况且缓存已满，直接发送当前内容
+                            ydata = {
+                                "event": "message",
+                                "data": {
+                                    "message_id": data["chunk"].id,
+                                    "delta": {"content": content},
+                                },
+                            }
+                    else:
+                        # 对于其他智能体，直接发送消息内容
                         ydata = {
                             "event": "message",
                             "data": {
@@ -213,52 +437,122 @@ async def run_agent_workflow(
                                 "delta": {"content": content},
                             },
                         }
-                else:
-                    # 对于其他智能体，直接发送消息内容
-                    ydata = {
-                        "event": "message",
-                        "data": {
-                            "message_id": data["chunk"].id,
-                            "delta": {"content": content},
-                        },
-                    }
-        # 6. 工具调用开始事件
-        elif kind == "on_tool_start" and node in TEAM_MEMBERS:
-            ydata = {
-                "event": "tool_call",
-                "data": {
-                    "tool_call_id": f"{workflow_id}_{node}_{name}_{run_id}",  # 唯一工具调用ID
-                    "tool_name": name,  # 工具名称
-                    "tool_input": data.get("input"),  # 工具输入参数
-                },
-            }
-        # 7. 工具调用结束事件
-        elif kind == "on_tool_end" and node in TEAM_MEMBERS:
-            ydata = {
-                "event": "tool_call_result",
-                "data": {
-                    "tool_call_id": f"{workflow_id}_{node}_{name}_{run_id}",  # 唯一工具调用ID
-                    "tool_name": name,  # 工具名称
-                    "tool_result": data["output"].content if data.get("output") else "",  # 工具执行结果
-                },
-            }
-        else:
-            # 跳过不需要处理的事件
-            continue
+            # 6. 工具调用开始事件
+            elif kind == "on_tool_start" and node in TEAM_MEMBERS:
+                ydata = {
+                    "event": "tool_call",
+                    "data": {
+                        "tool_call_id": f"{workflow_id}_{node}_{name}_{run_id}",  # 唯一工具调用ID
+                        "tool_name": name,  # 工具名称
+                        "tool_input": data.get("input"),  # 工具输入参数
+                    },
+                }
+            # 7. 工具调用结束事件
+            elif kind == "on_tool_end" and node in TEAM_MEMBERS:
+                # 客户端未订阅时不再展开和截断工具结果
+                if not wanted("tool_call_result"):
+                    continue
+                tool_result, truncated = _tool_result(
+                    data["output"].content if data.get("output") else "",
+                    tool_result_max_chars,
+                )
+                ydata = {
+                    "event": "tool_call_result",
+                    "data": {
+                        "tool_call_id": f"{workflow_id}_{node}_{name}_{run_id}",  # 唯一工具调用ID
+                        "tool_name": name,  # 工具名称
+                        "tool_result": tool_result,  # 工具执行结果（可能被截断）
+                        "truncated": truncated,  # 工具结果是否被截断
+                    },
+                }
+            # 8. 工具运行期间的部分输出事件
+            elif kind == "on_custom_event" and name == TOOL_PROGRESS_EVENT and node in TEAM_MEMBERS:
+                ydata = {
+                    "event": "tool_call_progress",
+                    "data": {
+                        "tool_call_id": f"{workflow_id}_{node}_{data['tool_name']}_{run_id}",  # 与tool_call事件相同的工具调用ID
+                        "tool_name": data["tool_name"],  # 工具名称
+                        "output": data["output"],  # 部分输出
+                    },
+                }
+            # 9. 预算耗尽事件（节点超时、迭代次数超限或检测到循环）
+            elif kind == "on_custom_event" and name == BUDGET_EXHAUSTED_EVENT:
+                ydata = {
+                    "event": "budget_exhausted",
+                    "data": data,  # 包含节点名称、原因和详情
+                }
+            else:
+                # 跳过不需要处理的事件
+                continue
             
-        # 生成事件数据
-        yield ydata
-
-    # 如果是切换到planner的情况，在工作流结束时发送最终事件
-    if is_handoff_case:
-        yield {
-            "event": "end_of_workflow",
-            "data": {
-                "workflow_id": workflow_id,  # 工作流ID
-                "messages": [
-                    # 将消息对象转换为字典格式
-                    convert_message_to_dict(msg)
-                    for msg in data["output"].get("messages", [])
-                ],
-            },
-        }
+            # 跳过客户端未订阅的事件类型
+            if not wanted(ydata["event"]):
+                continue
+
+            # 生成事件数据，消息增量可能先被合并
+            for out in coalescer.add(ydata):
+                yield out
+
+        # 发送尚未发送的合并帧
+        for frame in coalescer.flush():
+            yield frame
+
+        # 工作流被取消时通知客户端，不再发送最终状态
+        if token.cancelled:
+            status = "cancelled"
+            logger.info(f"Workflow {workflow_id} cancelled: {token.reason}")
+            if wanted("workflow_cancelled"):
+                yield {
+                    "event": "workflow_cancelled",
+                    "data": {"workflow_id": workflow_id, "reason": token.reason},
+                }
+            return
+
+        status = "completed"
+        # 如果是切换到planner的情况，在工作流结束时发送最终事件
+        if is_handoff_case and final_output is not None:
+            messages = final_output.get("messages", [])
+            extra = {"usage": observer.usage()}  # 模型调用次数和token用量
+            if profiler is not None:
+                # 先保存性能分析结果，客户端收到事件后即可下载
+                extra["profile_id"] = await asyncio.to_thread(profiler.finish, status)
+            if wanted("end_of_workflow") and compact_end_of_workflow:
+                # 只有精简事件的客户端需要从分页接口读取消息，此时才保存对话记录（大段内容仍是引用）；
+                # 序列化、写入共享存储和读取最终报告都可能阻塞，在线程中执行
+                await asyncio.to_thread(save_transcript, workflow_id, messages)
+                summary = await asyncio.to_thread(compact_summary, workflow_id, messages)
+                # 客户端已经通过流式事件收到了这些内容，只发送消息ID、最终报告和摘要
+                yield {
+                    "event": "end_of_workflow",
+                    "data": {**summary, **extra},
+                }
+            elif wanted("end_of_workflow"):
+                yield {
+                    "event": "end_of_workflow",
+                    "data": {
+                        "workflow_id": workflow_id,  # 工作流ID
+                        "messages": [
+                            # 将消息对象转换为字典格式
+                            # 展开内容存储中的引用，客户端收到的仍是完整内容
+                            convert_message_to_dict(msg)
+                            for msg in blob_store.materialize_messages(
+                                messages, max_chars=0
+                            )
+                        ],
+                        **extra,
+                    },
+                }
+    finally:
+        # 调用方在工作流结束前停止读取事件（例如客户端断开连接）时取消工作流，
+        # 使仍在运行的模型调用和工具不再继续消耗资源
+        if not producer.done():
+            token.cancel("abandoned")
+            producer.cancel()
+            status = "abandoned"
+        observer.finish(status)
+        if profiler is not None:
+            profiler.finish(status)
+        remove_callback()
+        unregister_workflow(workflow_id)
+        # 释放该工作流在Python REPL工作进程中的命名空间
+        get_repl_pool().release(workflow_id)
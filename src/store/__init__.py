@@ -0,0 +1,54 @@
+import importlib
+import threading
+from typing import Optional
+
+from src.config.cache import STATE_STORE, STATE_STORE_PATH
+from .base import StateStore
+from .sqlite import SQLiteStore
+
+# 共享的状态存储实例，首次使用时创建
+_store: Optional[StateStore] = None
+_store_created = False
+_store_lock = threading.Lock()
+
+
+def create_state_store(spec: str = STATE_STORE) -> Optional[StateStore]:
+    """Create the state store named by spec.
+
+    "memory" keeps state in each process and returns None, "sqlite" uses
+    STATE_STORE_PATH, and "package.module:ClassName" creates a custom store.
+    """
+    """
+    根据spec创建状态存储。
+
+    "memory"表示状态保存在各进程内存中，返回None；"sqlite"使用STATE_STORE_PATH中的数据库；
+    "包名.模块名:类名"创建自定义的存储。
+    """
+    if spec == "memory":
+        return None
+    if spec == "sqlite":
+        return SQLiteStore(STATE_STORE_PATH)
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown state store: {spec}")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def get_state_store() -> Optional[StateStore]:
+    """Return the shared state store, or None if state is kept per process."""
+    """返回共享的状态存储；状态保存在各进程内存中时返回None。"""
+    global _store, _store_created
+    if not _store_created:
+        with _store_lock:
+            if not _store_created:
+                _store = create_state_store()
+                _store_created = True
+    return _store
+
+
+__all__ = [
+    "StateStore",
+    "SQLiteStore",
+    "create_state_store",
+    "get_state_store",
+]
@@ -0,0 +1,84 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+class StateStore(ABC):
+    """Storage for state shared by the worker processes of one server.
+
+    Holds string values under (namespace, key) with an optional TTL, and
+    append-only logs of numbered events. Values are JSON-encoded by callers.
+    """
+    """
+    同一服务器的多个工作进程共享的状态存储。
+
+    以（命名空间, 键）保存字符串值，可以设置过期时间；另外保存按编号追加的事件日志。
+    值由调用方编码为JSON。
+    """
+
+    # 键值数据
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        """Return the value, or None if it is missing or expired."""
+        """返回值；不存在或已过期时返回None。"""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """Store a value that expires after ttl seconds (never if None)."""
+        """存储一个值，ttl秒后过期（为None时永不过期）。"""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> None:
+        """Remove a single entry if present."""
+        """删除指定条目（如果存在）。"""
+
+    @abstractmethod
+    def items(self, namespace: str) -> list[tuple[str, str]]:
+        """Return the (key, value) pairs of a namespace that have not expired."""
+        """返回命名空间中所有未过期的（键, 值）。"""
+
+    @abstractmethod
+    def count(self, namespace: str) -> int:
+        """Return the number of entries in a namespace that have not expired."""
+        """返回命名空间中未过期的条目数。"""
+
+    @abstractmethod
+    def trim(self, namespace: str, max_size: int) -> int:
+        """Remove expired entries and the oldest ones beyond max_size.
+
+        Returns:
+            The number of entries removed
+        """
+        """
+        删除已过期的条目，以及超出max_size的最早写入的条目。
+
+        返回:
+            删除的条目数
+        """
+
+    @abstractmethod
+    def clear(self, namespace: str) -> None:
+        """Remove all entries of a namespace."""
+        """删除命名空间中的所有条目。"""
+
+    # 事件日志
+
+    @abstractmethod
+    def append_events(self, stream: str, events: list[tuple[int, str]]) -> None:
+        """Append (event ID, event) pairs to a log; IDs must be increasing."""
+        """向事件日志追加（事件ID, 事件）；事件ID必须递增。"""
+
+    @abstractmethod
+    def read_events(self, stream: str, after: int = 0) -> list[tuple[int, str]]:
+        """Return the (event ID, event) pairs of a log after the given ID."""
+        """返回事件日志中ID大于after的（事件ID, 事件）。"""
+
+    @abstractmethod
+    def trim_events(self, stream: str, keep: int) -> None:
+        """Keep only the last keep events of a log."""
+        """只保留事件日志中最后keep个事件。"""
+
+    @abstractmethod
+    def delete_events(self, stream: str) -> None:
+        """Remove a log."""
+        """删除一个事件日志。"""
@@ -0,0 +1,143 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from .base import StateStore
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS kv_updated ON kv (namespace, updated_at);
+CREATE TABLE IF NOT EXISTS events (
+    stream TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (stream, id)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteStore(StateStore):
+    """State store in a local SQLite database shared by all workers on one machine.
+
+    The database runs in WAL mode, so readers in other processes do not block
+    the writer. Every thread uses its own connection.
+    """
+    """
+    保存在本机SQLite数据库中的状态存储，同一台机器上的所有工作进程共享。
+
+    数据库使用WAL模式，其他进程的读操作不会阻塞写操作。每个线程使用各自的连接。
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout  # 数据库被其他进程锁定时的最长等待时间（秒）
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+        logger.info(f"Using SQLite state store at {path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL模式下NORMAL同步级别足以保证数据库的一致性
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(namespace, key)
+            return None
+        return value
+
+    def set(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, value, None if ttl is None else now + ttl, now),
+            )
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items(self, namespace: str) -> list[tuple[str, str]]:
+        return self._connection().execute(
+            "SELECT key, value FROM kv WHERE namespace = ?"
+            " AND (expires_at IS NULL OR expires_at > ?) ORDER BY updated_at",
+            (namespace, time.time()),
+        ).fetchall()
+
+    def count(self, namespace: str) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM kv WHERE namespace = ?"
+            " AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time()),
+        ).fetchone()[0]
+
+    def trim(self, namespace: str, max_size: int) -> int:
+        with self._connection() as conn:
+            removed = conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND expires_at <= ?",
+                (namespace, time.time()),
+            ).rowcount
+            removed += conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key IN ("
+                " SELECT key FROM kv WHERE namespace = ?"
+                " ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (namespace, namespace, max_size),
+            ).rowcount
+        return removed
+
+    def clear(self, namespace: str) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM kv WHERE namespace = ?", (namespace,))
+
+    def append_events(self, stream: str, events: list[tuple[int, str]]) -> None:
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO events VALUES (?, ?, ?)",
+                [(stream, event_id, data) for event_id, data in events],
+            )
+
+    def read_events(self, stream: str, after: int = 0) -> list[tuple[int, str]]:
+        return self._connection().execute(
+            "SELECT id, data FROM events WHERE stream = ? AND id > ? ORDER BY id",
+            (stream, after),
+        ).fetchall()
+
+    def trim_events(self, stream: str, keep: int) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "DELETE FROM events WHERE stream = ? AND id <= "
+                "(SELECT MAX(id) FROM events WHERE stream = ?) - ?",
+                (stream, stream, keep),
+            )
+
+    def delete_events(self, stream: str) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM events WHERE stream = ?", (stream,))
@@ -1,44 +1,282 @@
+import asyncio
 import logging
-import subprocess
-from typing import Annotated
-from langchain_core.tools import tool
-from .decorators import log_io
+import os
+import signal
+import time
+from typing import Awaitable, Callable, ClassVar, Optional, Type
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, Field
+from .decorators import create_logged_tool
+from .progress import areport_progress, report_progress
+
+from src.config.tools import (
+    BASH_MAX_OUTPUT_BYTES,
+    BASH_PROGRESS_INTERVAL,
+    BASH_TIMEOUT,
+)
+from src.service.cancellation import (
+    CancellationToken,
+    WorkflowCancelledError,
+    get_cancellation_token,
+)
 
 # 初始化日志记录器
 logger = logging.getLogger(__name__)
 
+# 每次从管道读取的字节数
+READ_CHUNK_SIZE = 4096
+
+
+class OutputBuffer:
+    """Keeps the head and the tail of a stream within a byte budget."""
+    """在字节预算内保留输出流的头部和尾部。"""
+
+    def __init__(self, max_bytes: int):
+        self.head_limit = max_bytes // 2  # 头部最多保留的字节数
+        self.tail_limit = max_bytes - self.head_limit  # 尾部最多保留的字节数
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0  # 已接收的总字节数
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+        # 先填满头部，剩余部分进入尾部
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            # 只保留最后tail_limit个字节
+            if len(self.tail) > self.tail_limit:
+                del self.tail[: len(self.tail) - self.tail_limit]
+
+    def getvalue(self) -> str:
+        omitted = self.total - len(self.head) - len(self.tail)
+        if omitted <= 0:
+            return (self.head + self.tail).decode("utf-8", errors="replace")
+        return (
+            self.head.decode("utf-8", errors="replace")
+            + f"\n... [{omitted} bytes truncated] ...\n"
+            + self.tail.decode("utf-8", errors="replace")
+        )
+
+
+async def _read_stream(
+    stream: asyncio.StreamReader,
+    buffer: OutputBuffer,
+    on_output: Optional[Callable[[str], Awaitable[None] | None]] = None,
+    max_streamed_bytes: int = BASH_MAX_OUTPUT_BYTES,
+) -> None:
+    """Drain a pipe into the buffer, forwarding throttled partial output."""
+    """读取管道内容写入缓冲区，并按节流间隔转发部分输出。"""
+    pending = bytearray()  # 尚未转发的输出
+    streamed = 0  # 已转发的字节数，超过上限后不再转发
+    last_flush = time.monotonic()
+
+    async def flush() -> None:
+        nonlocal pending, streamed, last_flush
+        if on_output and pending and streamed < max_streamed_bytes:
+            chunk = bytes(pending[: max_streamed_bytes - streamed])
+            streamed += len(chunk)
+            result = on_output(chunk.decode("utf-8", errors="replace"))
+            if asyncio.iscoroutine(result):
+                await result
+        pending = bytearray()
+        last_flush = time.monotonic()
+
+    while True:
+        if pending:
+            # 有待转发的输出时最多等待到下一个转发时间点，避免输出停顿时迟迟不发送
+            remaining = BASH_PROGRESS_INTERVAL - (time.monotonic() - last_flush)
+            try:
+                data = await asyncio.wait_for(
+                    stream.read(READ_CHUNK_SIZE), max(remaining, 0)
+                )
+            except asyncio.TimeoutError:
+                await flush()
+                continue
+        else:
+            data = await stream.read(READ_CHUNK_SIZE)
+        if not data:
+            break
+        buffer.write(data)
+        if on_output:
+            pending += data
+            if time.monotonic() - last_flush >= BASH_PROGRESS_INTERVAL:
+                await flush()
+    await flush()
+
+
+def _kill(process: asyncio.subprocess.Process) -> None:
+    """Kill the shell and every process it started."""
+    """终止shell进程及其启动的所有子进程。"""
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def run_command(
+    cmd: str,
+    timeout: float = BASH_TIMEOUT,
+    max_output_bytes: int = BASH_MAX_OUTPUT_BYTES,
+    on_output: Optional[Callable[[str], Awaitable[None] | None]] = None,
+    cancellation: Optional[CancellationToken] = None,
+) -> str:
+    """Run a shell command with a deadline and capped output.
+
+    Args:
+        cmd: The shell command to run
+        timeout: Seconds before the command and its children are killed
+        max_output_bytes: Bytes of stdout and of stderr to keep (head and tail)
+        on_output: Called with partial stdout while the command runs
+        cancellation: Token of the workflow; cancelling it kills the command
+
+    Returns:
+        The stdout on success, otherwise an error description
+    """
+    """
+    在期限内运行shell命令，并限制输出大小。
 
-@tool  # 使用LangChain的工具装饰器，将函数注册为工具
-@log_io  # 使用自定义装饰器记录输入输出
-def bash_tool(
-    cmd: Annotated[str, "The bash command to be executed."],  # 使用Annotated提供参数说明
-):
-    """Use this to execute bash command and do necessary operations."""
-    """使用此工具执行Bash命令并完成必要的操作。"""
-    # 记录即将执行的命令
-    logger.info(f"Executing Bash Command: {cmd}")
+    参数:
+        cmd: 要执行的shell命令
+        timeout: 超过该秒数后终止命令及其子进程
+        max_output_bytes: 标准输出和标准错误各自保留的字节数（头部和尾部）
+        on_output: 命令运行期间，使用部分标准输出调用的回调函数
+        cancellation: 工作流的取消令牌，取消时终止命令
+
+    返回:
+        成功时返回标准输出，否则返回错误描述
+    """
+    process = await asyncio.create_subprocess_shell(
+        cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        # 在新的会话中启动，超时时可以终止整个进程组
+        start_new_session=os.name == "posix",
+    )
+    stdout = OutputBuffer(max_output_bytes)
+    stderr = OutputBuffer(max_output_bytes)
+    remove_callback = lambda: None
+    if cancellation is not None:
+        # 令牌在其他线程中被取消时，取消当前任务，从而终止命令
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        remove_callback = cancellation.on_cancel(
+            lambda: loop.call_soon_threadsafe(task.cancel)
+        )
     try:
-        # 执行命令并捕获输出
-        # shell=True：允许执行shell命令
-        # check=True：如果命令返回非零退出码，则抛出异常
-        # text=True：以文本模式处理输出（而非字节）
-        # capture_output=True：捕获标准输出和标准错误
-        result = subprocess.run(
-            cmd, shell=True, check=True, text=True, capture_output=True
+        await asyncio.wait_for(
+            asyncio.gather(
+                _read_stream(process.stdout, stdout, on_output, max_output_bytes),
+                _read_stream(process.stderr, stderr),
+                process.wait(),
+            ),
+            timeout,
         )
-        # 返回标准输出作为结果
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        # 如果命令执行失败，返回错误信息
-        # 包含退出码、标准输出和标准错误
-        error_message = f"Command failed with exit code {e.returncode}.\nStdout: {e.stdout}\nStderr: {e.stderr}"
+    except asyncio.TimeoutError:
+        _kill(process)
+        await process.wait()
+        error_message = f"Command timed out after {timeout:.0f}s.\nStdout: {stdout.getvalue()}\nStderr: {stderr.getvalue()}"
         logger.error(error_message)
         return error_message
-    except Exception as e:
-        # 捕获其他任何异常
-        error_message = f"Error executing command: {str(e)}"
+    except asyncio.CancelledError:
+        # 调用方取消时确保不留下孤儿进程，并回收进程避免产生僵尸进程
+        _kill(process)
+        await process.wait()
+        if cancellation is not None and cancellation.cancelled:
+            raise WorkflowCancelledError(
+                f"Command killed: workflow cancelled ({cancellation.reason})"
+            ) from None
+        raise
+    finally:
+        remove_callback()
+
+    if process.returncode != 0:
+        # 如果命令执行失败，返回错误信息
+        # 包含退出码、标准输出和标准错误
+        error_message = f"Command failed with exit code {process.returncode}.\nStdout: {stdout.getvalue()}\nStderr: {stderr.getvalue()}"
         logger.error(error_message)
         return error_message
+    # 返回标准输出作为结果
+    return stdout.getvalue()
+
+
+# 定义Bash工具的输入模型
+class BashInput(BaseModel):
+    """Input for BashTool."""
+    """Bash工具的输入模型。"""
+
+    cmd: str = Field(..., description="The bash command to be executed.")
+
+
+# 定义Bash工具类
+class BashTool(BaseTool):
+    # 工具名称，用于在系统中标识此工具
+    name: ClassVar[str] = "bash_tool"
+    # 参数模式，使用前面定义的输入模型
+    args_schema: Type[BaseModel] = BashInput
+    # 工具描述
+    description: ClassVar[str] = (
+        "Use this to execute bash command and do necessary operations."
+    )
+    # 在追踪数据中沿用原函数工具的名称
+    trace_name: ClassVar[str] = "bash_tool"
+
+    def _run(self, cmd: str) -> str:
+        """Run the command from a sync caller, in an event loop of its own."""
+        """在同步调用方中执行命令，使用独立的事件循环。"""
+        try:
+            return asyncio.run(
+                self._run_command(
+                    cmd, lambda output: report_progress("bash_tool", output)
+                )
+            )
+        except WorkflowCancelledError:
+            raise
+        except Exception as e:
+            # 捕获其他任何异常
+            error_message = f"Error executing command: {str(e)}"
+            logger.error(error_message)
+            return error_message
+
+    async def _arun(self, cmd: str) -> str:
+        """Run the command on the caller's event loop, without a worker thread."""
+        """在调用方的事件循环中执行命令，不占用工作线程。"""
+        try:
+            return await self._run_command(
+                cmd, lambda output: areport_progress("bash_tool", output)
+            )
+        except WorkflowCancelledError:
+            raise
+        except Exception as e:
+            error_message = f"Error executing command: {str(e)}"
+            logger.error(error_message)
+            return error_message
+
+    @staticmethod
+    async def _run_command(
+        cmd: str, on_output: Callable[[str], Awaitable[None] | None]
+    ) -> str:
+        # 记录即将执行的命令
+        logger.info(f"Executing Bash Command: {cmd}")
+        # 使用异步子进程执行命令，运行期间将部分输出作为进度事件发送
+        return await run_command(
+            cmd,
+            on_output=on_output,
+            # 工作流被取消时终止命令
+            cancellation=get_cancellation_token(),
+        )
+
+
+# 使用装饰器创建带日志记录功能的Bash工具
+BashTool = create_logged_tool(BashTool)
+# 实例化Bash工具
+bash_tool = BashTool()
 
 
 # 当直接运行此文件时执行测试代码
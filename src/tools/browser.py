@@ -1,22 +1,324 @@
 import asyncio
+import atexit
+import concurrent.futures
+import functools
+import logging
+import threading
 
 from pydantic import BaseModel, Field
-from typing import Optional, ClassVar, Type
+from typing import Awaitable, Callable, ClassVar, Optional, Type, TypeVar
 from langchain.tools import BaseTool
 from browser_use import AgentHistoryList, Browser, BrowserConfig
 from browser_use import Agent as BrowserAgent
+from browser_use.browser.context import BrowserContext
 from src.agents.llm import vl_llm
 from src.tools.decorators import create_logged_tool
+from src.tools.page_state import CompactBrowserAgent
+from src.service.cancellation import (
+    CancellationToken,
+    WorkflowCancelledError,
+    get_cancellation_token,
+)
 from src.config import CHROME_INSTANCE_PATH
+from src.config.tools import (
+    BROWSER_COMPACT_PAGE_STATE,
+    BROWSER_MAX_SESSIONS,
+    BROWSER_POOL_SIZE,
+    BROWSER_RECYCLE_AFTER,
+)
 
-# 保存全局浏览器实例
-expected_browser = None
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
 
-# 如果配置了Chrome实例路径，则使用指定的Chrome
-if CHROME_INSTANCE_PATH:
-    # 创建浏览器实例，使用指定的Chrome可执行文件路径
-    expected_browser = Browser(
-        config=BrowserConfig(chrome_instance_path=CHROME_INSTANCE_PATH)
+T = TypeVar("T")
+
+# 浏览器任务：接收浏览器实例和独立的浏览器上下文，返回任务结果
+BrowserTask = Callable[[Browser, BrowserContext], Awaitable[T]]
+
+# 关闭浏览器池时等待浏览器退出的最长时间（秒）
+SHUTDOWN_TIMEOUT = 30
+
+
+def create_browser() -> Browser:
+    """Create a browser, using the configured Chrome instance if there is one."""
+    """创建浏览器实例；如果配置了Chrome实例路径，则使用指定的Chrome。"""
+    if CHROME_INSTANCE_PATH:
+        return Browser(config=BrowserConfig(chrome_instance_path=CHROME_INSTANCE_PATH))
+    return Browser(config=BrowserConfig())
+
+
+class PooledBrowser:
+    """A browser in the pool and its usage counters."""
+    """浏览器池中的一个浏览器实例及其使用计数。"""
+
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.active = 0  # 正在使用该浏览器的任务数
+        self.tasks = 0  # 已经执行过的任务数
+        self.retiring = False  # 是否在当前任务结束后关闭
+
+    def is_healthy(self) -> bool:
+        """Whether the browser is still usable; not-yet-launched browsers count."""
+        """浏览器是否仍然可用；尚未启动的浏览器也视为可用。"""
+        playwright_browser = self.browser.playwright_browser
+        return playwright_browser is None or playwright_browser.is_connected()
+
+
+class BrowserPool:
+    """A pool of warm browsers that hands out isolated contexts.
+
+    Playwright objects are bound to the event loop that created them, so every
+    browser task runs on the pool's own event loop thread. Each task gets a new
+    browser context (cookies, storage and pages of its own) in a long-lived
+    browser, which is replaced when it disconnects or has run too many tasks.
+    """
+    """
+    常驻浏览器池，为每个任务分配独立的浏览器上下文。
+
+    Playwright对象与创建它们的事件循环绑定，因此所有浏览器任务都在浏览器池自己的
+    事件循环线程中运行。每个任务在常驻浏览器中获得一个新的浏览器上下文（拥有独立的
+    cookies、存储和页面）；浏览器断开连接或执行任务过多时会被替换。
+    """
+
+    def __init__(
+        self,
+        size: int = BROWSER_POOL_SIZE,
+        max_sessions: int = BROWSER_MAX_SESSIONS,
+        recycle_after: int = BROWSER_RECYCLE_AFTER,
+        browser_factory: Callable[[], Browser] = create_browser,
+    ):
+        self.size = max(1, size)
+        self.max_sessions = max(1, max_sessions)
+        self.recycle_after = recycle_after
+        self.browser_factory = browser_factory
+        self._browsers: list[PooledBrowser] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # 以下对象只在浏览器池的事件循环中使用
+        self._sessions: Optional[asyncio.Semaphore] = None
+        # 统计数据
+        self.launched = 0  # 创建过的浏览器数量
+        self.recycled = 0  # 因任务数达到上限而重建的次数
+        self.unhealthy = 0  # 因健康检查失败而替换的次数
+
+    def start(self, launch: bool = False) -> None:
+        """Start the pool's event loop thread. Safe to call more than once.
+
+        Args:
+            launch: Also launch the browsers now instead of on first use
+        """
+        """
+        启动浏览器池的事件循环线程，可以安全地重复调用。
+
+        参数:
+            launch: 是否立即启动浏览器，而不是在首次使用时启动
+        """
+        with self._lock:
+            if self._thread is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="browser-pool", daemon=True
+                )
+                self._thread.start()
+                asyncio.run_coroutine_threadsafe(
+                    self._init_loop_state(), self._loop
+                ).result()
+        if launch:
+            asyncio.run_coroutine_threadsafe(self._launch_all(), self._loop).result()
+
+    async def _init_loop_state(self) -> None:
+        self._sessions = asyncio.Semaphore(self.max_sessions)
+
+    async def _launch_all(self) -> None:
+        while len(self._browsers) < self.size:
+            self._browsers.append(self._new_browser())
+        results = await asyncio.gather(
+            *(pooled.browser.get_playwright_browser() for pooled in self._browsers),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to launch browser: {result}")
+        logger.info(f"Browser pool ready with {len(self._browsers)} browsers")
+
+    def _new_browser(self) -> PooledBrowser:
+        self.launched += 1
+        return PooledBrowser(self.browser_factory())
+
+    async def _acquire(self) -> PooledBrowser:
+        # 替换已经断开连接的浏览器
+        for pooled in list(self._browsers):
+            if pooled.active == 0 and not pooled.is_healthy():
+                logger.warning("Replacing a disconnected browser")
+                self.unhealthy += 1
+                await self._close(pooled)
+        available = [pooled for pooled in self._browsers if not pooled.retiring]
+        if len(available) < self.size:
+            pooled = self._new_browser()
+            self._browsers.append(pooled)
+        else:
+            # 新任务分配给当前任务数最少的浏览器
+            pooled = min(available, key=lambda p: p.active)
+        pooled.active += 1
+        return pooled
+
+    async def _release(self, pooled: PooledBrowser) -> None:
+        pooled.active -= 1
+        pooled.tasks += 1
+        if self.recycle_after and pooled.tasks >= self.recycle_after:
+            # 长时间运行的浏览器会累积内存，执行足够多的任务后重建
+            if not pooled.retiring:
+                pooled.retiring = True
+                self.recycled += 1
+        if pooled.active == 0 and (pooled.retiring or not pooled.is_healthy()):
+            await self._close(pooled)
+
+    async def _close(self, pooled: PooledBrowser) -> None:
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.debug(f"Failed to close browser: {e}")
+
+    async def _session(self, task: BrowserTask[T]) -> T:
+        async with self._sessions:
+            pooled = await self._acquire()
+            context = None
+            try:
+                # 每个任务使用新的浏览器上下文，任务之间不共享cookies和页面
+                context = await pooled.browser.new_context(
+                    pooled.browser.config.new_context_config
+                )
+                return await task(pooled.browser, context)
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception as e:
+                        logger.debug(f"Failed to close browser context: {e}")
+                await self._release(pooled)
+
+    def submit(self, task: BrowserTask[T]):
+        """Schedule a task on the pool's event loop and return its future."""
+        """将任务提交到浏览器池的事件循环中执行，并返回对应的future。"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._session(task), self._loop)
+
+    def run(
+        self, task: BrowserTask[T], cancellation: Optional[CancellationToken] = None
+    ) -> T:
+        """Run a task with a pooled browser and wait for its result.
+
+        Cancelling the token cancels the browser task, which closes its
+        browser context, and raises WorkflowCancelledError.
+        """
+        """
+        使用池中的浏览器执行任务，并等待其结果。
+
+        取消令牌会取消浏览器任务（同时关闭其浏览器上下文），并抛出WorkflowCancelledError。
+        """
+        future = self.submit(task)
+        if cancellation is None:
+            return future.result()
+        remove_callback = cancellation.on_cancel(future.cancel)
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            cancellation.check()
+            raise
+        finally:
+            remove_callback()
+
+    async def arun(self, task: BrowserTask[T]) -> T:
+        """Async version of run; cancelling it cancels the browser task."""
+        """run的异步版本；取消调用时也会取消浏览器任务。"""
+        return await asyncio.wrap_future(self.submit(task))
+
+    def stats(self) -> dict:
+        """Return the number of browsers, active sessions and replacements."""
+        """返回浏览器数量、活动任务数以及替换次数。"""
+        return {
+            "browsers": len(self._browsers),
+            "active_sessions": sum(pooled.active for pooled in self._browsers),
+            "max_sessions": self.max_sessions,
+            "launched": self.launched,
+            "recycled": self.recycled,
+            "unhealthy": self.unhealthy,
+        }
+
+    async def _close_all(self) -> None:
+        for pooled in list(self._browsers):
+            await self._close(pooled)
+
+    def shutdown(self) -> None:
+        """Close all browsers and stop the event loop thread."""
+        """关闭所有浏览器并停止事件循环线程。"""
+        with self._lock:
+            if self._thread is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close_all(), self._loop).result(
+                    SHUTDOWN_TIMEOUT
+                )
+            except Exception as e:
+                logger.debug(f"Failed to close browsers: {e}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(SHUTDOWN_TIMEOUT)
+            self._thread = None
+            self._loop = None
+
+
+# 进程内共享的浏览器池
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Return the shared browser pool, creating it on first use."""
+    """返回共享的浏览器池，首次使用时创建。"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool()
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+async def run_browser_agent(
+    instruction: str,
+    browser: Browser,
+    context: BrowserContext,
+    compact_page_state: bool = False,
+) -> str:
+    """Run a browser agent for the instruction in the given browser context.
+
+    With compact_page_state, screenshots and element lists are compressed
+    before they are sent to the vision model.
+    """
+    """
+    在给定的浏览器上下文中运行浏览器代理来完成指令。
+
+    compact_page_state为真时，截图和元素列表会先压缩再发送给视觉模型。
+    """
+    # 使用视觉语言模型(VL模型)以支持图像理解；传入的浏览器和上下文不会被代理关闭
+    agent_class = CompactBrowserAgent if compact_page_state else BrowserAgent
+    agent = agent_class(
+        task=instruction,
+        llm=vl_llm,
+        browser=browser,
+        browser_context=context,
+    )
+    result = await agent.run()
+    if compact_page_state:
+        logger.info(f"Browser page state usage: {agent.page_state.summary()}")
+    # 处理不同类型的结果并格式化返回
+    return (
+        str(result)  # 如果是简单类型，直接转为字符串
+        if not isinstance(result, AgentHistoryList)
+        else result.final_result()  # 如果是历史列表，返回最终结果
     )
 
 
@@ -39,36 +341,25 @@ class BrowserTool(BaseTool):
     description: ClassVar[str] = (
         "Use this tool to interact with web browsers. Input should be a natural language description of what you want to do with the browser, such as 'Go to google.com and search for browser-use', or 'Navigate to Reddit and find the top post about AI'."
     )
-
-    # 浏览器代理实例，用于执行实际的浏览操作
-    _agent: Optional[BrowserAgent] = None
+    # 是否压缩每一步发送给视觉模型的截图和页面元素
+    compact_page_state: bool = BROWSER_COMPACT_PAGE_STATE
 
     def _run(self, instruction: str) -> str:
         """Run the browser task synchronously."""
         """同步执行浏览器任务。"""
-        # 创建浏览器代理，使用视觉语言模型(VL模型)以支持图像理解
-        self._agent = BrowserAgent(
-            task=instruction,  # 设置任务指令
-            llm=vl_llm,        # 使用视觉语言模型
-            browser=expected_browser,  # 使用预先配置的浏览器实例
-        )
         try:
-            # 创建新的事件循环
-            loop = asyncio.new_event_loop()
-            # 设置当前线程的事件循环
-            asyncio.set_event_loop(loop)
-            try:
-                # 在事件循环中运行浏览器代理的异步任务
-                result = loop.run_until_complete(self._agent.run())
-                # 处理不同类型的结果并格式化返回
-                return (
-                    str(result)  # 如果是简单类型，直接转为字符串
-                    if not isinstance(result, AgentHistoryList)
-                    else result.final_result  # 如果是历史列表，返回最终结果
-                )
-            finally:
-                # 确保事件循环被关闭
-                loop.close()
+            # 在浏览器池的事件循环中执行，复用常驻的浏览器
+            return get_browser_pool().run(
+                functools.partial(
+                    run_browser_agent,
+                    instruction,
+                    compact_page_state=self.compact_page_state,
+                ),
+                # 工作流被取消时关闭本次任务的浏览器上下文
+                cancellation=get_cancellation_token(),
+            )
+        except WorkflowCancelledError:
+            raise
         except Exception as e:
             # 处理任何异常并返回错误信息
             return f"Error executing browser task: {str(e)}"
@@ -76,19 +367,13 @@ class BrowserTool(BaseTool):
     async def _arun(self, instruction: str) -> str:
         """Run the browser task asynchronously."""
         """异步执行浏览器任务。"""
-        # 创建浏览器代理
-        self._agent = BrowserAgent(
-            task=instruction,  # 设置任务指令
-            llm=vl_llm         # 使用视觉语言模型
-        )
         try:
-            # 直接异步运行浏览器代理
-            result = await self._agent.run()
-            # 处理不同类型的结果并格式化返回
-            return (
-                str(result)  # 如果是简单类型，直接转为字符串
-                if not isinstance(result, AgentHistoryList)
-                else result.final_result  # 如果是历史列表，返回最终结果
+            return await get_browser_pool().arun(
+                functools.partial(
+                    run_browser_agent,
+                    instruction,
+                    compact_page_state=self.compact_page_state,
+                )
             )
         except Exception as e:
             # 处理任何异常并返回错误信息
@@ -1,6 +1,20 @@
 import logging
 import functools
-from typing import Any, Callable, Type, TypeVar
+import inspect
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional, Type, TypeVar
+
+from langchain_core.tools import BaseTool
+
+from src.config.tools import (
+    TOOL_TRACE_BUFFER_SIZE,
+    TOOL_TRACE_PREVIEW_CHARS,
+    TOOL_TRACE_SAMPLE_RATE,
+)
 
 # 初始化日志记录器
 logger = logging.getLogger(__name__)
@@ -9,96 +23,303 @@ logger = logging.getLogger(__name__)
 T = TypeVar("T")
 
 
-def log_io(func: Callable) -> Callable:
+def _preview(value: Any, limit: int = TOOL_TRACE_PREVIEW_CHARS) -> str:
+    """Format a value for a log line, cut to `limit` characters."""
+    """将值格式化为日志文本，并截断到limit个字符。"""
+    text = value if isinstance(value, str) else str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+def approximate_size(value: Any) -> int:
+    """Estimate the serialized size of a value without serializing it."""
+    """在不序列化的情况下估算一个值序列化后的大小（字节）。"""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        # 按字符数估算，避免为了计算大小而编码整段文本
+        return len(value)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(
+            approximate_size(k) + approximate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set)):
+        return sum(approximate_size(item) for item in value)
+    if isinstance(value, (int, float, bool)):
+        return 8
+    return sys.getsizeof(value)
+
+
+class _LazyParams:
+    """Formats call arguments only if a log record is actually emitted."""
+    """仅在日志真正输出时才格式化调用参数。"""
+
+    __slots__ = ("args", "kwargs")
+
+    def __init__(self, args: tuple, kwargs: dict):
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        return ", ".join(
+            [
+                *(_preview(arg) for arg in self.args),
+                *(f"{k}={_preview(v)}" for k, v in self.kwargs.items()),
+            ]
+        )
+
+
+class _LazyPreview:
+    """Formats a result only if a log record is actually emitted."""
+    """仅在日志真正输出时才格式化返回结果。"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        return _preview(self.value)
+
+
+class ToolTracer:
+    """Records structured traces of tool calls.
+
+    Every call updates per-tool counters and durations. A sampled subset of
+    calls also has its input and output sizes measured and is kept in a
+    bounded ring buffer of recent calls.
+    """
     """
-    A decorator that logs the input parameters and output of a tool function.
+    记录工具调用的结构化追踪数据。
+
+    每次调用都会更新各工具的计数和耗时；按采样率选中的调用还会统计输入和输出的
+    大小，并保存在有界的最近调用环形缓冲区中。
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = TOOL_TRACE_BUFFER_SIZE,
+        sample_rate: float = TOOL_TRACE_SAMPLE_RATE,
+    ):
+        self.sample_rate = sample_rate  # 记录详细数据的调用比例，0到1之间
+        self._records: deque[dict] = deque(maxlen=buffer_size)
+        self._metrics: dict[str, dict] = {}  # 工具名称 -> 汇总数据
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        """Decide whether the next call is sampled."""
+        """决定下一次调用是否被采样。"""
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def record(
+        self,
+        tool: str,
+        duration: float,
+        sampled: bool,
+        args: tuple = (),
+        kwargs: Optional[dict] = None,
+        result: Any = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Record one finished tool call."""
+        """记录一次已结束的工具调用。"""
+        record = None
+        if sampled:
+            record = {
+                "tool": tool,
+                "timestamp": time.time(),
+                "duration": round(duration, 6),
+                "input_bytes": approximate_size(args) + approximate_size(kwargs),
+                "output_bytes": approximate_size(result),
+                "error": None if error is None else _preview(repr(error)),
+            }
+        with self._lock:
+            metrics = self._metrics.get(tool)
+            if metrics is None:
+                metrics = self._metrics[tool] = {
+                    "calls": 0,
+                    "errors": 0,
+                    "total_duration": 0.0,
+                    "max_duration": 0.0,
+                    "sampled": 0,
+                    "input_bytes": 0,
+                    "output_bytes": 0,
+                }
+            metrics["calls"] += 1
+            metrics["errors"] += error is not None
+            metrics["total_duration"] += duration
+            metrics["max_duration"] = max(metrics["max_duration"], duration)
+            if record is not None:
+                metrics["sampled"] += 1
+                metrics["input_bytes"] += record["input_bytes"]
+                metrics["output_bytes"] += record["output_bytes"]
+                self._records.append(record)
+
+    def recent(self, limit: Optional[int] = None, tool: Optional[str] = None) -> list[dict]:
+        """Return the most recent sampled calls, newest last."""
+        """返回最近被采样的调用，最新的在最后。"""
+        with self._lock:
+            records = [r for r in self._records if tool is None or r["tool"] == tool]
+        return records if limit is None else records[-limit:]
+
+    def stats(self) -> dict:
+        """Return per-tool call counts, error counts, durations and sizes."""
+        """返回各工具的调用次数、错误次数、耗时和数据大小。"""
+        with self._lock:
+            return {
+                tool: {
+                    **metrics,
+                    "avg_duration": metrics["total_duration"] / metrics["calls"],
+                    # 平均大小按被采样的调用计算
+                    "avg_input_bytes": metrics["input_bytes"] / metrics["sampled"]
+                    if metrics["sampled"]
+                    else 0,
+                    "avg_output_bytes": metrics["output_bytes"] / metrics["sampled"]
+                    if metrics["sampled"]
+                    else 0,
+                }
+                for tool, metrics in self._metrics.items()
+            }
+
+    def clear(self) -> None:
+        """Drop all records and counters."""
+        """清空所有记录和计数。"""
+        with self._lock:
+            self._records.clear()
+            self._metrics.clear()
+
+
+# 进程内共享的工具调用追踪器
+tool_tracer = ToolTracer()
+
+
+def _trace_call(tool: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+    """Call a sync tool function and record a trace of the call."""
+    """调用同步工具函数并记录追踪数据。"""
+    # 使用%格式的参数，只有在日志真正输出时才会格式化
+    logger.debug("Tool %s called with parameters: %s", tool, _LazyParams(args, kwargs))
+    sampled = tool_tracer.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    except BaseException as e:
+        tool_tracer.record(tool, time.perf_counter() - start, sampled, args, kwargs, error=e)
+        raise
+    tool_tracer.record(tool, time.perf_counter() - start, sampled, args, kwargs, result)
+    logger.debug("Tool %s returned: %s", tool, _LazyPreview(result))
+    return result
+
+
+async def _atrace_call(tool: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+    """Await an async tool function and record a trace of the call."""
+    """等待异步工具函数执行并记录追踪数据。"""
+    # 使用%格式的参数，只有在日志真正输出时才会格式化
+    logger.debug("Tool %s called with parameters: %s", tool, _LazyParams(args, kwargs))
+    sampled = tool_tracer.start()
+    start = time.perf_counter()
+    try:
+        result = await func(*args, **kwargs)
+    except BaseException as e:
+        tool_tracer.record(tool, time.perf_counter() - start, sampled, args, kwargs, error=e)
+        raise
+    tool_tracer.record(tool, time.perf_counter() - start, sampled, args, kwargs, result)
+    logger.debug("Tool %s returned: %s", tool, _LazyPreview(result))
+    return result
+
+
+def log_io(func: Optional[Callable] = None, *, name: Optional[str] = None) -> Callable:
+    """
+    A decorator that traces the calls of a tool function.
+
+    Arguments and results are only formatted when debug logging is enabled,
+    and then cut to a preview. Durations, sizes and errors are recorded in
+    the shared tool tracer. Both sync and async functions are supported.
 
     Args:
         func: The tool function to be decorated
+        name: Name of the tool in traces; defaults to the function name, so
+            the sync and async functions of one tool can share it
 
     Returns:
-        The wrapped function with input/output logging
+        The wrapped function with call tracing
     """
     """
-    一个装饰器，用于记录工具函数的输入参数和输出结果。
-    
+    一个装饰器，用于追踪工具函数的调用。
+
+    只有在启用调试日志时才会格式化参数和结果，并截断为预览文本；耗时、数据大小和
+    错误会记录到共享的工具调用追踪器中。同时支持同步和异步函数。
+
     参数:
         func: 要被装饰的工具函数
-        
+        name: 工具在追踪数据中的名称，默认为函数名；同一工具的同步和异步函数可以使用同一个名称
+
     返回:
-        带有输入/输出日志记录功能的包装函数
+        带有调用追踪功能的包装函数
     """
+    if func is None:
+        # 以log_io(name=...)的形式使用
+        return functools.partial(log_io, name=name)
+    func_name = name or func.__name__  # 获取函数名称
 
-    @functools.wraps(func)  # 保留原函数的元数据（如名称、文档字符串等）
-    def wrapper(*args: Any, **kwargs: Any) -> Any:
-        # 记录输入参数
-        func_name = func.__name__  # 获取函数名称
-        # 将所有参数格式化为字符串
-        params = ", ".join(
-            [*(str(arg) for arg in args), *(f"{k}={v}" for k, v in kwargs.items())]
-        )
-        # 记录调用信息
-        logger.debug(f"Tool {func_name} called with parameters: {params}")
+    if inspect.iscoroutinefunction(func):
 
-        # 执行原函数
-        result = func(*args, **kwargs)
+        @functools.wraps(func)  # 保留原函数的元数据（如名称、文档字符串等）
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            return await _atrace_call(func_name, func, args, kwargs)
 
-        # 记录输出结果
-        logger.debug(f"Tool {func_name} returned: {result}")
+        return async_wrapper
 
-        # 返回结果
-        return result
+    @functools.wraps(func)  # 保留原函数的元数据（如名称、文档字符串等）
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return _trace_call(func_name, func, args, kwargs)
 
     return wrapper
 
 
 class LoggedToolMixin:
-    """A mixin class that adds logging functionality to any tool."""
-    """一个混入类，为任何工具添加日志记录功能。"""
-
-    def _log_operation(self, method_name: str, *args: Any, **kwargs: Any) -> None:
-        """Helper method to log tool operations."""
-        """辅助方法，用于记录工具操作。"""
-        # 获取工具名称（移除"Logged"前缀，仅保留原始工具名）
-        tool_name = self.__class__.__name__.replace("Logged", "")
-        # 将所有参数格式化为字符串
-        params = ", ".join(
-            [*(str(arg) for arg in args), *(f"{k}={v}" for k, v in kwargs.items())]
+    """A mixin class that adds call tracing to any tool."""
+    """一个混入类，为任何工具添加调用追踪功能。"""
+
+    def _trace_name(self) -> str:
+        """Name of the tool in traces (its trace_name, or the original class name)."""
+        """工具在追踪数据中的名称（trace_name属性，或原始工具类名）。"""
+        return getattr(self, "trace_name", None) or self.__class__.__name__.replace(
+            "Logged", ""
         )
-        # 记录调用信息
-        logger.debug(f"Tool {tool_name}.{method_name} called with parameters: {params}")
 
     def _run(self, *args: Any, **kwargs: Any) -> Any:
-        """Override _run method to add logging."""
-        """重写_run方法以添加日志记录。"""
-        # 调用日志记录辅助方法
-        self._log_operation("_run", *args, **kwargs)
-        # 调用父类的_run方法执行实际操作
-        result = super()._run(*args, **kwargs)
-        # 记录返回结果
-        logger.debug(
-            f"Tool {self.__class__.__name__.replace('Logged', '')} returned: {result}"
-        )
-        # 返回结果
-        return result
+        """Override _run method to add tracing."""
+        """重写_run方法以添加调用追踪。"""
+        return _trace_call(self._trace_name(), super()._run, args, kwargs)
+
+    async def _arun(self, *args: Any, **kwargs: Any) -> Any:
+        """Override _arun method to add tracing."""
+        """重写_arun方法以添加调用追踪。"""
+        if super()._arun.__func__ is BaseTool._arun:
+            # 默认的_arun会在线程中调用_run，已经被追踪过，避免重复记录
+            return await super()._arun(*args, **kwargs)
+        return await _atrace_call(self._trace_name(), super()._arun, args, kwargs)
 
 
 def create_logged_tool(base_tool_class: Type[T]) -> Type[T]:
     """
-    Factory function to create a logged version of any tool class.
+    Factory function to create a traced version of any tool class.
 
     Args:
-        base_tool_class: The original tool class to be enhanced with logging
+        base_tool_class: The original tool class to be enhanced with tracing
 
     Returns:
         A new class that inherits from both LoggedToolMixin and the base tool class
     """
     """
-    工厂函数，用于创建任何工具类的带日志记录版本。
-    
+    工厂函数，用于创建任何工具类的带调用追踪版本。
+
     参数:
-        base_tool_class: 要增强日志功能的原始工具类
-        
+        base_tool_class: 要增强追踪功能的原始工具类
+
     返回:
         一个新类，继承自LoggedToolMixin和基础工具类
     """
@@ -0,0 +1,363 @@
+import base64
+import dataclasses
+import io
+import logging
+import math
+import re
+from typing import Optional
+
+from PIL import Image
+from browser_use import Agent as BrowserAgent
+from browser_use.agent.message_manager.service import MessageManager
+from browser_use.browser.views import BrowserState
+from browser_use.dom.views import DOMElementNode, DOMTextNode
+from langchain_core.messages import HumanMessage
+
+from src.config.tools import (
+    BROWSER_DOM_MAX_CHARS,
+    BROWSER_SCREENSHOT_HASH_DISTANCE,
+    BROWSER_SCREENSHOT_MAX_BYTES,
+    BROWSER_SCREENSHOT_MAX_WIDTH,
+)
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+# 精简摘要中每个元素文本和属性值保留的最大字符数
+DIGEST_TEXT_CHARS = 80
+DIGEST_ATTRIBUTE_CHARS = 40
+
+# 依次尝试的JPEG压缩质量
+JPEG_QUALITIES = (80, 65, 50, 35)
+
+# 截图宽度的下限，压缩到预算以内时不会缩得更小
+MIN_SCREENSHOT_WIDTH = 320
+
+# 感知哈希的边长，哈希共有HASH_SIZE * HASH_SIZE位
+HASH_SIZE = 16
+
+# 文本的估算字符数/令牌数比例，与browser_use的MessageManager保持一致
+CHARS_PER_TOKEN = 3
+
+# 截图未变化时附加在页面状态后的说明
+UNCHANGED_SCREENSHOT_NOTE = (
+    "\nScreenshot omitted: the page looks the same as in the previous step."
+)
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def _collapse(text: str, limit: int) -> str:
+    """Collapse whitespace and cut the text to `limit` characters."""
+    """合并空白字符，并将文本截断到limit个字符。"""
+    text = _WHITESPACE_PATTERN.sub(" ", text).strip()
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def perceptual_hash(image: Image.Image, size: int = HASH_SIZE) -> int:
+    """Compute a difference hash: similar-looking images get nearby hashes."""
+    """计算差异哈希（dHash）：看起来相似的图像得到的哈希值也相近。"""
+    small = image.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Estimate the tokens of an image with the tile formula of vision models."""
+    """按照视觉模型的分块计费方式估算图像的令牌数。"""
+    # 先缩放到2048x2048以内，再把短边缩放到768以内，最后按512像素分块
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def compress_screenshot(
+    image: Image.Image,
+    max_width: int = BROWSER_SCREENSHOT_MAX_WIDTH,
+    max_bytes: int = BROWSER_SCREENSHOT_MAX_BYTES,
+) -> tuple[bytes, Image.Image]:
+    """Downscale and JPEG-encode a screenshot to fit within a byte budget.
+
+    Returns:
+        The encoded bytes and the image that was encoded
+    """
+    """
+    缩小截图并编码为JPEG，使其大小不超过字节预算。
+
+    返回:
+        编码后的字节以及实际编码的图像
+    """
+    image = image.convert("RGB")
+    if image.width > max_width:
+        image = image.resize(
+            (max_width, round(image.height * max_width / image.width)),
+            Image.LANCZOS,
+        )
+    while True:
+        for quality in JPEG_QUALITIES:
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=quality, optimize=True)
+            if buffer.tell() <= max_bytes:
+                return buffer.getvalue(), image
+        if image.width <= MIN_SCREENSHOT_WIDTH:
+            # 已经足够小，接受超出预算的结果
+            return buffer.getvalue(), image
+        image = image.resize(
+            (round(image.width * 0.75), round(image.height * 0.75)), Image.LANCZOS
+        )
+
+
+def dom_digest(
+    element_tree: DOMElementNode,
+    include_attributes: list[str],
+    max_chars: int = BROWSER_DOM_MAX_CHARS,
+) -> str:
+    """Describe the page elements within about `max_chars` characters.
+
+    Small pages are described exactly as browser_use does. Larger pages keep
+    every interactive element, with shortened text and attributes, and as
+    much non-interactive context text as the budget allows.
+    """
+    """
+    在大约max_chars个字符内描述页面元素。
+
+    较小的页面使用与browser_use完全相同的描述；较大的页面保留所有可交互元素
+    （缩短其文本和属性），并在预算允许的范围内保留不可交互的上下文文本。
+    """
+    full = element_tree.clickable_elements_to_string(
+        include_attributes=include_attributes
+    )
+    if len(full) <= max_chars:
+        return full
+
+    # (是否为可交互元素, 行内容)
+    lines: list[tuple[bool, str]] = []
+
+    def visit(node) -> None:
+        if isinstance(node, DOMElementNode):
+            if node.highlight_index is not None:
+                text = _collapse(
+                    node.get_all_text_till_next_clickable_element(), DIGEST_TEXT_CHARS
+                )
+                attributes = "".join(
+                    f' {key}="{_collapse(value, DIGEST_ATTRIBUTE_CHARS)}"'
+                    for key, value in node.attributes.items()
+                    if key in include_attributes and value and value.strip() != text
+                )
+                lines.append(
+                    (
+                        True,
+                        f"{node.highlight_index}[:]<{node.tag_name}{attributes}>{text}</{node.tag_name}>",
+                    )
+                )
+            for child in node.children:
+                visit(child)
+        elif isinstance(node, DOMTextNode) and not node.has_parent_with_highlight_index():
+            text = _collapse(node.text, DIGEST_TEXT_CHARS)
+            # 跳过空白和与上一行重复的文本
+            if text and (not lines or lines[-1][1] != f"_[:]{text}"):
+                lines.append((False, f"_[:]{text}"))
+
+    visit(element_tree)
+
+    # 可交互元素全部保留，剩余预算按页面顺序分配给上下文文本
+    budget = max_chars - sum(len(line) + 1 for interactive, line in lines if interactive)
+    digest = []
+    for interactive, line in lines:
+        if not interactive:
+            if budget < len(line) + 1:
+                continue
+            budget -= len(line) + 1
+        digest.append(line)
+    return "\n".join(digest)
+
+
+class _Digest:
+    """Stands in for the element tree when the page state is rendered."""
+    """渲染页面状态时代替元素树，直接返回已生成的摘要。"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def clickable_elements_to_string(self, include_attributes: list[str] = []) -> str:
+        return self.text
+
+
+class PageStateEncoder:
+    """Shrinks the page state sent to the vision model on every browser step.
+
+    Screenshots are downscaled and compressed to a byte budget, and skipped
+    when the page looks unchanged since the last screenshot sent. Large
+    element lists are replaced by a compact digest. Per-step byte and token
+    counts, before and after, are kept in `steps`.
+    """
+    """
+    压缩浏览器代理每一步发送给视觉模型的页面状态。
+
+    截图会被缩小并压缩到字节预算以内，页面与上一次发送的截图相比看起来没有变化时
+    则不发送截图；较长的元素列表会被替换为精简摘要。每一步压缩前后的字节数和令牌数
+    记录在steps中。
+    """
+
+    def __init__(
+        self,
+        max_width: int = BROWSER_SCREENSHOT_MAX_WIDTH,
+        max_bytes: int = BROWSER_SCREENSHOT_MAX_BYTES,
+        hash_distance: int = BROWSER_SCREENSHOT_HASH_DISTANCE,
+        dom_max_chars: int = BROWSER_DOM_MAX_CHARS,
+    ):
+        self.max_width = max_width
+        self.max_bytes = max_bytes
+        self.hash_distance = hash_distance  # 负数表示从不跳过截图
+        self.dom_max_chars = dom_max_chars
+        self.steps: list[dict] = []  # 每一步的统计数据
+        self._last_hash: Optional[int] = None  # 上一次发送的截图的感知哈希
+        self._last_url: Optional[str] = None
+
+    def encode(
+        self, state: BrowserState, include_attributes: list[str]
+    ) -> tuple[BrowserState, dict]:
+        """Return the compact state and the statistics of this step so far."""
+        """返回压缩后的页面状态，以及该步骤目前的统计数据。"""
+        stats = {
+            "step": len(self.steps) + 1,
+            "original_image_bytes": 0,
+            "original_image_tokens": 0,
+            "image_bytes": 0,
+            "image_tokens": 0,
+            "screenshot_skipped": False,
+            "jpeg": False,  # 发送的截图是否已重新编码为JPEG
+        }
+        full = state.element_tree.clickable_elements_to_string(
+            include_attributes=include_attributes
+        )
+        digest = dom_digest(state.element_tree, include_attributes, self.dom_max_chars)
+        stats["original_dom_chars"] = len(full)
+        stats["dom_chars"] = len(digest)
+
+        screenshot = None
+        if state.screenshot:
+            raw = base64.b64decode(state.screenshot)
+            image = Image.open(io.BytesIO(raw))
+            stats["original_image_bytes"] = len(raw)
+            stats["original_image_tokens"] = estimate_image_tokens(*image.size)
+            image_hash = perceptual_hash(image)
+            if (
+                self.hash_distance >= 0
+                and self._last_hash is not None
+                and state.url == self._last_url
+                and bin(image_hash ^ self._last_hash).count("1") <= self.hash_distance
+            ):
+                stats["screenshot_skipped"] = True
+            else:
+                data, sent = compress_screenshot(image, self.max_width, self.max_bytes)
+                if image.width <= self.max_width and len(raw) <= min(
+                    len(data), self.max_bytes
+                ):
+                    # 原始截图已经足够小时直接发送
+                    data, sent = raw, image
+                    screenshot = state.screenshot
+                else:
+                    screenshot = base64.b64encode(data).decode("ascii")
+                    stats["jpeg"] = True
+                stats["image_bytes"] = len(data)
+                stats["image_tokens"] = estimate_image_tokens(*sent.size)
+                self._last_hash = image_hash
+                self._last_url = state.url
+
+        compact = dataclasses.replace(
+            state, element_tree=_Digest(digest), screenshot=screenshot
+        )
+        return compact, stats
+
+    def finish(self, message: HumanMessage, stats: dict) -> None:
+        """Fix up the rendered state message and record the step's statistics."""
+        """修正渲染后的页面状态消息，并记录该步骤的统计数据。"""
+        text_chars = 0
+        if isinstance(message.content, list):
+            for part in message.content:
+                if part.get("type") == "image_url" and stats["jpeg"]:
+                    # browser_use固定使用PNG的MIME类型，压缩后的截图是JPEG
+                    url = part["image_url"]["url"]
+                    part["image_url"]["url"] = url.replace(
+                        "data:image/png;", "data:image/jpeg;", 1
+                    )
+                elif part.get("type") == "text":
+                    text_chars = len(part["text"])
+        else:
+            if stats["screenshot_skipped"]:
+                message.content += UNCHANGED_SCREENSHOT_NOTE
+            text_chars = len(message.content)
+
+        original_text_chars = (
+            text_chars - stats["dom_chars"] + stats["original_dom_chars"]
+        )
+        stats["text_tokens"] = text_chars // CHARS_PER_TOKEN
+        stats["original_text_tokens"] = original_text_chars // CHARS_PER_TOKEN
+        stats["bytes"] = text_chars + stats["image_bytes"]
+        stats["original_bytes"] = original_text_chars + stats["original_image_bytes"]
+        stats["tokens"] = stats["text_tokens"] + stats["image_tokens"]
+        stats["original_tokens"] = (
+            stats["original_text_tokens"] + stats["original_image_tokens"]
+        )
+        self.steps.append(stats)
+        logger.info(
+            f"Browser step {stats['step']}: {stats['bytes']} bytes, "
+            f"~{stats['tokens']} tokens "
+            f"(uncompressed {stats['original_bytes']} bytes, "
+            f"~{stats['original_tokens']} tokens"
+            f"{', screenshot skipped' if stats['screenshot_skipped'] else ''})"
+        )
+
+    def summary(self) -> dict:
+        """Return the totals over all steps."""
+        """返回所有步骤的合计数据。"""
+        keys = ("bytes", "original_bytes", "tokens", "original_tokens")
+        totals = {key: sum(step[key] for step in self.steps) for key in keys}
+        totals["steps"] = len(self.steps)
+        totals["screenshots_skipped"] = sum(
+            step["screenshot_skipped"] for step in self.steps
+        )
+        return totals
+
+
+class CompactMessageManager(MessageManager):
+    """A MessageManager that sends the page state through a PageStateEncoder."""
+    """通过PageStateEncoder发送页面状态的MessageManager。"""
+
+    def __init__(self, *args, encoder: PageStateEncoder, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.encoder = encoder
+
+    def add_state_message(self, state, result=None, step_info=None) -> None:
+        compact, stats = self.encoder.encode(state, self.include_attributes)
+        super().add_state_message(compact, result, step_info)
+        self.encoder.finish(self.history.messages[-1].message, stats)
+
+
+class CompactBrowserAgent(BrowserAgent):
+    """A browser agent that sends compact page states to the model."""
+    """向模型发送压缩后页面状态的浏览器代理。"""
+
+    def __init__(self, *args, encoder: Optional[PageStateEncoder] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_state = encoder or PageStateEncoder()
+        self.message_manager = CompactMessageManager(
+            llm=self.llm,
+            task=self.task,
+            action_descriptions=self.controller.registry.get_prompt_description(),
+            system_prompt_class=self.system_prompt_class,
+            max_input_tokens=self.max_input_tokens,
+            include_attributes=self.include_attributes,
+            max_error_length=self.max_error_length,
+            max_actions_per_step=self.max_actions_per_step,
+            encoder=self.page_state,
+        )
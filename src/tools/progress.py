@@ -0,0 +1,32 @@
+import logging
+
+from langchain_core.callbacks import adispatch_custom_event, dispatch_custom_event
+
+# 初始化日志记录器
+logger = logging.getLogger(__name__)
+
+# 工具在运行过程中报告部分输出时使用的自定义事件名称
+TOOL_PROGRESS_EVENT = "tool_progress"
+
+
+def report_progress(tool_name: str, output: str) -> None:
+    """Publish partial output of a running tool to the workflow event stream."""
+    """将正在运行的工具的部分输出发布到工作流事件流中。"""
+    try:
+        dispatch_custom_event(
+            TOOL_PROGRESS_EVENT, {"tool_name": tool_name, "output": output}
+        )
+    except RuntimeError:
+        # 不在运行上下文中（例如直接调用工具函数）时无法分发事件
+        pass
+
+
+async def areport_progress(tool_name: str, output: str) -> None:
+    """Async version of report_progress."""
+    """report_progress的异步版本。"""
+    try:
+        await adispatch_custom_event(
+            TOOL_PROGRESS_EVENT, {"tool_name": tool_name, "output": output}
+        )
+    except RuntimeError:
+        pass
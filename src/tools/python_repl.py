@@ -1,22 +1,59 @@
+import asyncio
 import logging
 from typing import Annotated
-from langchain_core.tools import tool
-from langchain_experimental.utilities import PythonREPL
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
 from .decorators import log_io
 
-# 初始化Python代码执行环境和日志记录器
-# PythonREPL提供了一个读取-求值-打印循环环境，允许执行Python代码
-repl = PythonREPL()
+from src.repl import ReplSessionLostError, ReplTimeoutError, get_repl_pool
+from src.service.cancellation import WorkflowCancelledError, get_cancellation_token
+
 # 创建日志记录器实例
 logger = logging.getLogger(__name__)
 
+# 未提供工作流ID时使用的会话ID
+DEFAULT_SESSION_ID = "default"
+
+# 工具在工具调用、追踪数据和并发限制中的名称
+TOOL_NAME = "python_repl_tool"
+
+
+def get_session_id(config: RunnableConfig) -> str:
+    """Return the REPL session of the workflow the tool is running in."""
+    """返回工具所在工作流对应的REPL会话ID。"""
+    return (config or {}).get("configurable", {}).get("workflow_id", DEFAULT_SESSION_ID)
+
+
+def _success_message(code: str, result: str) -> str:
+    # 记录代码执行成功的信息
+    logger.info("Code execution successful")
+    # 格式化执行结果
+    # 包括原始代码和执行输出
+    return f"Successfully executed:\n```python\n{code}\n```\nStdout: {result}"
+
+
+def _error_message(e: BaseException) -> str:
+    if isinstance(e, ReplTimeoutError):
+        # 超时的工作进程已被重启，该工作流之前定义的变量也随之丢失
+        error_msg = f"Failed to execute. Error: {e}. Previously defined variables were lost."
+    elif isinstance(e, ReplSessionLostError):
+        # 代码没有执行，重新执行时需要重新定义之前的变量
+        error_msg = f"Failed to execute. Error: {e}. Run the code again, redefining what it needs."
+    else:
+        # 捕获所有可能的异常
+        error_msg = f"Failed to execute. Error: {repr(e)}"
+    # 记录错误日志
+    logger.error(error_msg)
+    # 返回错误信息
+    return error_msg
+
 
-@tool  # 使用LangChain的工具装饰器，将函数注册为工具
-@log_io  # 使用自定义装饰器记录输入输出
-def python_repl_tool(
+@log_io(name=TOOL_NAME)  # 使用自定义装饰器记录输入输出
+def _run_code(
     code: Annotated[
         str, "The python code to execute to do further analysis or calculation."
     ],  # 要执行的Python代码，使用Annotated提供参数说明
+    config: RunnableConfig,  # 由LangChain自动注入的运行配置，用于获取工作流ID
 ):
     """Use this to execute python code and do data analysis or calculation. If you want to see the output of a value,
     you should print it out with `print(...)`. This is visible to the user."""
@@ -27,18 +64,41 @@ def python_repl_tool(
     # 记录即将执行Python代码的信息
     logger.info("Executing Python code")
     try:
-        # 在REPL环境中执行代码
-        result = repl.run(code)
-        # 记录代码执行成功的信息
-        logger.info("Code execution successful")
+        # 在独立的工作进程中执行代码，同一工作流的多次执行共享同一个命名空间
+        # 工作流被取消时中断正在执行的代码
+        result = get_repl_pool().run(
+            get_session_id(config),
+            code,
+            cancellation=get_cancellation_token(config),
+        )
+    except WorkflowCancelledError:
+        raise
     except BaseException as e:
-        # 捕获所有可能的异常
-        error_msg = f"Failed to execute. Error: {repr(e)}"
-        # 记录错误日志
-        logger.error(error_msg)
-        # 返回错误信息
-        return error_msg
-    # 格式化执行结果
-    # 包括原始代码和执行输出
-    result_str = f"Successfully executed:\n```python\n{code}\n```\nStdout: {result}"
-    return result_str
+        return _error_message(e)
+    return _success_message(code, result)
+
+
+@log_io(name=TOOL_NAME)
+async def _arun_code(code: str, config: RunnableConfig):
+    """Execute python code like _run_code, without blocking the event loop."""
+    """与_run_code相同地执行Python代码，但不阻塞事件循环。"""
+    logger.info("Executing Python code")
+    try:
+        result = await get_repl_pool().arun(
+            get_session_id(config),
+            code,
+            cancellation=get_cancellation_token(config),
+        )
+    except (WorkflowCancelledError, asyncio.CancelledError):
+        raise
+    except BaseException as e:
+        return _error_message(e)
+    return _success_message(code, result)
+
+
+# 同步调用在当前线程中等待工作进程；异步调用（例如astream_events）在线程中等待，不阻塞事件循环
+python_repl_tool = StructuredTool.from_function(
+    func=_run_code,
+    coroutine=_arun_code,
+    name=TOOL_NAME,
+)
@@ -1,15 +1,202 @@
+import asyncio
+import functools
 import logging
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Annotated, Callable, Union
+
 from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_core.tools import tool
+
+from src.cache import make_cache
 from src.config import TAVILY_MAX_RESULTS
-from .decorators import create_logged_tool
+from src.config.tools import (
+    LOCAL_SEARCH_MIN_SCORE,
+    SEARCH_BACKEND,
+    SEARCH_CACHE_MAX_SIZE,
+    SEARCH_CACHE_TTL,
+    SEARCH_MAX_CONCURRENCY,
+)
+from src.crawler import get_local_index
+from .decorators import create_logged_tool, log_io
 
 # 初始化日志记录器
 logger = logging.getLogger(__name__)
 
+# 搜索结果：成功时为结果字典列表，失败时为错误信息字符串
+SearchResult = Union[list[dict], str]
+
 # 初始化带日志记录功能的Tavily搜索工具
 # Tavily是一个专为AI设计的搜索API，提供结构化的搜索结果
 # 使用create_logged_tool装饰器为TavilySearchResults添加日志记录功能
 LoggedTavilySearch = create_logged_tool(TavilySearchResults)
-# 实例化搜索工具，设置名称和最大结果数量
-# max_results参数从配置中获取，控制每次搜索返回的最大结果数
-tavily_tool = LoggedTavilySearch(name="tavily_search", max_results=TAVILY_MAX_RESULTS)
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so that equivalent queries share a cache entry."""
+    """规范化查询语句（小写并合并空白），使等价的查询共享同一缓存条目。"""
+    return _WHITESPACE_PATTERN.sub(" ", query.lower()).strip()
+
+
+class SearchLayer:
+    """Caches, deduplicates and parallelizes calls to a search backend.
+
+    Results are cached by normalized query with TTL and LRU eviction.
+    Concurrent identical queries share a single backend request, and
+    search_many runs several queries concurrently.
+    """
+    """
+    对搜索后端的调用进行缓存、去重和并发处理。
+
+    结果按规范化后的查询语句缓存，支持过期时间和LRU淘汰；并发的相同查询
+    共享同一次后端请求；search_many可以并发执行多个查询。
+    """
+
+    def __init__(
+        self,
+        backend: Callable[[str], SearchResult],
+        cache_size: int = SEARCH_CACHE_MAX_SIZE,
+        cache_ttl: float = SEARCH_CACHE_TTL,
+        max_concurrency: int = SEARCH_MAX_CONCURRENCY,
+    ):
+        self.backend = backend  # 实际执行搜索的函数
+        # 配置了共享状态存储时，各工作进程共享缓存的搜索结果
+        self.cache = make_cache("search_cache", max_size=cache_size, ttl=cache_ttl)
+        self._in_flight: dict[str, Future] = {}  # 正在进行中的查询
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="search"
+        )
+        # 统计数据
+        self.requests = 0  # 收到的查询总数
+        self.backend_calls = 0  # 实际调用后端的次数
+        self.deduplicated = 0  # 合并到进行中查询的次数
+
+    def search(self, query: str) -> SearchResult:
+        """Search for a query, using the cache and in-flight requests if possible."""
+        """执行查询，尽可能复用缓存结果和正在进行中的相同查询。"""
+        key = normalize_query(query)
+        with self._lock:
+            self.requests += 1
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                # 当前线程负责执行查询，其他相同查询等待该结果
+                future = Future()
+                self._in_flight[key] = future
+                self.backend_calls += 1
+            else:
+                self.deduplicated += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = self.backend(query)
+            # 只缓存非空的成功结果，错误信息和空结果不缓存
+            if isinstance(result, list) and result:
+                self.cache.set(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def search_many(self, queries: list[str]) -> list[SearchResult]:
+        """Run several queries concurrently and return results in order."""
+        """并发执行多个查询，并按输入顺序返回结果。"""
+        return list(self._executor.map(self.search, queries))
+
+    async def asearch(self, query: str) -> SearchResult:
+        """Async version of search."""
+        """search的异步版本。"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.search, query)
+
+    async def asearch_many(self, queries: list[str]) -> list[SearchResult]:
+        """Async version of search_many."""
+        """search_many的异步版本。"""
+        return await asyncio.gather(*(self.asearch(query) for query in queries))
+
+    def stats(self) -> dict:
+        """Return request counts and the cache hit rate."""
+        """返回请求计数和缓存命中率。"""
+        return {
+            **self.cache.stats(),
+            "requests": self.requests,
+            "backend_calls": self.backend_calls,
+            "deduplicated": self.deduplicated,
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def get_tavily_search() -> TavilySearchResults:
+    """Return the underlying Tavily tool, created on first use.
+
+    Creating it lazily lets the local backend run without a Tavily API key.
+    """
+    """
+    返回底层的Tavily搜索工具，首次使用时才创建。
+
+    延迟创建使本地搜索后端在没有Tavily API密钥时也能运行。
+    """
+    # max_results参数从配置中获取，控制每次搜索返回的最大结果数
+    return LoggedTavilySearch(name="tavily_search", max_results=TAVILY_MAX_RESULTS)
+
+
+def search_tavily(query: str) -> SearchResult:
+    """Search with Tavily."""
+    """使用Tavily进行搜索。"""
+    # 调用底层工具时不传递回调，避免在事件流中产生重复的工具调用事件
+    return get_tavily_search().invoke({"query": query}, {"callbacks": []})
+
+
+def search_local(query: str) -> SearchResult:
+    """Search the local index of crawled articles."""
+    """在已抓取文章的本地索引中进行搜索。"""
+    return get_local_index().search(query, max_results=TAVILY_MAX_RESULTS)
+
+
+def search_hybrid(query: str) -> SearchResult:
+    """Prefer good local results, otherwise Tavily, falling back to local ones."""
+    """优先使用足够好的本地结果，否则调用Tavily；Tavily失败时退回本地结果。"""
+    local_results = search_local(query)
+    if local_results and local_results[0]["score"] >= LOCAL_SEARCH_MIN_SCORE:
+        return local_results
+    results = search_tavily(query)
+    if isinstance(results, str) and local_results:
+        logger.warning(f"Tavily search failed, using local results: {results}")
+        return local_results
+    return results
+
+
+# 可选的搜索后端，通过SEARCH_BACKEND配置选择
+SEARCH_BACKENDS: dict[str, Callable[[str], SearchResult]] = {
+    "tavily": search_tavily,
+    "local": search_local,
+    "hybrid": search_hybrid,
+}
+
+# 共享的搜索层，所有工作流共用同一个缓存
+search_layer = SearchLayer(SEARCH_BACKENDS[SEARCH_BACKEND])
+
+
+@tool("tavily_search")  # 保持原有的工具名称
+@log_io  # 使用自定义装饰器记录输入输出
+def tavily_tool(
+    query: Annotated[str, "search query to look up"],
+) -> SearchResult:
+    """A search engine optimized for comprehensive, accurate, and trusted results. Useful for when you need to answer questions about current events. Input should be a search query."""
+    """针对全面、准确、可信结果优化的搜索引擎。适用于回答有关时事的问题。输入应为搜索查询语句。"""
+    return search_layer.search(query)
@@ -1,6 +1,10 @@
 import logging
+import time
+import uuid
 from src.config import TEAM_MEMBERS
-from src.graph import build_graph
+from src.config.workflow import WORKFLOW_TIMEOUT
+from src.graph import get_graph
+from src.repl import get_repl_pool
 
 # 配置日志系统
 # 设置日志级别为INFO，格式包含时间、模块名、日志级别和消息内容
@@ -20,10 +24,6 @@ def enable_debug_logging():
 # 获取当前模块的日志记录器
 logger = logging.getLogger(__name__)
 
-# 创建工作流图
-# 调用build_graph函数构建完整的智能体工作流图
-graph = build_graph()
-
 
 def run_agent_workflow(user_input: str, debug: bool = False):
     """Run the agent workflow with the given user input.
@@ -56,18 +56,27 @@ def run_agent_workflow(user_input: str, debug: bool = False):
     # 记录工作流开始的信息
     logger.info(f"Starting workflow with user input: {user_input}")
     
-    # 调用工作流图的invoke方法，传入初始状态
-    result = graph.invoke(
-        {
-            # 常量设置
-            "TEAM_MEMBERS": TEAM_MEMBERS,  # 团队成员列表，包含所有可用的智能体名称
-            
-            # 运行时变量
-            "messages": [{"role": "user", "content": user_input}],  # 初始化消息历史，包含用户输入
-            "deep_thinking_mode": True,  # 启用深度思考模式，使用更复杂的推理模型
-            "search_before_planning": True,  # 启用规划前搜索，为规划提供更多上下文信息
-        }
-    )
+    # 生成唯一的工作流ID，工具通过它区分不同工作流的会话
+    workflow_id = str(uuid.uuid4())
+
+    # 调用共享工作流图的invoke方法，传入初始状态
+    try:
+        result = get_graph().invoke(
+            {
+                # 常量设置
+                "TEAM_MEMBERS": TEAM_MEMBERS,  # 团队成员列表，包含所有可用的智能体名称
+
+                # 运行时变量
+                "messages": [{"role": "user", "content": user_input}],  # 初始化消息历史，包含用户输入
+                "deep_thinking_mode": True,  # 启用深度思考模式，使用更复杂的推理模型
+                "search_before_planning": True,  # 启用规划前搜索，为规划提供更多上下文信息
+                "workflow_deadline": time.time() + WORKFLOW_TIMEOUT,  # 工作流截止时间
+            },
+            config={"configurable": {"workflow_id": workflow_id}},
+        )
+    finally:
+        # 释放该工作流在Python REPL工作进程中的命名空间
+        get_repl_pool().release(workflow_id)
     
     # 以DEBUG级别记录工作流的最终状态
     logger.debug(f"Final workflow state: {result}")
@@ -80,4 +89,4 @@ def run_agent_workflow(user_input: str, debug: bool = False):
 # 如果直接运行此文件（而非作为模块导入）
 if __name__ == "__main__":
     # 输出工作流图的Mermaid格式图表，用于可视化工作流结构
-    print(graph.get_graph().draw_mermaid())
+    print(get_graph().get_graph().draw_mermaid())
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.agents.fake_llm import use_fake_llms
+from src.api.app import app
+from src.service.admission import (
+    AdmissionController,
+    AdmissionRejectedError,
+    admission_controller,
+    admitted,
+)
+from src.service.cancellation import CancellationToken
+from src.service.workflow_service import run_agent_workflow
+
+MESSAGES = [{"role": "user", "content": "admission check"}]
+
+
+def test_requests_queue_in_order_and_are_rejected_when_full():
+    """Test that requests beyond the limit queue up, then get rejected."""
+
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queued=2, retry_after=7)
+        first, second, third = (controller.enter() for _ in range(3))
+        with pytest.raises(AdmissionRejectedError) as rejected:
+            controller.enter()
+        assert rejected.value.retry_after == 7
+        assert (first.admitted, second.position, third.position) == (True, 1, 2)
+
+        second.release()  # 排队期间离开
+        assert third.position == 1
+        first.release()
+        assert third.admitted
+        first.release()  # 重复释放不影响计数
+        return controller.stats()
+
+    stats = asyncio.run(main())
+    assert stats["running"] == 1 and stats["queued"] == 0
+    assert (stats["admitted"], stats["rejected"], stats["abandoned"]) == (2, 1, 1)
+    assert stats["max_queue_depth"] == 2
+
+
+def test_queued_workflow_reports_position_then_runs():
+    """Test that a queued stream sends its position and runs once a slot frees up."""
+
+    async def run(controller):
+        ticket = controller.enter()
+        workflow = run_agent_workflow(MESSAGES, bypass_step_cache=True)
+        return [event["event"] async for event in admitted(ticket, workflow)]
+
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queued=1)
+        return controller, await asyncio.gather(run(controller), run(controller))
+
+    with use_fake_llms():
+        controller, (first, second) = asyncio.run(main())
+
+    assert "queue_position" not in first
+    assert second == ["queue_position", *first]
+    assert first[-1] == "end_of_workflow"
+    assert controller.stats()["running"] == 0
+    assert controller.stats()["wait_seconds"]["max"] > 0
+
+
+def test_cancelled_while_queued():
+    """Test that a workflow cancelled in the queue ends without running."""
+
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queued=1)
+        controller.enter()
+        token = CancellationToken()
+        workflow = run_agent_workflow(MESSAGES, cancellation=token)
+        events = []
+        async for event in admitted(controller.enter(), workflow, token):
+            events.append(event)
+            token.cancel("client_disconnected")
+        return controller, events
+
+    controller, events = asyncio.run(main())
+    assert [event["event"] for event in events] == ["queue_position", "workflow_cancelled"]
+    assert events[-1]["data"]["reason"] == "client_disconnected"
+    assert controller.stats()["queued"] == 0
+
+
+def test_full_queue_returns_429(monkeypatch):
+    """Test that requests beyond capacity get 429 with Retry-After."""
+    monkeypatch.setattr(admission_controller, "max_concurrent", 1)
+    monkeypatch.setattr(admission_controller, "max_queued", 0)
+    ticket = admission_controller.enter()
+    try:
+        client = TestClient(app)
+        request = {"messages": MESSAGES}
+        for path in ("/api/chat/stream", "/api/jobs"):
+            response = client.post(path, json=request)
+            assert response.status_code == 429
+            assert response.headers["Retry-After"] == str(admission_controller.retry_after)
+        assert client.get("/api/admission/stats").json()["rejected"] >= 2
+        metrics = client.get("/metrics").text
+        assert "# TYPE langmanus_admission_rejected_total counter" in metrics
+        rejected = next(
+            line for line in metrics.splitlines()
+            if line.startswith("langmanus_admission_rejected_total")
+        )
+        assert float(rejected.rsplit(" ", 1)[1]) >= 2
+    finally:
+        ticket.release()
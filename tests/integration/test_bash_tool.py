@@ -1,7 +1,9 @@
+import asyncio
+import os
+import threading
 import unittest
-import subprocess
 from unittest.mock import patch
-from src.tools.bash_tool import bash_tool
+from src.tools.bash_tool import bash_tool, run_command
 
 
 class TestBashTool(unittest.TestCase):
@@ -10,23 +12,17 @@ class TestBashTool(unittest.TestCase):
         result = bash_tool.invoke("echo 'Hello World'")
         self.assertEqual(result.strip(), "Hello World")
 
-    @patch("subprocess.run")
-    def test_command_with_error(self, mock_run):
+    def test_command_with_error(self):
         """Test bash tool when command fails"""
-        # Configure mock to raise CalledProcessError
-        mock_run.side_effect = subprocess.CalledProcessError(
-            returncode=1, cmd="invalid_command", output="", stderr="Command not found"
-        )
-
-        result = bash_tool.invoke("invalid_command")
+        result = bash_tool.invoke("echo 'Command not found' >&2; exit 1")
         self.assertIn("Command failed with exit code 1", result)
         self.assertIn("Command not found", result)
 
-    @patch("subprocess.run")
-    def test_command_with_exception(self, mock_run):
+    @patch("asyncio.create_subprocess_shell")
+    def test_command_with_exception(self, mock_create):
         """Test bash tool when an unexpected exception occurs"""
         # Configure mock to raise a generic exception
-        mock_run.side_effect = Exception("Unexpected error")
+        mock_create.side_effect = Exception("Unexpected error")
 
         result = bash_tool.invoke("some_command")
         self.assertIn("Error executing command: Unexpected error", result)
@@ -39,6 +35,66 @@ class TestBashTool(unittest.TestCase):
         )
         self.assertEqual(result.strip(), "test content")
 
+    def test_command_timeout(self):
+        """Test that a command is killed once its deadline passes"""
+        result = asyncio.run(run_command("echo started; sleep 10", timeout=0.5))
+        self.assertIn("Command timed out", result)
+        self.assertIn("started", result)
+
+    def test_output_is_capped(self):
+        """Test that only the head and tail of a large output are kept"""
+        result = asyncio.run(
+            run_command("seq 1 100000", max_output_bytes=100)
+        )
+        self.assertTrue(result.startswith("1\n2\n"))
+        self.assertTrue(result.rstrip().endswith("100000"))
+        self.assertIn("bytes truncated", result)
+
+    def test_partial_output_is_streamed(self):
+        """Test that partial stdout is reported while the command runs"""
+        chunks = []
+        asyncio.run(
+            run_command("echo first; sleep 1; echo second", on_output=chunks.append)
+        )
+        self.assertEqual("".join(chunks), "first\nsecond\n")
+        self.assertGreaterEqual(len(chunks), 2)
+
+    def test_async_invocation_runs_on_the_event_loop(self):
+        """Test that the async path awaits the subprocess without a worker thread"""
+        threads = []
+        real_run_command = run_command
+
+        async def tracked(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return await real_run_command(*args, **kwargs)
+
+        async def invoke():
+            with patch("src.tools.bash_tool.run_command", tracked):
+                return await bash_tool.ainvoke("echo async"), threading.get_ident()
+
+        result, loop_thread = asyncio.run(invoke())
+        self.assertEqual(result.strip(), "async")
+        self.assertEqual(threads, [loop_thread])
+
+    def test_cancelled_command_is_reaped(self):
+        """Test that cancelling a command kills and reaps its process"""
+        pids = []
+
+        async def cancel():
+            task = asyncio.create_task(
+                run_command("echo $$; sleep 10", on_output=pids.append)
+            )
+            while not pids:
+                await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # 取消返回时进程已被回收（僵尸进程仍然可以接收信号0）
+            with self.assertRaises(ProcessLookupError):
+                os.kill(int(pids[0]), 0)
+
+        asyncio.run(cancel())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+
+from src.agents.fake_llm import scripted_responder, use_fake_llms
+from src.api.app import app
+from src.service.batch import finished_ids, run_batch_file
+
+
+def with_usage(agent_name, messages, tools):
+    """Script whose reporter answers with token usage."""
+    message = scripted_responder(agent_name, messages, tools)
+    if agent_name == "reporter":
+        message = AIMessage(
+            content=message.content,
+            usage_metadata={"input_tokens": 100, "output_tokens": 20, "total_tokens": 120},
+        )
+    return message
+
+
+def read_results(path) -> list[dict]:
+    # 跳过中断时只写入了一部分的行
+    return [json.loads(line) for line in path.read_text().splitlines() if line.endswith("}")]
+
+
+def test_batch_file_resumes(tmp_path):
+    """Test that a batch writes a result per query and skips completed ones when rerun."""
+    queries = tmp_path / "queries.jsonl"
+    queries.write_text(
+        "\n".join(json.dumps({"id": f"q{i}", "query": f"batch query {i}"}) for i in range(3))
+        + "\n"
+        + json.dumps({"messages": [{"role": "user", "content": "batch query 3"}]})
+        + "\n"
+    )
+    output = tmp_path / "results.jsonl"
+    # 模拟中断：q0已完成，q1失败，最后一行只写入了一部分
+    output.write_text(
+        json.dumps({"id": "q0", "status": "completed"})
+        + "\n"
+        + json.dumps({"id": "q1", "status": "failed"})
+        + '\n{"id": "q2", "sta'
+    )
+
+    with use_fake_llms(responder=with_usage):
+        summary = asyncio.run(
+            run_batch_file(str(queries), str(output), concurrency=2, bypass_step_cache=True)
+        )
+
+    assert summary["total"] == 4
+    assert summary["skipped"] == 1
+    assert summary["completed"] == 3
+    assert summary["output_tokens"] == 60
+    results = read_results(output)
+    assert sorted(r["id"] for r in results[2:]) == ["4", "q1", "q2"]
+    for result in results[2:]:
+        assert result["status"] == "completed"
+        assert "# Report" in result["final_report"]
+        assert result["usage"]["input_tokens"] == 100
+        assert 0 < result["first_token_seconds"] <= result["latency_seconds"]
+    assert finished_ids(str(output)) == {"q0", "q1", "q2", "4"}
+
+
+def test_batch_endpoint_streams_results():
+    """Test that the batch endpoint streams one result per query and a summary."""
+    with use_fake_llms():
+        response = TestClient(app).post(
+            "/api/batch",
+            json={
+                "queries": [{"query": "first"}, {"id": "b", "query": "second"}],
+                "concurrency": 2,
+                "bypass_step_cache": True,
+            },
+        )
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["id"] for line in lines[:2]) == ["1", "b"]
+    assert all(line["status"] == "completed" for line in lines[:2])
+    assert lines[2]["summary"]["completed"] == 2
+
+    assert TestClient(app).post("/api/batch", json={"queries": [{}]}).status_code == 422
+    assert (
+        TestClient(app)
+        .post("/api/batch", json={"queries": [{"query": "x"}], "concurrency": 1000})
+        .status_code
+        == 422
+    )
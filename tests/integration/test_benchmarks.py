@@ -0,0 +1,40 @@
+import json
+
+from benchmarks import suite
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    """Test that only benchmarks slower than baseline by more than the tolerance are flagged."""
+    baseline = {
+        "results": {
+            "fast": {"value": 10.0, "unit": "ms"},
+            "slow": {"value": 10.0, "unit": "ms"},
+            "renamed_unit": {"value": 10.0, "unit": "ms"},
+        }
+    }
+    results = {
+        "results": {
+            "fast": {"value": 12.0, "unit": "ms"},
+            "slow": {"value": 13.0, "unit": "ms"},
+            "renamed_unit": {"value": 5000.0, "unit": "us"},
+            "new": {"value": 1.0, "unit": "ms"},
+        }
+    }
+    regressions = suite.compare(results, baseline, tolerance=0.25)
+    assert [(r["name"], r["ratio"]) for r in regressions] == [("slow", 1.3)]
+
+
+def test_suite_saves_and_checks_baseline(tmp_path):
+    """Test that a run against its own baseline passes and a faster baseline fails."""
+    baseline = tmp_path / "baseline.json"
+    args = ["--only", "prompt_template", "--baseline", str(baseline)]
+    # 没有基准线时运行失败，而不是只输出结果
+    assert suite.main(args) == 2
+    assert suite.main([*args, "--save-baseline"]) == 0
+    assert set(json.loads(baseline.read_text())["results"]) == {"prompt_template"}
+
+    assert suite.main([*args, "--tolerance", "10"]) == 0
+    saved = json.loads(baseline.read_text())
+    saved["results"]["prompt_template"]["value"] /= 100
+    baseline.write_text(json.dumps(saved))
+    assert suite.main(args) == 1
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+
+from browser_use.browser.browser import BrowserConfig
+
+from src.tools.browser import BrowserPool
+
+
+class FakePlaywrightBrowser:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.config = BrowserConfig()
+        self.playwright_browser = None
+        self.contexts = []
+        self.closed = False
+
+    async def get_playwright_browser(self):
+        if self.playwright_browser is None:
+            self.playwright_browser = FakePlaywrightBrowser()
+        return self.playwright_browser
+
+    async def new_context(self, config):
+        await self.get_playwright_browser()
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.closed = True
+        self.playwright_browser = None
+
+
+def make_pool(**kwargs):
+    browsers = []
+
+    def factory():
+        browser = FakeBrowser()
+        browsers.append(browser)
+        return browser
+
+    pool = BrowserPool(browser_factory=factory, **kwargs)
+    return pool, browsers
+
+
+async def echo(browser, context):
+    return browser, context
+
+
+def test_tasks_reuse_browser_with_isolated_contexts():
+    """Test that tasks share a warm browser but each get a closed context."""
+    pool, browsers = make_pool(size=1, max_sessions=2, recycle_after=0)
+    try:
+        pool.start(launch=True)
+        first_browser, first_context = pool.run(echo)
+        second_browser, second_context = pool.run(echo)
+        assert len(browsers) == 1
+        assert first_browser is second_browser
+        assert first_context is not second_context
+        assert first_context.closed and second_context.closed
+    finally:
+        pool.shutdown()
+    assert browsers[0].closed
+
+
+def test_browser_is_recycled_after_n_tasks():
+    """Test that a browser is closed and replaced after recycle_after tasks."""
+    pool, browsers = make_pool(size=1, max_sessions=1, recycle_after=2)
+    try:
+        for _ in range(3):
+            pool.run(echo)
+        assert len(browsers) == 2
+        assert browsers[0].closed and not browsers[1].closed
+        assert pool.stats()["recycled"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_disconnected_browser_is_replaced():
+    """Test that a browser failing its health check is not reused."""
+    pool, browsers = make_pool(size=1, max_sessions=1, recycle_after=0)
+    try:
+        pool.run(echo)
+        browsers[0].playwright_browser.connected = False
+        browser, _ = pool.run(echo)
+        assert browser is browsers[1]
+        assert pool.stats()["unhealthy"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_concurrent_sessions_are_limited():
+    """Test that no more than max_sessions tasks run at once."""
+    pool, _ = make_pool(size=2, max_sessions=2, recycle_after=0)
+    lock = threading.Lock()
+    running, peak = 0, 0
+
+    async def task(browser, context):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        with lock:
+            running -= 1
+
+    async def main():
+        await asyncio.gather(*(pool.arun(task) for _ in range(6)))
+
+    try:
+        asyncio.run(main())
+        assert peak == 2
+        assert pool.stats()["browsers"] == 2
+    finally:
+        pool.shutdown()
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from langgraph.graph import START, StateGraph
+from langgraph.types import Command
+
+from src.config.workflow import MAX_SUPERVISOR_ITERATIONS, NODE_TIMEOUTS
+from src.graph.budget import (
+    BUDGET_EXHAUSTED_EVENT,
+    check_supervisor_budget,
+    find_repeated_output,
+    with_deadline,
+)
+from src.graph.types import State
+from src.service.cancellation import get_cancellation_token
+
+# 阻塞的工具调用被取消时设置
+tool_stopped = threading.Event()
+
+
+@tool
+def blocking_tool(seconds: float) -> str:
+    """Block until the workflow is cancelled or the time is up."""
+    stopped = threading.Event()
+    get_cancellation_token().on_cancel(stopped.set)
+    # 阻塞期间不会触发任何回调，只有取消令牌能让它提前结束
+    if stopped.wait(seconds):
+        tool_stopped.set()
+    return "done"
+
+
+def slow_node(state):
+    """A node whose model call starts after the deadline has passed."""
+    FakeListChatModel(responses=["done"]).invoke("hello")
+    return Command(goto="__end__")
+
+
+def test_find_repeated_output():
+    """Test that a loop is reported only when the latest output repeats."""
+    messages = [
+        HumanMessage(content="query"),
+        HumanMessage(content="same", name="researcher"),
+        HumanMessage(content="other", name="coder"),
+        HumanMessage(content="same", name="researcher"),
+    ]
+    assert find_repeated_output(messages, threshold=2) == "researcher"
+    assert find_repeated_output(messages[:3], threshold=2) is None
+
+
+def test_supervisor_iteration_limit():
+    """Test that the supervisor stops delegating at the iteration limit."""
+    state = {"messages": [], "supervisor_iterations": MAX_SUPERVISOR_ITERATIONS}
+    reason, _ = check_supervisor_budget(state)
+    assert reason == "max_iterations"
+    assert check_supervisor_budget({"messages": [], "supervisor_iterations": 0}) is None
+
+
+def test_node_deadline_forces_reporter(monkeypatch):
+    """Test that an expired node deadline cancels the model call."""
+    monkeypatch.setitem(NODE_TIMEOUTS, "researcher", -1)
+    command = with_deadline("researcher", slow_node)({"messages": []})
+    assert command.goto == "reporter"
+    assert command.update["budget_exhausted"] == "node_timeout"
+
+
+def test_deadline_interrupts_blocking_call(monkeypatch):
+    """Test that a node returns at its deadline while a tool call is still blocked."""
+    monkeypatch.setitem(NODE_TIMEOUTS, "researcher", 0.3)
+    tool_stopped.clear()
+
+    def blocking_node(state):
+        blocking_tool.invoke({"seconds": 10})
+        return Command(goto="__end__")
+
+    start = time.perf_counter()
+    command = with_deadline("researcher", blocking_node)({"messages": []})
+    assert time.perf_counter() - start < 2
+    assert command.goto == "reporter"
+    assert command.update["budget_exhausted"] == "node_timeout"
+    # 期限到达时取消节点的令牌，阻塞的工具随之停止
+    assert tool_stopped.wait(2)
+
+
+def test_budget_event_is_streamed(monkeypatch):
+    """Test that budget exhaustion shows up in the event stream."""
+    monkeypatch.setitem(NODE_TIMEOUTS, "researcher", -1)
+    builder = StateGraph(State)
+    builder.add_edge(START, "researcher")
+    builder.add_node("researcher", with_deadline("researcher", slow_node))
+    builder.add_node("reporter", lambda state: Command(goto="__end__"))
+    graph = builder.compile()
+
+    async def collect():
+        return [
+            event
+            async for event in graph.astream_events(
+                {"messages": [HumanMessage(content="query")]}, version="v2"
+            )
+            if event["event"] == "on_custom_event"
+        ]
+
+    events = asyncio.run(collect())
+    assert [event["name"] for event in events] == [BUDGET_EXHAUSTED_EVENT]
+    assert events[0]["data"]["reason"] == "node_timeout"
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from src.agents.fake_llm import scripted_responder, use_fake_llms
+from src.api.app import watch_disconnect
+from src.repl import ReplPool
+from src.service.cancellation import CancellationToken, WorkflowCancelledError
+from src.service.workflow_service import run_agent_workflow
+
+
+def slow_command_responder(agent_name, messages, tools):
+    """Script where the coder runs a command that would take 30 seconds."""
+    if agent_name == "coder" and not any(isinstance(m, ToolMessage) for m in messages):
+        return AIMessage(
+            content="",
+            tool_calls=[{"name": "bash_tool", "args": {"cmd": "sleep 30"}, "id": "call_1"}],
+        )
+    return scripted_responder(agent_name, messages, tools)
+
+
+async def read_until_tool_call(workflow) -> list[dict]:
+    events = []
+    async for event in workflow:
+        events.append(event)
+        if event["event"] == "tool_call" and event["data"]["tool_name"] == "bash_tool":
+            return events
+    raise AssertionError("the workflow never called bash_tool")
+
+
+def test_cancel_stops_running_command_and_workflow():
+    """Test that cancelling a workflow kills its command and ends the stream."""
+    token = CancellationToken()
+
+    async def run():
+        workflow = run_agent_workflow(
+            [HumanMessage(content="slow task")], bypass_step_cache=True, cancellation=token
+        )
+        await read_until_tool_call(workflow)
+        start = time.perf_counter()
+        token.cancel("stopped by test")
+        rest = [event async for event in workflow]
+        return rest, time.perf_counter() - start
+
+    with use_fake_llms(responder=slow_command_responder):
+        rest, elapsed = asyncio.run(run())
+
+    assert elapsed < 5
+    assert rest[-1] == {
+        "event": "workflow_cancelled",
+        "data": {"workflow_id": rest[-1]["data"]["workflow_id"], "reason": "stopped by test"},
+    }
+    assert "end_of_workflow" not in [e["event"] for e in rest]
+
+
+def test_abandoned_stream_cancels_workflow():
+    """Test that closing the event stream early cancels the workflow."""
+    token = CancellationToken()
+    threads_before = threading.active_count()
+
+    async def run():
+        workflow = run_agent_workflow(
+            [HumanMessage(content="slow task")], bypass_step_cache=True, cancellation=token
+        )
+        await read_until_tool_call(workflow)
+        await workflow.aclose()
+
+    with use_fake_llms(responder=slow_command_responder):
+        asyncio.run(run())
+
+    assert token.cancelled and token.reason == "abandoned"
+    # 运行命令的工作线程很快结束，而不是等待命令执行完30秒
+    deadline = time.time() + 5
+    while threading.active_count() > threads_before and time.time() < deadline:
+        time.sleep(0.1)
+    assert threading.active_count() <= threads_before
+
+
+def test_repl_code_is_interrupted_without_losing_the_session():
+    """Test that cancelling interrupts running code but keeps the namespace."""
+    pool = ReplPool(size=1, preload_modules=[])
+    try:
+        pool.run("s", "x = 42")
+        token = CancellationToken()
+        threading.Timer(0.5, token.cancel).start()
+        start = time.perf_counter()
+        with pytest.raises(WorkflowCancelledError):
+            pool.run("s", "while True: pass", cancellation=token)
+        assert time.perf_counter() - start < 5
+        assert pool.run("s", "print(x)").strip() == "42"
+    finally:
+        pool.shutdown()
+
+
+def test_disconnect_is_detected_without_events():
+    """Test that the watcher cancels the workflow when the client goes away."""
+
+    class Request:
+        calls = 0
+
+        async def is_disconnected(self):
+            self.calls += 1
+            return self.calls >= 3
+
+    token = CancellationToken()
+    asyncio.run(watch_disconnect(Request(), token, interval=0.01))
+    assert token.reason == "client_disconnected"
@@ -0,0 +1,73 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+from src.agents.fake_llm import use_fake_llms
+from src.service.coalescing import DeltaCoalescer
+from src.service.workflow_service import run_agent_workflow
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def message(message_id, text, key="content"):
+    return {"event": "message", "data": {"message_id": message_id, "delta": {key: text}}}
+
+
+def test_frames_are_sent_by_size_and_keep_event_order():
+    """Test that deltas are batched per message and other events flush them."""
+    coalescer = DeltaCoalescer(interval=0, max_chars=5)
+    assert coalescer.add(message("a", "ab")) == []
+    assert coalescer.add(message("a", "cde")) == [message("a", "abcde")]
+    assert coalescer.add(message("a", "f")) == []
+    assert coalescer.add(message("b", "g")) == [message("a", "f")]
+    assert coalescer.add(message("b", "h", key="reasoning_content")) == [message("b", "g")]
+    end = {"event": "end_of_llm", "data": {"agent_name": "reporter"}}
+    assert coalescer.add(end) == [message("b", "h", key="reasoning_content"), end]
+    assert coalescer.flush() == []
+
+
+def test_frames_are_sent_by_age():
+    """Test that a frame is due once its first delta is older than the interval."""
+    clock = FakeClock()
+    coalescer = DeltaCoalescer(interval=0.1, max_chars=0, clock=clock)
+    assert coalescer.timeout() is None
+    coalescer.add(message("a", "x"))
+    clock.now = 0.04
+    assert coalescer.add(message("a", "y")) == []
+    assert abs(coalescer.timeout() - 0.06) < 1e-9
+    clock.now = 0.1
+    assert coalescer.add(message("a", "z")) == [message("a", "xyz")]
+
+
+def test_workflow_stream_is_coalesced():
+    """Test that coalescing sends fewer message events with the same text."""
+
+    async def collect(**kwargs):
+        return [
+            event
+            async for event in run_agent_workflow(
+                [HumanMessage(content="coalescing check")], bypass_step_cache=True, **kwargs
+            )
+        ]
+
+    with use_fake_llms(chunk_size=1):
+        plain = asyncio.run(collect())
+        batched = asyncio.run(collect(coalesce_ms=1000, coalesce_chars=64))
+
+    def messages(events):
+        return [e for e in events if e["event"] == "message"]
+
+    def text(events):
+        return "".join(e["data"]["delta"]["content"] for e in messages(events))
+
+    assert text(batched) == text(plain)
+    assert len(messages(batched)) * 10 < len(messages(plain))
+    assert [e["event"] for e in batched if e["event"] != "message"] == [
+        e["event"] for e in plain if e["event"] != "message"
+    ]
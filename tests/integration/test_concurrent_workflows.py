@@ -0,0 +1,82 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+from src.agents.fake_llm import use_fake_llms
+from src.service.workflow_service import run_agent_workflow
+
+
+async def collect_events(request: str) -> list[dict]:
+    events = []
+    async for event in run_agent_workflow(
+        [HumanMessage(content=request)], bypass_step_cache=True
+    ):
+        events.append(event)
+    return events
+
+
+def streamed_text(events: list[dict]) -> str:
+    return "".join(
+        e["data"]["delta"].get("content") or ""
+        for e in events
+        if e["event"] == "message"
+    )
+
+
+def check_handoff_stream(request: str, events: list[dict]):
+    kinds = [e["event"] for e in events]
+    assert kinds[0] == "start_of_agent"
+    assert kinds.count("start_of_workflow") == 1
+    assert kinds[-1] == "end_of_workflow"
+
+    workflow_id = events[kinds.index("start_of_workflow")]["data"]["workflow_id"]
+    assert events[-1]["data"]["workflow_id"] == workflow_id
+    assert {
+        e["data"]["agent_id"].split("_")[0]
+        for e in events
+        if e["event"] in ("start_of_agent", "end_of_agent")
+    } == {workflow_id}
+
+    # 协调者的切换指令不会发送给客户端
+    text = streamed_text(events)
+    assert "handoff" not in text
+    assert "Hi!" not in text
+    assert f"Findings about: {request}" in text
+
+    (result,) = [e for e in events if e["event"] == "tool_call_result"]
+    assert result["data"]["tool_result"].strip() == request
+    final_messages = events[-1]["data"]["messages"]
+    assert final_messages[0]["content"] == request
+    assert f'"title": "{request}"' in final_messages[1]["content"]
+    assert [m["content"].split(":")[0] for m in final_messages[2:]] == [
+        "Response from researcher",
+        "Response from coder",
+        "Response from reporter",
+    ]
+
+
+def check_direct_answer_stream(request: str, events: list[dict]):
+    kinds = [e["event"] for e in events]
+    assert "start_of_workflow" not in kinds
+    assert "end_of_workflow" not in kinds
+    assert streamed_text(events) == f"Hi! You said: {request}"
+
+
+def test_concurrent_workflows_have_separate_streams():
+    """Test that concurrent workflows in one process never mix their events."""
+    requests = [
+        f"hello from client {i}" if i % 3 == 0 else f"research topic {i}"
+        for i in range(30)
+    ]
+
+    async def run_all():
+        return await asyncio.gather(*(collect_events(r) for r in requests))
+
+    with use_fake_llms(latency=0.01):
+        streams = asyncio.run(run_all())
+
+    for request, events in zip(requests, streams):
+        if request.startswith("hello"):
+            check_direct_answer_stream(request, events)
+        else:
+            check_handoff_stream(request, events)
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+from sse_starlette.sse import AppStatus
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from src.agents.fake_llm import scripted_responder, use_fake_llms
+from src.api.app import app
+from src.api.sse import dumps, encode_event
+from src.service.workflow_service import run_agent_workflow
+
+
+def long_output_responder(agent_name, messages, tools):
+    """Script where the coder's command prints 6000 characters."""
+    if agent_name == "coder" and not any(isinstance(m, ToolMessage) for m in messages):
+        return AIMessage(
+            content="",
+            tool_calls=[
+                {
+                    "name": "bash_tool",
+                    "args": {"cmd": "yes x | head -c 12000 | tr -d '\\n'"},
+                    "id": "call_1",
+                }
+            ],
+        )
+    return scripted_responder(agent_name, messages, tools)
+
+
+def parse_frames(body: str) -> list[tuple[str, dict]]:
+    frames = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        frames.append((fields["event"], json.loads(fields["data"])))
+    return frames
+
+
+def test_encode_event():
+    """Test that events are encoded as single-line SSE frames."""
+    event = {"event": "message", "data": {"delta": {"content": "南京\n汤包"}}}
+    assert parse_frames(encode_event(event).decode()) == [(event["event"], event["data"])]
+    assert "南京".encode() in encode_event(event)
+    # orjson不支持的数据交给标准库处理
+    assert json.loads(dumps({1: "a"})) == {"1": "a"}
+
+
+def test_tool_results_are_truncated():
+    """Test that tool results are truncated unless the full result is requested."""
+
+    async def tool_results(max_chars):
+        return [
+            event["data"]
+            async for event in run_agent_workflow(
+                [HumanMessage(content="long output")],
+                bypass_step_cache=True,
+                event_types={"tool_call_result"},
+                tool_result_max_chars=max_chars,
+            )
+        ]
+
+    with use_fake_llms(responder=long_output_responder):
+        (short,) = asyncio.run(tool_results(100))
+        (full,) = asyncio.run(tool_results(0))
+
+    assert short["truncated"] and len(short["tool_result"]) < 200
+    assert not full["truncated"] and full["tool_result"] == "x" * 6000
+
+
+def test_stream_endpoint_sends_subscribed_events_only():
+    """Test that clients only receive the event types they subscribed to."""
+    # sse_starlette的退出事件绑定在创建它的事件循环上，每个TestClient使用新的事件循环
+    AppStatus.should_exit_event = None
+    client = TestClient(app)
+    request = {
+        "messages": [{"role": "user", "content": "dashboard"}],
+        "bypass_step_cache": True,
+        "events": ["start_of_agent", "end_of_agent"],
+    }
+    with use_fake_llms():
+        response = client.post("/api/chat/stream", json=request)
+    frames = parse_frames(response.text)
+    assert {event for event, _ in frames} == {"start_of_agent", "end_of_agent"}
+    assert [data["agent_name"] for event, data in frames if event == "start_of_agent"] == [
+        "coordinator",
+        "planner",
+        "researcher",
+        "coder",
+        "reporter",
+    ]
+
+    response = client.post("/api/chat/stream", json={**request, "events": ["messages"]})
+    assert response.status_code == 422
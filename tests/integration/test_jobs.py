@@ -0,0 +1,103 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from sse_starlette.sse import AppStatus
+
+from src.agents.fake_llm import use_fake_llms
+from src.api.app import app
+from src.service.jobs import JobManager
+
+MESSAGES = [{"role": "user", "content": "background job"}]
+
+
+async def collect(job, last_event_id=0):
+    return [item async for item in job.events(last_event_id)]
+
+
+def test_reconnecting_client_receives_missed_events_only():
+    """Test that events are numbered and can be replayed from any event ID."""
+
+    async def main():
+        manager = JobManager()
+        job = await manager.submit(MESSAGES, bypass_step_cache=True)
+        first = await collect(job)
+        resumed = await collect(job, last_event_id=5)
+        return job, first, resumed
+
+    with use_fake_llms():
+        job, first, resumed = asyncio.run(main())
+
+    assert job.status == "completed"
+    assert [event_id for event_id, _ in first] == list(range(1, job.last_event_id + 1))
+    assert first[-1][1]["event"] == "end_of_workflow"
+    assert job.result == first[-1][1]["data"]
+    assert resumed == first[5:]
+
+
+def test_replay_buffer_is_bounded():
+    """Test that only the most recent events are kept for replay."""
+
+    async def main():
+        manager = JobManager(buffer_size=5)
+        job = await manager.submit(MESSAGES, bypass_step_cache=True)
+        await job._task
+        return job, await collect(job)
+
+    with use_fake_llms():
+        job, replayed = asyncio.run(main())
+
+    assert job.last_event_id > 5
+    assert [event_id for event_id, _ in replayed] == list(
+        range(job.last_event_id - 4, job.last_event_id + 1)
+    )
+
+
+def test_cancel_job():
+    """Test that a cancelled job ends with a workflow_cancelled event."""
+
+    async def main():
+        manager = JobManager()
+        job = await manager.submit(MESSAGES, bypass_step_cache=True)
+        events = []
+        async for _, event in job.events():
+            events.append(event)
+            if event["event"] == "start_of_agent":
+                assert await manager.cancel(job.id)
+        assert not await manager.cancel(job.id)
+        return job, events
+
+    with use_fake_llms(latency=0.2):
+        job, events = asyncio.run(main())
+
+    assert job.status == "cancelled"
+    assert events[-1]["event"] == "workflow_cancelled"
+    assert events[-1]["data"]["reason"] == "cancelled"
+
+
+def test_job_endpoints():
+    """Test submitting, polling, streaming with Last-Event-ID and listing jobs."""
+    # sse_starlette的退出事件绑定在创建它的事件循环上，每个TestClient使用新的事件循环
+    AppStatus.should_exit_event = None
+    request = {"messages": MESSAGES, "bypass_step_cache": True}
+    with use_fake_llms(), TestClient(app) as client:
+        response = client.post("/api/jobs", json=request)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        stream = client.get(
+            f"/api/jobs/{job_id}/stream", headers={"Last-Event-ID": "3"}
+        ).text
+        ids = [
+            int(line.removeprefix("id: "))
+            for line in stream.splitlines()
+            if line.startswith("id: ")
+        ]
+        job = client.get(f"/api/jobs/{job_id}", params={"after": 3}).json()
+        assert job["status"] == "completed"
+        assert ids == list(range(4, job["last_event_id"] + 1))
+        assert [event["id"] for event in job["events"]] == ids
+        assert job["result"]["messages"]
+
+        assert job_id in [job["job_id"] for job in client.get("/api/jobs").json()["jobs"]]
+        assert client.post(f"/api/jobs/{job_id}/cancel").json()["cancelled"] is False
+        assert client.get("/api/jobs/unknown").status_code == 404
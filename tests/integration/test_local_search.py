@@ -0,0 +1,107 @@
+import pytest
+
+from src.crawler import Article, LocalSearchIndex, crawler, local_index
+from src.crawler.local_index import tokenize
+from src.tools import search
+
+
+def make_article(url: str, title: str, html: str) -> Article:
+    article = Article(title=title, html_content=html)
+    article.url = url
+    return article
+
+
+def test_tokenize_splits_cjk_into_bigrams():
+    """Test that CJK text is indexed as character bigrams."""
+    assert tokenize("南京汤包 MCP") == ["南", "南京", "京汤", "汤包", "mcp"]
+
+
+def test_search_ranks_matching_articles():
+    """Test that results are ranked by BM25 and have the Tavily shape."""
+    index = LocalSearchIndex()
+    index.add_article(
+        make_article("https://a", "MCP", "<p>The model context protocol MCP.</p>")
+    )
+    index.add_article(
+        make_article("https://b", "Soup", "<p>Dumplings from Nanjing.</p>")
+    )
+    results = index.search("what is the model context protocol")
+    assert [result["url"] for result in results] == ["https://a"]
+    assert set(results[0]) == {"title", "url", "content", "score"}
+
+
+def test_recrawl_replaces_article(tmp_path):
+    """Test that re-crawling a URL replaces it and the corpus persists."""
+    path = str(tmp_path / "corpus.jsonl")
+    index = LocalSearchIndex(path=path)
+    index.add_article(make_article("https://a", "Old", "<p>alpha</p>"))
+    index.add_article(make_article("https://a", "New", "<p>beta</p>"))
+    assert index.search("alpha") == []
+
+    reloaded = LocalSearchIndex(path=path)
+    assert len(reloaded) == 1
+    assert reloaded.search("beta")[0]["title"] == "New"
+
+
+def test_corpus_file_is_compacted(tmp_path, monkeypatch):
+    """Test that replaced and evicted articles do not make the corpus file grow forever."""
+    monkeypatch.setattr(local_index, "COMPACT_MIN_STALE", 0)
+    path = tmp_path / "corpus.jsonl"
+    index = LocalSearchIndex(path=str(path), max_articles=3)
+    for i in range(20):
+        index.add_article(make_article("https://same", f"Version {i}", f"<p>text {i}</p>"))
+    for i in range(20):
+        index.add_article(make_article(f"https://{i}", "Other", f"<p>other {i}</p>"))
+    # 过期记录不多于当前文章数
+    assert len(path.read_text().splitlines()) <= 2 * len(index)
+
+    reloaded = LocalSearchIndex(path=str(path), max_articles=3)
+    assert len(reloaded) == 3
+    assert reloaded.search("other 19")[0]["url"] == "https://19"
+
+
+def test_compaction_keeps_articles_of_other_workers(tmp_path, monkeypatch):
+    """Test that compacting a shared corpus file keeps the articles other workers added."""
+    monkeypatch.setattr(local_index, "COMPACT_MIN_STALE", 0)
+    path = tmp_path / "corpus.jsonl"
+    first = LocalSearchIndex(path=str(path))
+    second = LocalSearchIndex(path=str(path))
+    second.add_article(make_article("https://other", "Other", "<p>other worker</p>"))
+    for i in range(5):
+        first.add_article(make_article("https://same", f"Version {i}", f"<p>text {i}</p>"))
+
+    assert len(path.read_text().splitlines()) == 2
+    assert not list(tmp_path.glob("*.tmp"))
+    reloaded = LocalSearchIndex(path=str(path))
+    assert reloaded.search("other worker")[0]["url"] == "https://other"
+    assert reloaded.search("text")[0]["title"] == "Version 4"
+
+
+def test_hybrid_falls_back_to_local_results(monkeypatch):
+    """Test that hybrid search uses local results when Tavily fails."""
+    local_results = [{"title": "t", "url": "u", "content": "c", "score": 0.1}]
+    monkeypatch.setattr(search, "search_local", lambda query: local_results)
+    monkeypatch.setattr(search, "search_tavily", lambda query: "ConnectionError()")
+    assert search.search_hybrid("query") == local_results
+
+
+class FakeJinaClient:
+    def crawl(self, url, return_format="html"):
+        return "<p>crawled page</p>"
+
+
+class FakeExtractor:
+    def extract_article(self, html):
+        return Article(title="Crawled", html_content=html)
+
+
+@pytest.mark.parametrize("backend, indexed", [("tavily", 0), ("local", 1), ("hybrid", 1)])
+def test_crawler_indexes_only_for_local_backends(monkeypatch, backend, indexed):
+    """Test that crawled articles are indexed only when a local backend is configured."""
+    index = LocalSearchIndex()
+    monkeypatch.setattr(crawler, "SEARCH_BACKEND", backend)
+    monkeypatch.setattr(crawler, "get_local_index", lambda: index)
+    monkeypatch.setattr(crawler, "JinaClient", FakeJinaClient)
+    monkeypatch.setattr(crawler, "ReadabilityExtractor", FakeExtractor)
+    crawler.Crawler().crawl("https://crawled")
+    assert len(index) == indexed
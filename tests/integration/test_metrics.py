@@ -0,0 +1,161 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.graph import START, MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode
+
+from src.agents.fake_llm import scripted_responder, use_fake_llms
+from src.api.app import app
+from src.service.metrics import (
+    METRICS_NAMESPACE,
+    WORKER_ID,
+    LLM_DURATION,
+    LLM_TOKENS,
+    LLM_TTFT,
+    NODE_DURATION,
+    TOOL_CALLS,
+    TOOL_DURATION,
+    WORKFLOWS,
+    MetricsRegistry,
+    WorkflowObserver,
+    collect_metrics,
+)
+from src.service.workflow_service import run_agent_workflow
+from src.store import SQLiteStore
+
+
+def test_render_prometheus_text():
+    """Test the text format of counters, histograms and gauges."""
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls", ["tool"])
+    latency = registry.histogram("latency_seconds", "Latency", ["tool"], buckets=(0.1, 1))
+    registry.gauge("queued", "Queued", lambda: 3)
+    calls.inc(tool='say "hi"')
+    latency.observe(0.1, tool="bash")
+    latency.observe(5, tool="bash")
+
+    assert registry.render().splitlines() == [
+        "# HELP calls_total Calls",
+        "# TYPE calls_total counter",
+        'calls_total{tool="say \\"hi\\""} 1',
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{tool="bash",le="0.1"} 1',
+        'latency_seconds_bucket{tool="bash",le="1"} 1',
+        'latency_seconds_bucket{tool="bash",le="+Inf"} 2',
+        'latency_seconds_sum{tool="bash"} 5.1',
+        'latency_seconds_count{tool="bash"} 2',
+        "# HELP queued Queued",
+        "# TYPE queued gauge",
+        "queued 3",
+    ]
+
+
+def test_metrics_are_collected_from_every_worker(tmp_path, monkeypatch):
+    """Test that /metrics merges the snapshots workers publish to the shared store."""
+    store = SQLiteStore(str(tmp_path / "state.db"))
+    other = MetricsRegistry()
+    other.gauge("langmanus_workflows_running", "Workflows holding a slot", lambda: 2)
+    store.set(METRICS_NAMESPACE, "other", json.dumps(other.snapshot("other")))
+    monkeypatch.setattr("src.api.app.get_state_store", lambda: store)
+
+    lines = TestClient(app).get("/metrics").text.splitlines()
+    assert lines.count("# HELP langmanus_workflows_running Workflows holding a slot") == 1
+    assert 'langmanus_workflows_running{worker="other"} 2' in lines
+    assert f'langmanus_workflows_running{{worker="{WORKER_ID}"}} 0' in lines
+    # 本工作进程的快照也已写入存储
+    assert {key for key, _ in store.items(METRICS_NAMESPACE)} == {"other", WORKER_ID}
+    # 没有共享存储时只输出本进程的指标，不带worker标签
+    assert 'langmanus_workflows_running 0' in collect_metrics(None).splitlines()
+
+
+def with_usage(agent_name, messages, tools):
+    """Script whose reporter answers with token usage."""
+    message = scripted_responder(agent_name, messages, tools)
+    if agent_name == "reporter":
+        message = AIMessage(
+            content=message.content,
+            usage_metadata={"input_tokens": 100, "output_tokens": 20, "total_tokens": 120},
+        )
+    return message
+
+
+def test_workflow_feeds_metrics():
+    """Test that a workflow run records node, model, tool and workflow metrics."""
+
+    def snapshot():
+        return {
+            "completed": WORKFLOWS.value(status="completed"),
+            "coder": NODE_DURATION.count(agent="coder"),
+            "planner": LLM_DURATION.count(agent="planner", llm_type="reasoning"),
+            "ttft": LLM_TTFT.count(agent="reporter", llm_type="basic"),
+            "tokens": LLM_TOKENS.value(agent="reporter", llm_type="basic", direction="output"),
+            "bash": TOOL_CALLS.value(tool="bash_tool", status="ok"),
+            "bash_duration": TOOL_DURATION.count(tool="bash_tool"),
+        }
+
+    async def run():
+        async for _ in run_agent_workflow(
+            [{"role": "user", "content": "metrics"}],
+            deep_thinking_mode=True,
+            bypass_step_cache=True,
+        ):
+            pass
+
+    before = snapshot()
+    with use_fake_llms(responder=with_usage):
+        asyncio.run(run())
+    after = snapshot()
+
+    assert {key: after[key] - before[key] for key in before} == {
+        "completed": 1,
+        "coder": 1,
+        "planner": 1,
+        "ttft": 1,
+        "tokens": 20,
+        "bash": 1,
+        "bash_duration": 1,
+    }
+    text = TestClient(app).get("/metrics").text
+    assert 'langmanus_node_duration_seconds_count{agent="coder"}' in text
+    assert "langmanus_workflows_queued 0" in text
+
+
+@tool
+def failing_tool(x: int) -> str:
+    """Always fails."""
+    raise ValueError("broken")
+
+
+def test_failed_tool_calls_are_counted():
+    """Test that a tool raising inside ToolNode is counted as an error with its duration."""
+    builder = StateGraph(MessagesState)
+    builder.add_node("tools", ToolNode([failing_tool]))
+    builder.add_edge(START, "tools")
+    graph = builder.compile()
+    message = AIMessage(
+        content="",
+        tool_calls=[{"name": "failing_tool", "args": {"x": 1}, "id": "call"}],
+    )
+    observer = WorkflowObserver()
+
+    async def run():
+        async for event in graph.astream_events(
+            {"messages": [message]},
+            {"callbacks": [observer.callback_handler()]},
+            version="v2",
+        ):
+            observer.observe(
+                event["event"], event["name"], "", str(event["run_id"]), event["data"]
+            )
+
+    errors = TOOL_CALLS.value(tool="failing_tool", status="error")
+    durations = TOOL_DURATION.count(tool="failing_tool")
+    asyncio.run(run())
+    assert TOOL_CALLS.value(tool="failing_tool", status="error") == errors + 1
+    assert TOOL_DURATION.count(tool="failing_tool") == durations + 1
+    # 失败的调用不会一直留在未结束的运行中
+    assert observer._starts == {}
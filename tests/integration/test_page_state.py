@@ -0,0 +1,123 @@
+import base64
+import io
+
+from PIL import Image, ImageDraw
+from browser_use.browser.views import BrowserState
+from browser_use.dom.views import DOMElementNode, DOMTextNode
+from langchain_core.messages import HumanMessage
+
+from src.tools.browser import browser_tool
+from src.tools.page_state import PageStateEncoder, compress_screenshot, dom_digest
+
+
+def make_screenshot(label: str = "", size=(1920, 1080)) -> str:
+    # 加入噪点，使PNG的大小接近真实网页截图
+    image = Image.merge("RGB", [Image.effect_noise(size, 40)] * 3)
+    draw = ImageDraw.Draw(image)
+    for x in range(0, size[0], 40):
+        draw.line([(x, 0), (x, size[1])], fill=(x % 255, 80, 160), width=3)
+    if label:
+        draw.rectangle([200, 200, 1400, 900], fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def make_tree(links: int = 3, text: str = "Read more") -> DOMElementNode:
+    root = DOMElementNode(
+        is_visible=True, parent=None, tag_name="body", xpath="", attributes={}, children=[]
+    )
+    for i in range(links):
+        link = DOMElementNode(
+            is_visible=True,
+            parent=root,
+            tag_name="a",
+            xpath="",
+            attributes={"title": "x" * 200},
+            children=[],
+            highlight_index=i,
+        )
+        link.children.append(DOMTextNode(is_visible=True, parent=link, text=text))
+        root.children.append(link)
+        root.children.append(
+            DOMTextNode(is_visible=True, parent=root, text="context " * 50)
+        )
+    return root
+
+
+def make_state(screenshot=None, url="https://example.com", tree=None) -> BrowserState:
+    return BrowserState(
+        element_tree=tree or make_tree(),
+        selector_map={},
+        url=url,
+        title="Example",
+        tabs=[],
+        screenshot=screenshot,
+    )
+
+
+def test_browser_tool_has_compact_option():
+    """Test that compact page state is an option of the browser tool."""
+    assert browser_tool.compact_page_state in (True, False)
+
+
+def test_screenshot_fits_budget():
+    """Test that screenshots are downscaled and compressed to the byte budget."""
+    raw = base64.b64decode(make_screenshot("page"))
+    data, image = compress_screenshot(
+        Image.open(io.BytesIO(raw)), max_width=800, max_bytes=40000
+    )
+    assert image.width <= 800
+    assert len(data) <= 40000
+    assert data[:2] == b"\xff\xd8"  # JPEG
+
+
+def test_small_dom_is_unchanged_and_large_dom_keeps_interactive_elements():
+    """Test that the digest is exact when small and keeps every index when large."""
+    small = make_tree(links=1, text="Go")
+    assert dom_digest(small, ["title"], 100000) == small.clickable_elements_to_string(
+        ["title"]
+    )
+    large = make_tree(links=30)
+    full = large.clickable_elements_to_string(["title"])
+    digest = dom_digest(large, ["title"], 2000)
+    assert len(digest) < len(full)
+    for i in range(30):
+        assert f"{i}[:]<a" in digest
+
+
+def test_unchanged_page_skips_screenshot():
+    """Test that a visually unchanged page is sent without a screenshot."""
+    encoder = PageStateEncoder(max_width=800, max_bytes=60000, hash_distance=2)
+    screenshot = make_screenshot("page")
+
+    compact, stats = encoder.encode(make_state(screenshot), ["title"])
+    assert compact.screenshot is not None
+    encoder.finish(
+        HumanMessage(
+            content=[
+                {"type": "text", "text": "state"},
+                {
+                    "type": "image_url",
+                    "image_url": {"url": f"data:image/png;base64,{compact.screenshot}"},
+                },
+            ]
+        ),
+        stats,
+    )
+
+    compact, stats = encoder.encode(make_state(screenshot), ["title"])
+    assert compact.screenshot is None
+    message = HumanMessage(content="state")
+    encoder.finish(message, stats)
+    assert "Screenshot omitted" in message.content
+
+    # 页面变化后重新发送截图
+    compact, stats = encoder.encode(make_state(make_screenshot()), ["title"])
+    assert compact.screenshot is not None
+
+    first, second = encoder.steps
+    assert first["image_bytes"] < first["original_image_bytes"]
+    assert first["tokens"] < first["original_tokens"]
+    assert second["screenshot_skipped"] and second["image_tokens"] == 0
+    assert encoder.summary()["screenshots_skipped"] == 1
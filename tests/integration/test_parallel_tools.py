@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from src.agents.tool_node import ParallelToolNode
+
+
+class Tracker:
+    def __init__(self):
+        self.running = {}
+        self.peak = {}
+        self.calls = {}  # 工具名称 -> 按开始顺序排列的(参数, 线程ID)
+        self._lock = threading.Lock()
+
+    def enter(self, name, arg=None):
+        with self._lock:
+            self.calls.setdefault(name, []).append((arg, threading.get_ident()))
+            self.running[name] = self.running.get(name, 0) + 1
+            self.peak[name] = max(self.peak.get(name, 0), self.running[name])
+
+    def exit(self, name):
+        with self._lock:
+            self.running[name] -= 1
+
+
+def make_tools(tracker: Tracker, delay: float = 0.2, barrier=None):
+    @tool
+    def fetch(url: str) -> str:
+        """Fetch a URL."""
+        tracker.enter("fetch", url)
+        if barrier is not None:
+            # 所有调用都到达之前不会通过，超时说明调用没有并发执行
+            barrier.wait()
+        time.sleep(delay)
+        tracker.exit("fetch")
+        return url
+
+    @tool
+    def run_code(code: str) -> str:
+        """Run code."""
+        tracker.enter("run_code", code)
+        # 先开始的调用耗时更长，并发执行时会先于它结束
+        time.sleep(delay * (3 - int(code) % 3))
+        tracker.exit("run_code")
+        return code
+
+    return [fetch, run_code]
+
+
+def tool_calls_message(calls):
+    return {
+        "messages": [
+            AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": name, "args": args, "id": str(i)}
+                    for i, (name, args) in enumerate(calls)
+                ],
+            )
+        ]
+    }
+
+
+def test_tool_calls_of_a_turn_run_concurrently():
+    """Test that independent calls overlap and results keep the call order."""
+    tracker = Tracker()
+    barrier = threading.Barrier(4, timeout=5)
+    node = ParallelToolNode(
+        make_tools(tracker, delay=0, barrier=barrier), max_concurrency=8, tool_limits={}
+    )
+    result = node.invoke(
+        tool_calls_message([("fetch", {"url": f"https://e.com/{i}"}) for i in range(4)])
+    )
+    assert not barrier.broken
+    assert [m.content for m in result["messages"]] == [
+        f"https://e.com/{i}" for i in range(4)
+    ]
+
+
+def test_per_tool_limits():
+    """Test that a tool limited to 1 runs in call order while other tools still overlap."""
+    tracker = Tracker()
+    node = ParallelToolNode(
+        make_tools(tracker, delay=0.05),
+        max_concurrency=8,
+        tool_limits={"run_code": 1, "fetch": 2},
+    )
+    calls = []
+    for i in range(4):
+        calls += [("run_code", {"code": str(i)}), ("fetch", {"url": str(i)})]
+    result = node.invoke(tool_calls_message(calls))
+    assert tracker.peak == {"run_code": 1, "fetch": 2}
+    assert [code for code, _ in tracker.calls["run_code"]] == ["0", "1", "2", "3"]
+    # 同一工具的调用都在同一个工作线程中执行
+    assert len({thread for _, thread in tracker.calls["run_code"]}) == 1
+    assert [m.tool_call_id for m in result["messages"]] == [str(i) for i in range(8)]
+
+
+def test_async_execution_respects_limits():
+    """Test that the async path applies the same limits and order."""
+    tracker = Tracker()
+    node = ParallelToolNode(
+        make_tools(tracker, delay=0.05), max_concurrency=3, tool_limits={"run_code": 1}
+    )
+    calls = [("run_code", {"code": str(i)}) for i in range(3)]
+    calls += [("fetch", {"url": str(i)}) for i in range(4)]
+    asyncio.run(node.ainvoke(tool_calls_message(calls)))
+    assert tracker.peak["run_code"] == 1
+    assert tracker.peak["fetch"] <= 3
+    assert [code for code, _ in tracker.calls["run_code"]] == ["0", "1", "2"]
@@ -0,0 +1,61 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from src.agents.fake_llm import use_fake_llms
+from src.api.app import app
+from src.service.profiling import get_profile
+from src.service.workflow_service import run_agent_workflow
+
+
+def end_of_workflow(**kwargs):
+    async def run():
+        async for event in run_agent_workflow(
+            [{"role": "user", "content": "profile"}], bypass_step_cache=True, **kwargs
+        ):
+            if event["event"] == "end_of_workflow":
+                return event["data"]
+
+    return asyncio.run(run())
+
+
+def test_profiled_workflow_records_timeline_and_stacks():
+    """Test that a profiled run stores a timeline of its steps and sampled stacks."""
+    with use_fake_llms(latency=0.02):
+        data = end_of_workflow(profile=True)
+        plain = end_of_workflow()
+
+    assert "profile_id" not in plain
+    profile = get_profile(data["profile_id"])
+    assert profile["workflow_id"] == data["workflow_id"]
+    assert profile["status"] == "completed"
+    assert profile["samples"] > 0
+    assert profile["stacks"]
+    spans = {(span["kind"], span["name"]) for span in profile["timeline"]}
+    assert {("node", "coordinator"), ("node", "planner"), ("tool", "bash_tool")} <= spans
+    assert any(kind == "llm" for kind, _ in spans)
+    assert all(span["end"] >= span["start"] for span in profile["timeline"])
+
+
+def test_profile_endpoints(monkeypatch):
+    """Test that profiling is opt-in per server and profiles can be downloaded."""
+    client = TestClient(app)
+    request = {"messages": [{"role": "user", "content": "profile"}], "profile": True}
+    monkeypatch.setattr("src.api.app.PROFILING_ENABLED", False)
+    assert client.post("/api/chat/stream", json=request).status_code == 403
+    assert client.post("/api/jobs", json=request).status_code == 403
+
+    with use_fake_llms():
+        data = end_of_workflow(profile=True)
+    url = f"/api/profiles/{data['profile_id']}"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert "attachment" in response.headers["content-disposition"]
+    assert response.json()["workflow_id"] == data["workflow_id"]
+    folded = client.get(url, params={"format": "folded"})
+    assert folded.headers["content-type"].startswith("text/plain")
+    stack, count = folded.text.splitlines()[0].rsplit(" ", 1)
+    assert ";" in stack and int(count) > 0
+
+    assert client.get("/api/profiles/unknown").status_code == 404
+    assert client.get(url, params={"format": "svg"}).status_code == 422
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from src.repl import ReplPool, ReplSessionLostError, ReplTimeoutError
+from src.tools import python_repl
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = ReplPool(size=2, timeout=10, memory_limit_mb=0, preload_modules=[])
+    yield pool
+    pool.shutdown()
+
+
+def test_session_namespace_persists(pool):
+    """Test that variables survive across executions of one session."""
+    pool.run("workflow-a", "x = 41")
+    assert pool.run("workflow-a", "print(x + 1)").strip() == "42"
+
+
+def test_sessions_are_isolated(pool):
+    """Test that sessions do not see each other's globals."""
+    pool.run("workflow-b", "secret = 1")
+    assert "NameError" in pool.run("workflow-c", "print(secret)")
+
+
+def test_released_session_is_reset(pool):
+    """Test that a released session starts from an empty namespace."""
+    pool.run("workflow-d", "y = 1")
+    pool.release("workflow-d")
+    assert "NameError" in pool.run("workflow-d", "print(y)")
+
+
+def test_timeout_restarts_worker(pool):
+    """Test that a runaway execution times out and the worker recovers."""
+    with pytest.raises(ReplTimeoutError):
+        pool.run("workflow-e", "while True: pass", timeout=1)
+    assert pool.run("workflow-e", "print('alive')").strip() == "alive"
+
+
+def test_restart_fails_other_sessions_explicitly():
+    """Test that sessions sharing a restarted worker get an error, not an empty namespace."""
+    pool = ReplPool(size=1, timeout=10, memory_limit_mb=0, preload_modules=[])
+    try:
+        pool.run("workflow-f", "z = 1")
+        with pytest.raises(ReplTimeoutError):
+            pool.run("workflow-g", "while True: pass", timeout=1)
+        with pytest.raises(ReplSessionLostError):
+            pool.run("workflow-f", "print(z)")
+        # 报告丢失之后，会话从空的命名空间重新开始
+        assert "NameError" in pool.run("workflow-f", "print(z)")
+        assert pool.run("workflow-g", "print('fresh')").strip() == "fresh"
+    finally:
+        pool.shutdown()
+
+
+def test_evicted_session_fails_explicitly():
+    """Test that a session evicted to stay under the session limit gets an error."""
+    pool = ReplPool(
+        size=1, timeout=10, memory_limit_mb=0, preload_modules=[], max_sessions_per_worker=1
+    )
+    try:
+        pool.run("workflow-h", "a = 1")
+        pool.run("workflow-i", "b = 2")
+        with pytest.raises(ReplSessionLostError):
+            pool.run("workflow-h", "print(a)")
+        assert pool.run("workflow-h", "a = 3; print(a)").strip() == "3"
+    finally:
+        pool.shutdown()
+
+
+def test_tool_runs_asynchronously(pool, monkeypatch):
+    """Test that the tool's async path shares the session and does not block the event loop."""
+    monkeypatch.setattr(python_repl, "get_repl_pool", lambda: pool)
+    config = {"configurable": {"workflow_id": "workflow-j"}}
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        await python_repl.python_repl_tool.ainvoke({"code": "import time; time.sleep(0.5); n = 1"}, config)
+        ticker.cancel()
+        result = await python_repl.python_repl_tool.ainvoke({"code": "print(n + 1)"}, config)
+        return ticks, result
+
+    ticks, result = asyncio.run(main())
+    assert ticks > 10
+    assert result.endswith("Stdout: 2\n")
+    assert python_repl.python_repl_tool.invoke({"code": "print(n)"}, config).endswith("Stdout: 1\n")
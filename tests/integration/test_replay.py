@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import pytest
+
+from src.agents.fake_llm import use_fake_llms
+from src.service.replay import (
+    TraceMismatchError,
+    load_trace,
+    record_workflow,
+    replay_workflow,
+    save_trace,
+    stream_signature,
+)
+from src.tools.decorators import tool_tracer
+
+REQUEST = [{"role": "user", "content": "replay this"}]
+
+
+def record(**kwargs) -> dict:
+    with use_fake_llms(**kwargs):
+        return asyncio.run(record_workflow(REQUEST))
+
+
+def tool_results(events: list[dict]) -> list:
+    return [e["data"]["tool_result"] for e in events if e["event"] == "tool_call_result"]
+
+
+def test_replay_reproduces_event_stream(tmp_path):
+    """Test that a replayed workflow sends the recorded events without running tools."""
+    trace = record()
+    assert [call["agent"] for call in trace["llm_calls"]][:2] == ["coordinator", "planner"]
+    assert [call["tool"] for call in trace["tool_calls"]] == ["bash_tool"]
+    save_trace(tmp_path / "trace.json", trace)
+    trace = load_trace(tmp_path / "trace.json")
+
+    bash_calls = tool_tracer.stats()["bash_tool"]["calls"]
+    events = asyncio.run(replay_workflow(trace))
+
+    assert stream_signature(events) == trace["events"]
+    assert tool_results(events) == [trace["tool_calls"][0]["output"]]
+    assert tool_tracer.stats()["bash_tool"]["calls"] == bash_calls
+
+
+def test_timed_replay_keeps_recorded_latency():
+    """Test that timed replays wait as long as the recorded calls took."""
+    trace = record(latency=0.05)
+    model_time = sum(call["duration"] for call in trace["llm_calls"])
+    assert model_time >= 0.05 * len(trace["llm_calls"])
+
+    start = time.perf_counter()
+    asyncio.run(replay_workflow(trace))
+    untimed = time.perf_counter() - start
+    start = time.perf_counter()
+    events = asyncio.run(replay_workflow(trace, timed=True))
+    timed = time.perf_counter() - start
+
+    assert stream_signature(events) == trace["events"]
+    assert timed >= model_time > untimed
+
+
+def test_replay_detects_missing_calls():
+    """Test that a workflow asking for a call the trace lacks fails the replay."""
+    trace = record()
+    trace["llm_calls"] = [c for c in trace["llm_calls"] if c["agent"] != "reporter"]
+    with pytest.raises(TraceMismatchError):
+        asyncio.run(replay_workflow(trace))
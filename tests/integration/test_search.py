@@ -0,0 +1,64 @@
+import threading
+import time
+
+from src.tools.search import SearchLayer, tavily_tool
+
+
+class CountingBackend:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, query: str):
+        with self._lock:
+            self.calls.append(query)
+        time.sleep(self.delay)
+        return [{"url": f"https://example.com/{query}", "content": query}]
+
+
+def test_tool_keeps_tavily_interface():
+    """Test that the search tool keeps its name and arguments."""
+    assert tavily_tool.name == "tavily_search"
+    assert list(tavily_tool.args) == ["query"]
+
+
+def test_normalized_queries_hit_cache():
+    """Test that equivalent queries are served from the cache."""
+    backend = CountingBackend()
+    layer = SearchLayer(backend)
+    layer.search("What is MCP")
+    layer.search("  what is   mcp ")
+    assert len(backend.calls) == 1
+    assert layer.stats()["hits"] == 1
+
+
+def test_errors_are_not_cached():
+    """Test that error strings from the backend are retried."""
+    results = iter(["HTTPError('boom')", [{"content": "ok"}]])
+    layer = SearchLayer(lambda query: next(results))
+    assert layer.search("q") == "HTTPError('boom')"
+    assert layer.search("q") == [{"content": "ok"}]
+
+
+def test_concurrent_identical_queries_are_collapsed():
+    """Test that in-flight identical queries share one backend request."""
+    backend = CountingBackend(delay=0.2)
+    layer = SearchLayer(backend)
+    threads = [threading.Thread(target=layer.search, args=("MCP",)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(backend.calls) == 1
+    assert layer.stats()["deduplicated"] + layer.stats()["hits"] == 4
+
+
+def test_search_many_runs_concurrently():
+    """Test that batch queries run concurrently and keep their order."""
+    backend = CountingBackend(delay=0.2)
+    layer = SearchLayer(backend, max_concurrency=4)
+    start = time.perf_counter()
+    results = layer.search_many(["a", "b", "c", "d"])
+    assert time.perf_counter() - start < 0.6
+    assert [result[0]["content"] for result in results] == ["a", "b", "c", "d"]
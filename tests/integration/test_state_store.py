@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+from src.agents.fake_llm import use_fake_llms
+from src.cache import StoreCache
+from src.service.jobs import JobManager, StoredJob
+from src.store import SQLiteStore
+
+MESSAGES = [{"role": "user", "content": "shared state"}]
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    """Test that two stores on the same database see each other's writes."""
+    path = str(tmp_path / "state.db")
+    first, second = SQLiteStore(path), SQLiteStore(path)
+
+    first.set("ns", "a", "1")
+    first.set("ns", "b", "2", ttl=0.05)
+    assert second.get("ns", "a") == "1"
+    assert second.items("ns") == [("a", "1"), ("b", "2")]
+    time.sleep(0.06)
+    assert second.get("ns", "b") is None
+    assert second.count("ns") == 1
+
+    for key in "cdef":
+        second.set("ns", key, key)
+    assert first.trim("ns", 2) == 3
+    assert [key for key, _ in first.items("ns")] == ["e", "f"]
+
+    first.append_events("job", [(1, "x"), (2, "y"), (3, "z")])
+    assert second.read_events("job", after=1) == [(2, "y"), (3, "z")]
+    second.trim_events("job", keep=1)
+    assert first.read_events("job") == [(3, "z")]
+    first.delete_events("job")
+    assert second.read_events("job") == []
+
+
+def test_store_cache(tmp_path):
+    """Test that cached values are shared and evicted oldest first."""
+    path = str(tmp_path / "state.db")
+    writer = StoreCache(SQLiteStore(path), "search", max_size=2)
+    reader = StoreCache(SQLiteStore(path), "search", max_size=2)
+
+    writer.set("query", [{"title": "南京汤包", "score": 0.9}])
+    assert reader.get("query") == [{"title": "南京汤包", "score": 0.9}]
+    assert reader.get("missing") is None
+    writer.set("second", [])
+    writer.set("third", [])
+    assert reader.get("query") is None
+    stats = reader.stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (2, 1, 2)
+    assert writer.stats()["evictions"] == 1
+
+
+def test_jobs_are_visible_to_other_workers(tmp_path):
+    """Test that another worker can stream, list and cancel a job."""
+    path = str(tmp_path / "state.db")
+
+    async def stream_elsewhere():
+        owner = JobManager(store=SQLiteStore(path), sync_interval=0.05)
+        other = JobManager(store=SQLiteStore(path), sync_interval=0.05)
+        job = await owner.submit(MESSAGES, bypass_step_cache=True)
+        remote = await other.get(job.id)
+        assert isinstance(remote, StoredJob)
+        assert job.id in [j.id for j in await other.list_jobs()]
+        remote_events = [item async for item in remote.events(last_event_id=2)]
+        local_events = [item async for item in job.events()]
+        await owner.shutdown()
+        return job, await other.get(job.id), local_events, remote_events
+
+    async def cancel_elsewhere():
+        owner = JobManager(store=SQLiteStore(path), sync_interval=0.05)
+        other = JobManager(store=SQLiteStore(path), sync_interval=0.05)
+        job = await owner.submit(MESSAGES, bypass_step_cache=True)
+        await asyncio.sleep(0.1)
+        assert await other.cancel(job.id)
+        events = [event async for _, event in (await other.get(job.id)).events()]
+        await owner.shutdown()
+        return job, events
+
+    with use_fake_llms():
+        job, remote, local_events, remote_events = asyncio.run(stream_elsewhere())
+    assert remote.status == "completed" and remote.result == job.result
+    assert remote_events == local_events[2:]
+
+    with use_fake_llms(latency=0.2):
+        job, events = asyncio.run(cancel_elsewhere())
+    assert job.status == "cancelled"
+    assert events[-1]["event"] == "workflow_cancelled"
+
+
+def test_job_store_calls_do_not_block_the_event_loop(tmp_path):
+    """Test that a slow store does not stall other requests while jobs are submitted or read."""
+
+    class SlowStore(SQLiteStore):
+        def set(self, *args, **kwargs):
+            time.sleep(0.3)
+            super().set(*args, **kwargs)
+
+        def get(self, *args, **kwargs):
+            time.sleep(0.3)
+            return super().get(*args, **kwargs)
+
+        def items(self, *args, **kwargs):
+            time.sleep(0.3)
+            return super().items(*args, **kwargs)
+
+        def read_events(self, *args, **kwargs):
+            time.sleep(0.3)
+            return super().read_events(*args, **kwargs)
+
+    async def main():
+        path = str(tmp_path / "state.db")
+        manager = JobManager(store=SlowStore(path))
+        other = JobManager(store=SlowStore(path))
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        async def ticks_during(call):
+            start = ticks
+            result = await call
+            return ticks - start, result
+
+        ticker = asyncio.create_task(tick())
+        await asyncio.sleep(0)
+        counts = {}
+        counts["submit"], job = await ticks_during(
+            manager.submit(MESSAGES, bypass_step_cache=True)
+        )
+        counts["get"], remote = await ticks_during(other.get(job.id))
+        counts["replay"], _ = await ticks_during(remote.replay())
+        counts["list_jobs"], _ = await ticks_during(other.list_jobs())
+        counts["cancel"], _ = await ticks_during(other.cancel(job.id))
+        ticker.cancel()
+        job.cancellation.cancel("test")
+        await manager.shutdown()
+        return counts
+
+    with use_fake_llms():
+        counts = asyncio.run(main())
+    assert all(count > 5 for count in counts.values()), counts
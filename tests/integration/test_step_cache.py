@@ -0,0 +1,83 @@
+import json
+
+from langchain_core.messages import HumanMessage
+
+from src.cache import StepCache, TTLCache, make_step_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_state(user_input: str, **extra) -> dict:
+    plan = {
+        "thought": "",
+        "title": "",
+        "steps": [
+            {"agent_name": "researcher", "title": "Search", "description": "Find MCP"},
+            {"agent_name": "reporter", "title": "Report", "description": "Write"},
+        ],
+    }
+    return {
+        "TEAM_MEMBERS": ["researcher", "coder", "browser", "reporter"],
+        "messages": [
+            HumanMessage(content=user_input),
+            HumanMessage(content=json.dumps(plan), name="planner"),
+        ],
+        "full_plan": json.dumps(plan),
+        **extra,
+    }
+
+
+def test_ttl_cache_expires_entries():
+    """Test that entries are dropped once their TTL has passed."""
+    clock = FakeClock()
+    cache = TTLCache(max_size=4, ttl=10, clock=clock)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    """Test that the least recently used entry is evicted when full."""
+    cache = TTLCache(max_size=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_step_key_normalizes_phrasing():
+    """Test that case and spacing do not change the key, but punctuation does."""
+    first = make_step_key("researcher", make_state("What is MCP?"))
+    second = make_step_key("Researcher", make_state("  what is   mcp? "))
+    third = make_step_key("researcher", make_state("What is LSP?"))
+    assert first == second
+    assert first != third
+    for a, b in [("2+2", "2-2"), ("x > 5", "x < 5"), ("C++", "C#")]:
+        assert make_step_key("researcher", make_state(a)) != make_step_key(
+            "researcher", make_state(b)
+        )
+
+
+def test_step_cache_bypass():
+    """Test that bypassed requests miss but still refresh the cache."""
+    cache = StepCache(max_size=4, ttl=60, enabled=True)
+    state = make_state("What is MCP?")
+    cache.set("researcher", state, "old")
+    assert cache.get("researcher", state) == "old"
+
+    bypass_state = make_state("What is MCP?", bypass_step_cache=True)
+    assert cache.get("researcher", bypass_state) is None
+    cache.set("researcher", bypass_state, "new")
+    assert cache.get("researcher", state) == "new"
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+
+import pytest
+
+from src.tools.decorators import ToolTracer, log_io, tool_tracer
+
+
+class Unprintable:
+    def __str__(self):
+        raise AssertionError("arguments must not be formatted")
+
+
+@pytest.fixture(autouse=True)
+def clear_tracer():
+    tool_tracer.clear()
+    yield
+    tool_tracer.clear()
+
+
+def test_sync_calls_are_traced_without_formatting(caplog):
+    """Test that calls are recorded and arguments are not formatted at INFO."""
+
+    @log_io
+    def echo(value, text):
+        return text
+
+    caplog.set_level(logging.INFO)
+    assert echo(Unprintable(), "x" * 1000) == "x" * 1000
+
+    stats = tool_tracer.stats()["echo"]
+    assert stats["calls"] == 1 and stats["errors"] == 0
+    assert stats["output_bytes"] == 1000
+    (record,) = tool_tracer.recent()
+    assert record["tool"] == "echo"
+    assert record["input_bytes"] >= 1000
+    assert record["duration"] >= 0
+
+
+def test_debug_logs_are_truncated(caplog):
+    """Test that debug logs show a preview instead of the whole result."""
+
+    @log_io
+    def crawl():
+        return "a" * 100000
+
+    caplog.set_level(logging.DEBUG, logger="src.tools.decorators")
+    crawl()
+    assert "more chars" in caplog.text
+    assert len(caplog.text) < 5000
+
+
+def test_async_calls_and_errors_are_traced():
+    """Test that async tools are traced and errors are recorded and re-raised."""
+
+    @log_io
+    async def fail():
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    assert asyncio.iscoroutinefunction(fail)
+    with pytest.raises(ValueError):
+        asyncio.run(fail())
+    assert tool_tracer.stats()["fail"]["errors"] == 1
+    assert "boom" in tool_tracer.recent(tool="fail")[0]["error"]
+
+
+def test_sampling_and_ring_buffer():
+    """Test that unsampled calls are only counted and the buffer is bounded."""
+    tracer = ToolTracer(buffer_size=3, sample_rate=0)
+    for _ in range(5):
+        tracer.record("t", 0.1, tracer.start(), ("q",), {}, "r")
+    assert tracer.stats()["t"]["calls"] == 5
+    assert tracer.recent() == []
+
+    tracer = ToolTracer(buffer_size=3, sample_rate=1)
+    for _ in range(5):
+        tracer.record("t", 0.1, tracer.start(), ("q",), {}, "r")
+    assert len(tracer.recent()) == 3
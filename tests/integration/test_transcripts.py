@@ -0,0 +1,59 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+
+from src.agents.fake_llm import scripted_responder, use_fake_llms
+from src.api.app import app
+from src.service.workflow_service import run_agent_workflow
+
+
+def long_report(agent_name, messages, tools):
+    """Script whose researcher and reporter write long responses."""
+    if agent_name == "researcher":
+        return AIMessage(content="notes " * 2000)
+    if agent_name == "reporter":
+        return AIMessage(content="# Report\n\n" + "findings " * 1000)
+    return scripted_responder(agent_name, messages, tools)
+
+
+def end_of_workflow(**kwargs):
+    async def run():
+        async for event in run_agent_workflow(
+            [{"role": "user", "content": "transcript"}], bypass_step_cache=True, **kwargs
+        ):
+            if event["event"] == "end_of_workflow":
+                return event["data"]
+
+    return asyncio.run(run())
+
+
+def test_compact_end_of_workflow_and_transcript():
+    """Test that the compact event refers to a transcript with the full messages."""
+    with use_fake_llms(responder=long_report):
+        full = end_of_workflow()
+        compact = end_of_workflow(compact_end_of_workflow=True)
+
+    assert "messages" not in compact
+    assert len(compact["message_ids"]) == len(full["messages"])
+    assert compact["final_report"] == full["messages"][-1]["content"]
+    assert compact["summary"]["by_agent"]["reporter"] == 1
+    assert compact["summary"]["messages"] == len(full["messages"])
+
+    client = TestClient(app)
+    url = f"/api/workflows/{compact['workflow_id']}/transcript"
+    pages = [client.get(url, params={"offset": offset, "limit": 2}).json() for offset in (0, 2, 4, 6)]
+    messages = [message for page in pages for message in page["messages"]]
+    assert pages[0]["total"] == len(compact["message_ids"])
+    assert [message["id"] for message in messages] == compact["message_ids"]
+    assert messages[-1]["content"] == compact["final_report"]
+    # 研究员的回复在存储中是引用，读取时展开
+    researcher = next(i for i, message in enumerate(messages) if message.get("name") == "researcher")
+    assert "notes notes" in messages[researcher]["content"]
+    truncated = client.get(url, params={"offset": researcher, "limit": 1, "max_chars": 100}).json()
+    assert len(truncated["messages"][0]["content"]) < len(messages[researcher]["content"]) // 10
+
+    assert client.get("/api/workflows/unknown/transcript").status_code == 404
+    # 完整的end_of_workflow事件已经包含所有消息，不再保存对话记录
+    assert client.get(f"/api/workflows/{full['workflow_id']}/transcript").status_code == 404
+    assert client.get(url, params={"limit": 1000}).status_code == 422
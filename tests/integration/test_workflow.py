@@ -22,3 +22,12 @@ def test_run_agent_workflow_empty_input():
     """Test workflow execution with empty input."""
     with pytest.raises(ValueError):
         run_agent_workflow("")
+
+
+def test_graph_is_shared():
+    """Test that the CLI and the service share one compiled graph."""
+    from src.graph import get_graph
+    from src.service import workflow_service
+
+    assert get_graph() is get_graph()
+    assert workflow_service.get_graph is get_graph